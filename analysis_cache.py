@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def hash_bytes(data):
+    return hashlib.sha256(memoryview(data).cast('B')).hexdigest()
+
+
+def hash_json(value):
+    return hash_bytes(json.dumps(value, sort_keys=True).encode('utf-8'))
+
+
+class AnalysisCache:
+    """Persistent, content-addressed store of analysis results.
+
+    Entries are JSON files named by a key that combines the hashes of the
+    normalized audio (or any other stage input), the prompt and the model
+    settings, so the same recording analyzed the same way is only paid for
+    once. Entries older than `max_age_days` expire, and the least recently
+    used ones are evicted once the store exceeds `max_entries` or
+    `max_mb`.
+    """
+
+    def __init__(self, directory='cache/analysis', max_entries=500, max_mb=200,
+                 max_age_days=30, enabled=True):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_age = max_age_days * 86400
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if enabled:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(content_hash, prompt, model_settings):
+        """Combine the input hash, prompt text and model settings"""
+        return hash_json({
+            'input': content_hash,
+            'prompt': hash_bytes(prompt.encode('utf-8')),
+            'model': hash_json(model_settings)
+        })
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """Return the cached result, or None on a miss"""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+            # Touch the entry so eviction is least-recently-used
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store a result atomically, then enforce the size limits"""
+        if not self.enabled:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Error writing analysis cache: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            now = time.time()
+            for name in os.listdir(self.directory):
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.max_age:
+                    self._remove(path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            while entries and (len(entries) > self.max_entries or total > self.max_bytes):
+                _, size, path = entries.pop(0)
+                total -= size
+                self._remove(path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            self.evictions += 1
+        except OSError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,158 @@
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class QueueFullError(Exception):
+    """Raised when the analysis backlog is at capacity"""
+
+
+class AnalysisJob:
+    """One queued analysis and its outcome"""
+
+    def __init__(self, audio, context=None):
+        self.id = uuid.uuid4().hex
+        self.audio = audio
+        self.context = context or {}
+        self.status = QUEUED
+        self.stage = None
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class AnalysisQueue:
+    """Bounded queue of analysis jobs served by a pool of worker threads.
+
+    `handler(job, report, partial)` does the work and returns the job
+    result; it can call `report(stage)` to publish progress and
+    `partial(kind, data)` to publish part of the result early. Lifecycle
+    events go to `on_event(name, payload, job)`:
+
+    - analysis_queued: accepted, with the queue position
+    - analysis_progress: started, or reached a new stage
+    - analysis_partial: a piece of the result, e.g. one transcript line
+    - audio_analysis: finished, with status 'success' or 'error'
+
+    A failing job is recorded and reported; the worker moves on to the next.
+    """
+
+    def __init__(self, handler, workers=2, max_queued=16, on_event=None, keep_finished=100):
+        self._handler = handler
+        self._on_event = on_event
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self._keep_finished = keep_finished
+        self._workers = []
+        for i in range(workers):
+            worker = threading.Thread(target=self._run, name=f"analysis-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, audio, **context):
+        """Queue an analysis; raises QueueFullError instead of blocking"""
+        job = AnalysisJob(audio, context)
+        with self._jobs_lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._jobs_lock:
+                del self._jobs[job.id]
+            raise QueueFullError("Analysis queue is full, please try again shortly")
+
+        self._emit('analysis_queued', dict(job.to_dict(), position=self._queue.qsize()), job)
+        return job
+
+    def get(self, job_id):
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self):
+        """Finish queued jobs and stop the workers"""
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def _emit(self, name, payload, job):
+        if self._on_event:
+            try:
+                self._on_event(name, payload, job)
+            except Exception as e:
+                print(f"Error emitting {name} for job {job.id}: {str(e)}")
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            self._process(job)
+
+    def _process(self, job):
+        def report(stage):
+            job.stage = stage
+            self._emit('analysis_progress', job.to_dict(), job)
+
+        def partial(kind, data):
+            self._emit('analysis_partial', {'job_id': job.id, 'kind': kind, 'data': data}, job)
+
+        job.status = RUNNING
+        job.started_at = time.time()
+        report('started')
+        try:
+            job.result = self._handler(job, report, partial)
+            job.status = DONE
+        except Exception as e:
+            print(f"Analysis job {job.id} failed: {str(e)}")
+            traceback.print_exc()
+            job.status = FAILED
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            # The audio is no longer needed once the job has run
+            job.audio = None
+            self._trim_finished()
+
+        if job.status == DONE:
+            self._emit('audio_analysis', {
+                'job_id': job.id,
+                'status': 'success',
+                'data': job.result
+            }, job)
+        else:
+            self._emit('audio_analysis', {
+                'job_id': job.id,
+                'status': 'error',
+                'message': f"Audio analysis error: {job.error}"
+            }, job)
+
+    def _trim_finished(self):
+        with self._jobs_lock:
+            finished = [job_id for job_id, job in self._jobs.items()
+                        if job.status in (DONE, FAILED)]
+            for job_id in finished[:max(0, len(finished) - self._keep_finished)]:
+                del self._jobs[job_id]
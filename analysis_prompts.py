@@ -0,0 +1,178 @@
+"""Prompts for the consultation analysis calls
+
+The JSON fragments and guidelines are shared so the single-pass prompt,
+the transcription prompt and the text-only extraction prompt always ask
+for the same structure.
+"""
+
+TRANSCRIPT_FORMAT = """    "transcript": [
+            {"speaker": "Doctor", "text": "Doctor's statement here"},
+            {"speaker": "Patient", "text": "Patient's response here"},
+            {"speaker": "Doctor", "text": "Doctor's next statement"},
+            ...
+        ]"""
+
+QA_FORMAT = """    "qa_analysis": {
+        "cause": {
+            "work": "answer about work posture/stress",
+            "sleep": "answer about sleep quality",
+            "sports_injuries": "answer about sports/hobbies injuries",
+            "mva": "answer about motor vehicle accidents",
+            "summary": "biggest cause summary"
+        },
+        "presentation": {
+            "main_complaint": "answer about main complaint by analyzing the whole conversation about: 
+            1. when do you feel the pain
+            2. where eactly do you feel the pain
+            3. how wuold you describe the pain (Achy, Stiff, Dull, Burning, Superficial, Numb, Tingling, Sharp, Deep, Clicking, Locking, Throbbing, Weakening, Shooting)",
+            "onset": "answer about when it started",
+            "is_chronic": "yes/no for >3 months"
+        },
+        "life_effect": {
+            "activities_impact": "answer about impact on daily activities by analyzing the whole conversation about: 
+            1. How does this problem affect your daily activities
+            2. How does this problem affect your work/study
+            3. How does this problem affect your sleep
+            4. How does this problem affect your hobbies/sports
+            5. How does this problem affect your mental state
+            6. How does this problem affect your relationships",
+            "nerve_root": "answer about nerve root symptoms",
+            "clumsy": "answer about clumsy symptoms",
+            "focus": "answer about focus issues",
+            "immune": "answer about immune system",
+            "stress": "answer about stress level"
+        },
+        "intent": {
+            "previous_care": "answer about previous care/adjustments",
+            "previous_exercises": "answer about previous exercises",
+            "lifestyle_changes": "answer about lifestyle/environment changes",
+            "why_not_healed": "answer about why not healed",
+            "goal": "answer about treatment goals by analyzing the whole conversation about:
+            1. What would you like to do more of once this problem is gone
+            2. Would you like to be more productive at work, sleep better, enjoy yor hobbies, get back into sports or exercise or just feel healthier and happier"
+        }
+    },
+    "summary": {
+        "presentation": "symptoms and conditions summary",
+        "life_effect": "impact on daily activities summary",
+        "goal": "treatment objectives summary, based on the (activities_impact) in (life_effect)
+        for example: if the patient says that the problem affects their work/study, then the goal should be more productive at work, if the patient says that the problem affects their sleep, then the goal should be better sleep, if the patient says that the problem affects their hobbies/sports, then the goal should be get back into sports or exercise, if the patient says that the problem affects their mental state, then the goal should be feel healthier and happier"
+    }"""
+
+TRANSCRIPT_GUIDELINES = """For the transcript:
+- Use an array format with square brackets []
+- Each entry should have "speaker" (either "Doctor" or "Patient") and "text" fields
+- Keep each logical statement as a separate entry
+- Identify speakers based on context, voice characteristics, and content"""
+
+QA_GUIDELINES = """For the qa_analysis:
+- Always analyze the whole conversation then provide answers
+- Keep answers concise (1-2 sentences) but informative
+- Use direct quotes from the patient when possible
+- For yes/no questions, start with "Yes" or "No" followed by explanation
+- If information is not mentioned in the recording, use "Not mentioned" instead of guessing
+- The "summary" field in each section should synthesize the key points"""
+
+SUMMARY_GUIDELINES = """For the summary section:
+- "presentation" should focus on symptoms, duration, and severity
+- "life_effect" should highlight the most significant impacts on daily life
+- "goal" should clearly state what the patient hopes to achieve from treatment
+- Each summary should be 2-3 sentences maximum"""
+
+# Windows of a segmented recording are cut between utterances, but the
+# model can still hear the tail or head of a sentence at the edges
+PARTIAL_SPEECH_GUIDELINE = """
+- The audio may be an excerpt of a longer consultation; transcribe speech at the very start and end even if it is a partial sentence"""
+
+
+def build_prompt(task, members, guidelines):
+    """Assemble a prompt asking for a JSON object with the given members"""
+    body = ",\n".join(members)
+    sections = "\n\n".join(f"{number}. {text}" for number, text in enumerate(guidelines, 1))
+    return (f"{task} in the following JSON format:\n\n{{\n{body}\n}}\n\n"
+            f"Guidelines(must follow):\n\n{sections}\n\n"
+            "Please ensure the response is in valid JSON format.")
+
+
+ANALYSIS_PROMPT = build_prompt(
+    "Please analyze this medical consultation recording and provide the analysis",
+    [TRANSCRIPT_FORMAT, QA_FORMAT],
+    [TRANSCRIPT_GUIDELINES, QA_GUIDELINES, SUMMARY_GUIDELINES]
+)
+
+TRANSCRIPT_PROMPT = build_prompt(
+    "Please transcribe this medical consultation recording and provide the transcript",
+    [TRANSCRIPT_FORMAT],
+    [TRANSCRIPT_GUIDELINES + PARTIAL_SPEECH_GUIDELINE]
+)
+
+QA_PROMPT = build_prompt(
+    "Please analyze the transcript of this medical consultation and provide the analysis",
+    [QA_FORMAT],
+    [QA_GUIDELINES, SUMMARY_GUIDELINES]
+)
+
+
+def format_transcript(transcript):
+    """Render transcript entries as "Speaker: text" lines for a text-only prompt"""
+    return "\n".join(f"{entry.get('speaker', 'Unknown')}: {entry.get('text', '')}" for entry in transcript)
+
+
+def qa_prompt(transcript):
+    """Extraction prompt followed by the transcript it should analyze"""
+    return f"{QA_PROMPT}\n\nTranscript:\n\n{format_transcript(transcript)}"
+
+
+def repair_prompt(transcript, sections):
+    """Ask again for just the sections that were missing or malformed"""
+    return (f"{QA_PROMPT}\n\nAn earlier reply was missing or malformed for these sections: "
+            f"{', '.join(sections)}. Provide only those sections."
+            f"\n\nTranscript:\n\n{format_transcript(transcript)}")
+
+
+# What each Q&A slot records, for the realtime engine's compact prompt
+SLOT_DESCRIPTIONS = {
+    'cause.work': "work posture/stress",
+    'cause.sleep': "sleep quality",
+    'cause.sports_injuries': "sports/hobbies injuries",
+    'cause.mva': "motor vehicle accidents",
+    'cause.summary': "biggest cause summary",
+    'presentation.main_complaint': "when and where the pain is felt and how it is described",
+    'presentation.onset': "when it started",
+    'presentation.is_chronic': "yes/no for >3 months",
+    'life_effect.activities_impact': "impact on daily activities, work, sleep, hobbies, mood, relationships",
+    'life_effect.nerve_root': "nerve root symptoms",
+    'life_effect.clumsy': "clumsy symptoms",
+    'life_effect.focus': "focus issues",
+    'life_effect.immune': "immune system",
+    'life_effect.stress': "stress level",
+    'intent.previous_care': "previous care/adjustments",
+    'intent.previous_exercises': "previous exercises",
+    'intent.lifestyle_changes': "lifestyle/environment changes",
+    'intent.why_not_healed': "why not healed",
+    'intent.goal': "what the patient wants to do more of once the problem is gone",
+}
+
+REALTIME_QA_TASK = """You are following a medical consultation as it happens and keeping its Q&A notes up to date.
+
+Slots (name: what it records):
+{slots}"""
+
+REALTIME_QA_INSTRUCTIONS = """Return {"updates": [{"slot": "<slot name>", "value": "<notes>", "confidence": <0-1>}]} with an entry only for slots that the new lines fill in, correct or add to, and an empty list if nothing changes.
+- For a slot that already has notes, give the complete new value, not just the addition
+- Keep values concise (1-2 sentences) and use direct quotes from the patient when possible
+- Confidence is how clearly the conversation so far answers the slot"""
+
+
+def realtime_qa_prompt(notes, empty, context, lines):
+    """Prompt for one realtime tick: the current notes, a little context and only the new lines"""
+    slots = "\n".join(f"{name}: {description}" for name, description in SLOT_DESCRIPTIONS.items())
+    parts = [REALTIME_QA_TASK.format(slots=slots),
+             "Current notes (confidence in brackets):\n" + ("\n".join(notes) or "(none yet)")]
+    if empty:
+        parts.append(f"Still empty: {', '.join(empty)}")
+    if context:
+        parts.append("Earlier lines, already taken into account:\n" + "\n".join(context))
+    parts.append("New lines:\n" + "\n".join(lines))
+    parts.append(REALTIME_QA_INSTRUCTIONS)
+    return "\n\n".join(parts)
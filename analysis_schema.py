@@ -0,0 +1,186 @@
+from dataclasses import asdict, dataclass, fields
+from typing import Dict, List, Tuple
+
+
+@dataclass
+class TranscriptEntry:
+    speaker: str
+    text: str
+
+
+@dataclass
+class Cause:
+    work: str
+    sleep: str
+    sports_injuries: str
+    mva: str
+    summary: str
+
+
+@dataclass
+class Presentation:
+    main_complaint: str
+    onset: str
+    is_chronic: str
+
+
+@dataclass
+class LifeEffect:
+    activities_impact: str
+    nerve_root: str
+    clumsy: str
+    focus: str
+    immune: str
+    stress: str
+
+
+@dataclass
+class Intent:
+    previous_care: str
+    previous_exercises: str
+    lifestyle_changes: str
+    why_not_healed: str
+    goal: str
+
+
+@dataclass
+class Summary:
+    presentation: str
+    life_effect: str
+    goal: str
+
+
+QA_SECTIONS = {
+    'cause': Cause,
+    'presentation': Presentation,
+    'life_effect': LifeEffect,
+    'intent': Intent,
+}
+
+# Sections the text-only extraction produces, as "qa_analysis.<name>" or "summary"
+EXTRACTED_SECTIONS = [f"qa_analysis.{name}" for name in QA_SECTIONS] + ['summary']
+
+# Individual Q&A fields the realtime engine fills in, as "<section>.<field>"
+SLOTS = [f"{name}.{f.name}" for name, model in QA_SECTIONS.items() for f in fields(model)]
+
+
+@dataclass
+class SlotUpdate:
+    slot: str
+    value: str
+    confidence: float
+
+
+def _object_schema(properties):
+    return {'type': 'object', 'properties': properties, 'required': list(properties)}
+
+
+def _model_schema(model):
+    return _object_schema({f.name: {'type': 'string'} for f in fields(model)})
+
+
+TRANSCRIPT_SCHEMA = _object_schema({'transcript': {'type': 'array', 'items': _model_schema(TranscriptEntry)}})
+
+
+def sections_schema(sections):
+    """Response schema asking for just the given extracted sections"""
+    qa = {name.split('.', 1)[1]: _model_schema(QA_SECTIONS[name.split('.', 1)[1]])
+          for name in sections if name.startswith('qa_analysis.')}
+    properties = {}
+    if qa:
+        properties['qa_analysis'] = _object_schema(qa)
+    if 'summary' in sections:
+        properties['summary'] = _model_schema(Summary)
+    return _object_schema(properties)
+
+
+QA_SCHEMA = sections_schema(EXTRACTED_SECTIONS)
+ANALYSIS_SCHEMA = _object_schema(dict(TRANSCRIPT_SCHEMA['properties'], **QA_SCHEMA['properties']))
+SLOT_UPDATES_SCHEMA = _object_schema({'updates': {'type': 'array', 'items': _object_schema({
+    'slot': {'type': 'string', 'enum': SLOTS},
+    'value': {'type': 'string'},
+    'confidence': {'type': 'number'}
+})}})
+
+
+def _parse_model(model, value):
+    """Build a typed section from a reply value; raises ValueError if it doesn't fit"""
+    if not isinstance(value, dict):
+        raise ValueError(f"expected an object, got {type(value).__name__}")
+    values = {}
+    for f in fields(model):
+        item = value.get(f.name)
+        if isinstance(item, (int, float, bool)):
+            item = str(item)
+        if not isinstance(item, str):
+            raise ValueError(f"missing or non-text field {f.name!r}")
+        values[f.name] = item
+    return model(**values)
+
+
+def validate_transcript(value) -> Tuple[List[dict], int]:
+    """Keep the well-formed transcript entries; returns (entries, dropped count)"""
+    if not isinstance(value, list):
+        return [], 0
+    entries = []
+    for item in value:
+        try:
+            entries.append(asdict(_parse_model(TranscriptEntry, item)))
+        except ValueError:
+            pass
+    return entries, len(value) - len(entries)
+
+
+def validate_section(name, value):
+    """Validated copy of one extracted section ("qa_analysis.cause" or "summary"); raises ValueError"""
+    model = Summary if name == 'summary' else QA_SECTIONS[name.split('.', 1)[1]]
+    return asdict(_parse_model(model, value))
+
+
+def validate_sections(data, sections=EXTRACTED_SECTIONS) -> Tuple[Dict[str, dict], List[str]]:
+    """Validate the extracted sections of a reply.
+
+    Returns the valid sections as {"qa_analysis.cause": {...}, "summary":
+    {...}} and the names of those that are missing or invalid.
+    """
+    data = data if isinstance(data, dict) else {}
+    qa = data.get('qa_analysis')
+    qa = qa if isinstance(qa, dict) else {}
+    valid = {}
+    invalid = []
+    for name in sections:
+        value = data.get('summary') if name == 'summary' else qa.get(name.split('.', 1)[1])
+        try:
+            valid[name] = validate_section(name, value)
+        except ValueError as e:
+            print(f"Invalid section {name}: {str(e)}")
+            invalid.append(name)
+    return valid, invalid
+
+
+def assemble_sections(valid):
+    """Turn validated sections back into the qa_analysis/summary layout.
+
+    Sections that never validated come back as empty objects so consumers
+    can still index into them.
+    """
+    return {
+        'qa_analysis': {name: valid.get(f"qa_analysis.{name}", {}) for name in QA_SECTIONS},
+        'summary': valid.get('summary', {})
+    }
+
+
+def validate_slot_updates(value) -> List[SlotUpdate]:
+    """Well-formed updates of known slots; confidence is clamped to 0-1 (0.5 if missing)"""
+    if not isinstance(value, list):
+        return []
+    updates = []
+    for item in value:
+        if not isinstance(item, dict) or item.get('slot') not in SLOTS or not isinstance(item.get('value'), str):
+            continue
+        try:
+            confidence = min(1.0, max(0.0, float(item.get('confidence', 0.5))))
+        except (TypeError, ValueError):
+            confidence = 0.5
+        updates.append(SlotUpdate(item['slot'], item['value'], confidence))
+    return updates
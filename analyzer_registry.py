@@ -0,0 +1,97 @@
+import threading
+import time
+
+from config import Config
+from conversation_analyzer import ConversationAnalyzer
+
+
+class AnalyzerSession:
+    """One client's view of the shared analyzer.
+
+    Sessions share the analyzer (and with it the model handle, connection
+    pools, cache and upload registry) but keep their own bookkeeping, so
+    one client starting a recording never replaces another's analyzer.
+    """
+
+    def __init__(self, analyzer, session_id):
+        self.analyzer = analyzer
+        self.session_id = session_id
+        self.created_at = time.time()
+        self.analyses = 0
+
+    def analyze_audio(self, audio, **kwargs):
+        self.analyses += 1
+        return self.analyzer.analyze_audio(audio, **kwargs)
+
+    def analyze_transcript(self, transcript, **kwargs):
+        return self.analyzer.analyze_transcript(transcript, **kwargs)
+
+    async def analyze_audio_async(self, audio, **kwargs):
+        self.analyses += 1
+        return await self.analyzer.analyze_audio_async(audio, **kwargs)
+
+    async def analyze_transcript_async(self, transcript, **kwargs):
+        return await self.analyzer.analyze_transcript_async(transcript, **kwargs)
+
+
+class AnalyzerRegistry:
+    """Process-wide owner of the ConversationAnalyzer.
+
+    Created once at startup: the analyzer is built on first use (or by
+    start()), warmed up in the background so the first consultation
+    doesn't pay for connection setup, and handed out to clients as
+    AnalyzerSession views. Safe to use from any thread.
+    """
+
+    def __init__(self, config: Config = None):
+        self.config = config or Config()
+        self._lock = threading.Lock()
+        self._analyzer = None
+        self._sessions = {}
+        self._ready = threading.Event()
+
+    @property
+    def analyzer(self):
+        with self._lock:
+            if self._analyzer is None:
+                self._analyzer = ConversationAnalyzer(self.config)
+            return self._analyzer
+
+    def start(self):
+        """Build and warm up the analyzer without blocking the caller"""
+        thread = threading.Thread(target=self._warm_up, name="analyzer-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def _warm_up(self):
+        try:
+            self.analyzer.warm_up()
+        finally:
+            self._ready.set()
+
+    def wait_ready(self, timeout=None):
+        """Block until the warm-up has finished (successfully or not)"""
+        return self._ready.wait(timeout)
+
+    def session(self, session_id):
+        """The view for a client, created on first request"""
+        with self._lock:
+            view = self._sessions.get(session_id)
+        if view is None:
+            analyzer = self.analyzer
+            with self._lock:
+                view = self._sessions.setdefault(session_id, AnalyzerSession(analyzer, session_id))
+        return view
+
+    def release(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self._ready.is_set(),
+                'sessions': len(self._sessions),
+                'analyses': sum(view.analyses for view in self._sessions.values()),
+                'requests': self._analyzer.limiter.stats() if self._analyzer else None
+            }
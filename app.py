@@ -1,12 +1,19 @@
-from flask import Flask, render_template, jsonify
+from flask import Flask, Response, render_template, jsonify, request
 from flask_socketio import SocketIO, emit
+from analysis_jobs import AnalysisQueue, QueueFullError
+from analyzer_registry import AnalyzerRegistry
 from audio_recorder import create_recorder
-from conversation_analyzer import ConversationAnalyzer
 import threading
 import json
+import time
 from config import Config
-import base64
+from audio_input import AudioInput
 from consultation_recorder import ConsultationRecorder
+from live_transcription import LiveTranscriber, create_recognizer, transcript_path
+from metrics import CONTENT_TYPE, LATENCY_BUCKETS, REGISTRY, ConsultationLog
+from realtime_qa import RealtimeQAEngine
+from speculative_upload import SpeculativeUploader
+import tracing
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'secret!'
@@ -15,31 +22,276 @@ socketio = SocketIO(app, ping_timeout=3600, ping_interval=10)
 # Global variables
 recorder = None
 record_func = None
-analyzer = None
 is_recording = False
+live_session = None
+speculative_upload = None
+recording_trace = None
+
+# Read once at startup and shared by every session
+config = Config()
+tracing.configure(config.tracing)
+analyzer_registry = AnalyzerRegistry(config)
+analyzer_registry.start()
+
+JOB_WAIT_SECONDS = REGISTRY.histogram(
+    'analysis_job_wait_seconds', "Time recordings spent queued for an analysis worker", LATENCY_BUCKETS)
+JOB_SECONDS = REGISTRY.histogram(
+    'analysis_job_seconds', "Analysis job run time, stop to saved result", LATENCY_BUCKETS, labels=('outcome',))
+SAVE_SECONDS = REGISTRY.histogram(
+    'consultation_save_seconds', "ConsultationRecorder.save_consultation", LATENCY_BUCKETS)
+EMIT_SECONDS = REGISTRY.histogram(
+    'analysis_emit_seconds', "Emitting the result to the client over Socket.IO", LATENCY_BUCKETS)
+consultation_log = ConsultationLog(config.metrics.log_path)
 
 # 初始化 ConsultationRecorder
 consultation_recorder = ConsultationRecorder()
 
+def analyze_live_transcript(job, report):
+    """Q&A and summary from the transcript recognized during the recording.
+
+    Returns None when live transcription failed, did not finish the tail
+    within stop_timeout_seconds, heard nothing or could not tell the
+    speakers apart, so the recording is analyzed as audio instead.
+    """
+    live = job.context['live']
+    report('transcribing')
+    with tracing.span('live.close') as span:
+        transcript = live.close(config.live.stop_timeout_seconds)
+        span.set(segments=len(transcript), complete=live.complete)
+        if not live.complete:
+            # A truncated transcript would lose the end of the consultation; use the audio
+            span.set(fallback=live.error or f"recognizer still running after {config.live.stop_timeout_seconds}s")
+    if live.qa_engine is not None:
+        # The extraction below replaces the running notes
+        live.qa_engine.stop()
+    if not live.complete or not transcript:
+        return None
+    if all(entry['speaker'] == 'Unknown' for entry in transcript):
+        # No diarization labels came back; the audio path attributes speakers
+        print("Live transcript has no speaker labels; analyzing the recording instead")
+        return None
+
+    extraction = job.context['analyzer'].analyze_transcript(transcript, on_progress=report)
+    if not extraction:
+        return None
+    stats = live.stats()
+    return {
+        'transcript': transcript,
+        'qa_analysis': extraction['qa_analysis'],
+        'summary': extraction['summary'],
+        'validation': extraction['validation'],
+        'audio_processing': {
+            'mode': 'live',
+            'recognizer': stats['recognizer'],
+            'audio_seconds': stats['audio_seconds']
+        },
+        'pipeline': dict(extraction['pipeline'], live=stats)
+    }
+
+def run_analysis(job, report, partial):
+    """Analyze one recording on an analysis worker"""
+    with tracing.activate(job.context.get('trace')):
+        tracing.record('queue_wait', job.submitted_at, job.started_at)
+        with tracing.span('analysis_job', job_id=job.id):
+            analysis = None
+            speculative = job.context.get('speculative')
+            if job.context.get('live'):
+                analysis = analyze_live_transcript(job, report)
+                if analysis is not None and speculative:
+                    # The audio won't be sent after all
+                    speculative.discard()
+            if analysis is None:
+                if speculative:
+                    # Waits for a window upload in flight rather than repeating it
+                    with tracing.span('speculative.finish'):
+                        speculative.finish()
+                with tracing.span('read') as span:
+                    audio = AudioInput.from_file(job.audio)
+                    span.set(bytes=audio.nbytes)
+                analysis = job.context['analyzer'].analyze_audio(
+                    audio,
+                    on_progress=report,
+                    on_partial=partial
+                )
+                if analysis and speculative:
+                    analysis['pipeline']['speculative'] = speculative.stats()
+            if not analysis:
+                raise RuntimeError('Failed to analyze audio')
+
+            # 自动保存分析结果
+            report('saving')
+            start = time.perf_counter()
+            with tracing.span('save_consultation'):
+                job.context['consultation'] = consultation_recorder.save_consultation(analysis)
+            SAVE_SECONDS.observe(time.perf_counter() - start)
+            return analysis
+
+def log_consultation(job, emit_seconds, trace=None):
+    """Job metrics and the consultation log line, once the result has gone out"""
+    run_seconds = job.finished_at - job.started_at
+    JOB_WAIT_SECONDS.observe(job.started_at - job.submitted_at)
+    JOB_SECONDS.observe(run_seconds, outcome='ok' if job.error is None else 'error')
+    EMIT_SECONDS.observe(emit_seconds)
+
+    analysis = job.result or {}
+    pipeline = analysis.get('pipeline', {})
+    consultation_log.write({
+        'event': 'consultation',
+        'job_id': job.id,
+        'trace_id': trace.trace_id if trace else None,
+        'recording': job.context.get('recording'),
+        'consultation': job.context.get('consultation'),
+        'status': job.status,
+        'error': job.error,
+        'mode': analysis.get('audio_processing', {}).get('mode', 'whole') if analysis else None,
+        'audio_seconds': analysis.get('audio_processing', {}).get('audio_seconds'),
+        'queue_seconds': round(job.started_at - job.submitted_at, 3),
+        'run_seconds': round(run_seconds, 3),
+        'emit_seconds': round(emit_seconds, 3),
+        'stages': {name: pipeline[name] for name in ('analyze', 'transcribe', 'extract') if name in pipeline},
+        'calls': pipeline.get('calls'),
+        'validation': analysis.get('validation'),
+        'live': pipeline.get('live'),
+        'speculative': pipeline.get('speculative')
+    })
+
+def emit_job_event(name, payload, job):
+    """Send job events to the client that submitted the recording"""
+    if name != 'audio_analysis':
+        socketio.emit(name, payload, to=job.context.get('sid'))
+        return
+
+    # The result closes the consultation's trace
+    trace = job.context.get('trace')
+    start = time.perf_counter()
+    with tracing.activate(trace), tracing.span('emit', event=name):
+        socketio.emit(name, payload, to=job.context.get('sid'))
+    log_consultation(job, time.perf_counter() - start, trace)
+    tracing.finish(trace, error=job.error)
+
+analysis_queue = AnalysisQueue(
+    run_analysis,
+    workers=config.jobs.workers,
+    max_queued=config.jobs.max_queued,
+    on_event=emit_job_event
+)
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+@app.route('/analysis/<job_id>')
+def analysis_status(job_id):
+    job = analysis_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown analysis job'}), 404
+    status = job.to_dict()
+    if job.result is not None:
+        status['data'] = job.result
+    return jsonify(status)
+
+@app.route('/consultations/<filename>/reanalyze', methods=['POST'])
+def reanalyze_consultation(filename):
+    """Re-run Q&A and summary from a consultation's stored transcript"""
+    try:
+        consultation = consultation_recorder.load_consultation(filename)
+    except (OSError, ValueError):
+        return jsonify({'error': 'Unknown consultation'}), 404
+    if not consultation.get('transcript'):
+        return jsonify({'error': 'Consultation has no stored transcript'}), 400
+
+    extraction = analyzer_registry.analyzer.analyze_transcript(
+        consultation['transcript'],
+        use_cache=request.args.get('cache', '1') != '0'
+    )
+    if not extraction:
+        return jsonify({'error': 'Failed to analyze transcript'}), 502
+
+    consultation['qa_analysis'] = extraction['qa_analysis']
+    consultation['summary'] = extraction['summary']
+    consultation['validation'] = extraction['validation']
+    consultation.setdefault('pipeline', {})['extract'] = extraction['pipeline']['extract']
+    consultation_recorder.save_consultation(consultation, filename)
+    return jsonify(consultation)
+
+def start_live_session(sid):
+    """Recognizer and realtime Q&A for a recording about to start, if enabled"""
+    if not config.live.enabled:
+        return None
+
+    def on_segment(segment):
+        socketio.emit('transcript_segment', segment.to_dict(), to=sid)
+
+    def on_qa_update(changes, snapshot):
+        socketio.emit('qa_update', {'changes': changes, 'qa_analysis': snapshot['qa_analysis']}, to=sid)
+
+    qa_engine = None
+    if config.live.realtime_qa:
+        qa_engine = RealtimeQAEngine.from_config(analyzer_registry.analyzer, config.realtime, on_update=on_qa_update)
+    try:
+        recognizer = create_recognizer(config.live)
+    except Exception as e:
+        print(f"Live transcription unavailable: {str(e)}")
+        return None
+    return LiveTranscriber(
+        recognizer,
+        rate=config.audio.sample_rate,
+        channels=config.audio.channels,
+        on_segment=on_segment,
+        qa_engine=qa_engine
+    )
+
+def discard_sessions(live, speculative):
+    """Tear down the per-recording helpers of a recording that won't be analyzed"""
+    if live:
+        live.close(0)
+        if live.qa_engine is not None:
+            live.qa_engine.stop()
+    if speculative:
+        speculative.discard()
+
 @socketio.on('start_recording')
 def handle_start_recording():
-    global recorder, record_func, analyzer, is_recording
+    global recorder, record_func, is_recording, live_session, speculative_upload, recording_trace
+    # One trace per consultation, carried to the analysis job and closed by its result
+    trace = recording_trace = tracing.start_trace('consultation', sid=request.sid)
     try:
-        config = Config()
-        analyzer = ConversationAnalyzer(config)
-        
         def on_audio_level(level):
-            socketio.emit('audio_level', {'level': level})
+            socketio.emit('audio_level', {
+                'level': level.peak,
+                'rms': level.rms,
+                'dbfs': level.dbfs
+            })
         
-        recorder, record_func = create_recorder(on_audio_level=on_audio_level)
+        def on_start(filename):
+            global speculative_upload
+            # Uploads made ahead are found by content through the upload registry
+            if config.speculative.enabled and config.upload.reuse_uploads:
+                speculative_upload = SpeculativeUploader(
+                    analyzer_registry.analyzer, filename, config.speculative.poll_seconds).start()
+            if live_session:
+                live_session.start(transcript_path(filename), source=recorder.reader('live'))
+                if live_session.qa_engine is not None:
+                    live_session.qa_engine.start()
+
+        with tracing.activate(trace), tracing.span('start_recording'):
+            live_session = start_live_session(request.sid)
+            recorder, record_func = create_recorder(
+                on_audio_level=on_audio_level,
+                audio_config=config.audio,
+                on_start=on_start
+            )
         is_recording = True
-        record_func()
+        # Speculative uploads started from on_start are traced under this span
+        with tracing.activate(trace), tracing.span('recording'):
+            record_func()
         
     except Exception as e:
+        tracing.finish(trace, error=str(e))
         socketio.emit('error', {'message': str(e)})
 
 @socketio.on('pause_recording')
@@ -56,35 +308,48 @@ def handle_resume_recording():
 
 @socketio.on('stop_recording')
 def handle_stop_recording():
-    global recorder, analyzer
+    global recorder, live_session, speculative_upload, recording_trace
     if recorder:
-        filename = recorder.stop()
-        if filename:
-            try:
-                with open(filename, 'rb') as f:
-                    audio_data = f.read()
-                    audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-                
-                analysis = analyzer.analyze_audio(audio_base64)
-                if analysis:
-                    # 自动保存分析结果
-                    consultation_recorder.save_consultation(analysis)
-                    
-                    socketio.emit('audio_analysis', {
-                        'status': 'success',
-                        'data': analysis
-                    })
-                else:
+        trace, recording_trace = recording_trace, None
+        error = None
+        # Stop-to-result latency is measured from the start of this span
+        with tracing.activate(trace), tracing.span('stop_recording'):
+            with tracing.span('recorder.stop'):
+                filename = recorder.stop()
+            # Release the microphone and end the level-metering loop
+            with tracing.span('recorder.close'):
+                recorder.close()
+            live, live_session = live_session, None
+            speculative, speculative_upload = speculative_upload, None
+            if not filename:
+                discard_sessions(live, speculative)
+                error = 'Nothing was recorded'
+            if filename:
+                # Hand off to the analysis workers so this handler returns at once;
+                # progress and the result arrive as analysis_* events
+                try:
+                    analysis_queue.submit(
+                        filename,
+                        analyzer=analyzer_registry.session(request.sid),
+                        sid=request.sid,
+                        recording=filename,
+                        live=live,
+                        speculative=speculative,
+                        trace=trace
+                    )
+                except QueueFullError as e:
+                    discard_sessions(live, speculative)
+                    error = str(e)
                     socketio.emit('audio_analysis', {
                         'status': 'error',
-                        'message': 'Failed to analyze audio'
-                    })
-            except Exception as e:
-                print(f"Audio analysis error: {str(e)}")
-                socketio.emit('audio_analysis', {
-                    'status': 'error',
-                    'message': f"Audio analysis error: {str(e)}"
-                })
+                        'message': str(e)
+                    }, to=request.sid)
+        if error:
+            tracing.finish(trace, error=error)
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    analyzer_registry.release(request.sid)
 
 if __name__ == '__main__':
     socketio.run(app, debug=True) 
\ No newline at end of file
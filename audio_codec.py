@@ -0,0 +1,63 @@
+import io
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from wav_writer import HEADER_SIZE, wav_bytes
+
+try:
+    import soundfile
+except ImportError:  # FLAC needs libsndfile; fall back to sending WAV
+    soundfile = None
+
+MIME_TYPES = {
+    'wav': 'audio/wav',
+    'flac': 'audio/flac',
+}
+
+
+@dataclass
+class EncodedAudio:
+    """Audio payload ready to send to the model"""
+    data: bytes
+    codec: str
+    input_bytes: int
+    encode_seconds: float
+
+    @property
+    def mime_type(self):
+        return MIME_TYPES[self.codec]
+
+    @property
+    def compression_ratio(self):
+        return self.input_bytes / len(self.data) if self.data else 1.0
+
+    def summary(self):
+        return {
+            'codec': self.codec,
+            'encoded_bytes': len(self.data),
+            'compression_ratio': round(self.compression_ratio, 3),
+            'encode_ms': round(self.encode_seconds * 1000, 1)
+        }
+
+
+def encode_audio(pcm, rate, codec='flac', channels=1):
+    """Losslessly encode 16-bit PCM for upload"""
+    start = time.perf_counter()
+    if codec == 'flac' and soundfile is None:
+        print("soundfile is not installed; uploading WAV instead of FLAC")
+        codec = 'wav'
+    if codec not in MIME_TYPES:
+        raise ValueError(f"Unsupported upload codec: {codec}")
+
+    if codec == 'flac':
+        samples = np.frombuffer(pcm, dtype='<i2').reshape(-1, channels)
+        out = io.BytesIO()
+        soundfile.write(out, samples, rate, format='FLAC', subtype='PCM_16')
+        data = out.getvalue()
+    else:
+        data = wav_bytes(pcm, rate, channels)
+
+    # Ratio is measured against the equivalent WAV
+    return EncodedAudio(data, codec, len(pcm) + HEADER_SIZE, time.perf_counter() - start)
@@ -0,0 +1,98 @@
+import base64
+import mmap
+import os
+import struct
+from dataclasses import dataclass, field
+from typing import Optional
+
+from wav_writer import wav_bytes
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+@dataclass
+class AudioInput:
+    """Uncompressed PCM audio handed to ConversationAnalyzer.
+
+    `pcm` is a read-only view of little-endian interleaved samples. Loading
+    from a file maps it into memory and loading from WAV bytes slices the
+    data chunk in place, so no path copies the audio before analysis.
+    """
+    pcm: memoryview
+    sample_rate: int
+    channels: int = 1
+    sample_width: int = 2
+    source: Optional[str] = None
+    _mapping: Optional[mmap.mmap] = field(default=None, repr=False)
+
+    @property
+    def nbytes(self):
+        return self.pcm.nbytes
+
+    @property
+    def duration(self):
+        """Length in seconds"""
+        return self.nbytes / (self.sample_rate * self.channels * self.sample_width)
+
+    @classmethod
+    def from_wav(cls, data, source=None):
+        """Parse a PCM WAV held in any buffer without copying the samples"""
+        view = memoryview(data).cast('B')
+        if len(view) < 12 or view[0:4] != b'RIFF' or view[8:12] != b'WAVE':
+            raise ValueError("Audio is not a RIFF/WAVE file")
+
+        fmt = None
+        offset = 12
+        while offset + 8 <= len(view):
+            chunk_id = bytes(view[offset:offset + 4])
+            size = struct.unpack_from('<I', view, offset + 4)[0]
+            body = offset + 8
+            if chunk_id == b'fmt ':
+                fmt = struct.unpack_from('<HHIIHH', view, body)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError("WAV data chunk precedes its fmt chunk")
+                format_tag, channels, rate, _, _, bits = fmt
+                if format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_EXTENSIBLE):
+                    raise ValueError(f"Unsupported WAV encoding: {format_tag:#x}")
+                # Recordings cut off mid-write may claim more data than exists
+                end = min(body + size, len(view))
+                block = channels * (bits // 8)
+                end -= (end - body) % block
+                return cls(view[body:end].toreadonly(), rate, channels, bits // 8, source)
+            # Chunks are word aligned
+            offset = body + size + (size & 1)
+        raise ValueError("WAV file has no data chunk")
+
+    @classmethod
+    def from_file(cls, path):
+        """Memory-map a WAV file"""
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError(f"Audio file is empty: {path}")
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        audio = cls.from_wav(mapping, source=path)
+        audio._mapping = mapping
+        return audio
+
+    @classmethod
+    def coerce(cls, audio):
+        """Accept the input forms callers have historically passed.
+
+        AudioInput, WAV bytes/bytearray/memoryview, a path to a WAV file,
+        or (legacy) a base64-encoded WAV string.
+        """
+        if isinstance(audio, cls):
+            return audio
+        if isinstance(audio, (bytes, bytearray, memoryview)):
+            return cls.from_wav(audio)
+        if isinstance(audio, (str, os.PathLike)):
+            if os.path.exists(audio):
+                return cls.from_file(audio)
+            return cls.from_wav(base64.b64decode(audio))
+        raise TypeError(f"Unsupported audio input: {type(audio).__name__}")
+
+    def to_wav(self):
+        """Serialize as WAV bytes"""
+        return wav_bytes(self.pcm, self.sample_rate, self.channels, self.sample_width)
@@ -0,0 +1,46 @@
+import math
+from dataclasses import dataclass, asdict
+
+import numpy as np
+
+# 16-bit signed PCM full scale
+FULL_SCALE = 32768.0
+# Level reported for digital silence (dynamic range of 16-bit audio)
+SILENCE_DBFS = -96.0
+
+
+@dataclass
+class AudioLevel:
+    """Level of one audio chunk"""
+    peak: int
+    rms: float
+    dbfs: float
+
+    def to_dict(self):
+        return asdict(self)
+
+
+SILENCE = AudioLevel(peak=0, rms=0.0, dbfs=SILENCE_DBFS)
+
+
+def measure_level(in_data) -> AudioLevel:
+    """Compute peak, RMS and dBFS of a chunk of little-endian int16 PCM.
+
+    `in_data` can be any buffer (bytes, bytearray, memoryview); it is viewed
+    in place with numpy and never copied, so this is safe to call once per
+    chunk from the PortAudio callback.
+    """
+    samples = np.frombuffer(in_data, dtype='<i2')
+    if samples.size == 0:
+        return SILENCE
+
+    # max/min on the int16 view avoids materialising an abs() copy
+    peak = max(int(samples.max()), -int(samples.min()))
+    # einsum accumulates in float64 without an intermediate squared array
+    energy = float(np.einsum('i,i->', samples, samples, dtype=np.float64))
+    rms = math.sqrt(energy / samples.size)
+    if rms <= 0:
+        return AudioLevel(peak=peak, rms=0.0, dbfs=SILENCE_DBFS)
+
+    dbfs = max(20 * math.log10(rms / FULL_SCALE), SILENCE_DBFS)
+    return AudioLevel(peak=peak, rms=rms, dbfs=dbfs)
@@ -1,31 +1,84 @@
-import queue
+import os
+import threading
 import pyaudio
-import wave
 from datetime import datetime
 from dataclasses import dataclass
+from audio_level import measure_level
+from capture_buffer import CaptureBuffer, DROP_OLDEST, NEVER_DROP
+from resampler import StreamingResampler, ANALYSIS_RATE
+from wav_writer import StreamingWavWriter
 
 # Audio recording parameters
 RATE = 16000
 CHUNK = int(RATE / 10)  # 100ms chunks
+BUFFER_SECONDS = 30  # capture history held in the ring buffer
+METER_BACKLOG_SECONDS = 1  # level updates older than this are dropped
 
 class AudioRecorder:
     """Handles audio recording and visualization"""
     
-    def __init__(self, rate=RATE, chunk=CHUNK):
+    def __init__(self, rate=RATE, chunk=CHUNK, buffer_seconds=BUFFER_SECONDS,
+                 meter_policy=DROP_OLDEST, record_policy=NEVER_DROP,
+                 meter_backlog_seconds=METER_BACKLOG_SECONDS, channels=1,
+                 analysis_rate=ANALYSIS_RATE, keep_original=False):
         self._rate = rate
         self._chunk = chunk
-        self._buff = queue.Queue()
+        self._channels = channels
+        self._analysis_rate = analysis_rate
+        self._keep_original = keep_original
+        slot_size = chunk * channels * pyaudio.get_sample_size(pyaudio.paInt16)
+        self._capture = CaptureBuffer(slot_size, max(2, int(buffer_seconds * rate / chunk)))
+        self._meter_policy = meter_policy
+        self._meter_capacity = max(1, int(meter_backlog_seconds * rate / chunk))
+        self._record_policy = record_policy
+        # PortAudio status_flags counters
+        self.input_overflows = 0
+        self.input_underflows = 0
         self.closed = True
         self._audio_interface = None
+        self._audio_stream = None
         self.paused = False
-        self.recording_data = []
+        self._lock = threading.Lock()
+        self._writer = None
+        self._original_writer = None
         self.recording_filename = None
+        self.original_filename = None
+        # Capture sequence number of the current recording's first chunk
+        self._start_seq = None
+
+    @classmethod
+    def from_config(cls, audio):
+        """Create a recorder from an AudioConfig"""
+        return cls(
+            rate=audio.sample_rate,
+            chunk=audio.chunk,
+            buffer_seconds=audio.buffer_seconds,
+            meter_backlog_seconds=audio.meter_backlog_seconds,
+            channels=audio.channels,
+            analysis_rate=audio.analysis_sample_rate,
+            keep_original=audio.keep_original
+        )
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @property
+    def channels(self):
+        return self._channels
 
     def __enter__(self):
+        return self.open()
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def open(self):
+        """Open the input stream; audio flows into the capture buffer"""
         self._audio_interface = pyaudio.PyAudio()
         self._audio_stream = self._audio_interface.open(
             format=pyaudio.paInt16,
-            channels=1,
+            channels=self._channels,
             rate=self._rate,
             input=True,
             frames_per_buffer=self._chunk,
@@ -36,77 +89,164 @@ class AudioRecorder:
         self.paused = False
         return self
 
-    def __exit__(self, type, value, traceback):
-        if self._audio_stream:
-            self._audio_stream.stop_stream()
-            self._audio_stream.close()
-        self.closed = True
-        self._buff.put(None)
-        if self._audio_interface:
-            self._audio_interface.terminate()
+    def close(self):
+        """Close the input stream and release every consumer"""
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self._audio_stream:
+                self._audio_stream.stop_stream()
+                self._audio_stream.close()
+                self._audio_stream = None
+            self._capture.close()
+            if self._audio_interface:
+                self._audio_interface.terminate()
+                self._audio_interface = None
 
     def _fill_buffer(self, in_data, frame_count, time_info, status_flags):
         """Audio data callback"""
+        if status_flags:
+            if status_flags & pyaudio.paInputOverflow:
+                self.input_overflows += 1
+            if status_flags & pyaudio.paInputUnderflow:
+                self.input_underflows += 1
         if not self.paused:
-            # Calculate audio level for visualization
-            audio_level = max(abs(int.from_bytes(in_data[i:i+2], byteorder='little', signed=True)) 
-                            for i in range(0, len(in_data), 2))
-            
-            self._buff.put((in_data, audio_level))
-            self.recording_data.append(in_data)
+            # Only copy into the ring; metering and file I/O run on consumers
+            self._capture.write(in_data)
             
         return None, pyaudio.paContinue
 
-    def start(self):
-        """Start a new recording"""
-        self.recording_data = []
-        self.recording_filename = f"recording_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
+    def start(self, directory=None):
+        """Start a new recording, streaming it to disk as it arrives.
+
+        The recording is written in the analysis format (mono at
+        analysis_rate), resampled chunk by chunk on the writer thread when
+        the capture format differs; with keep_original the capture-format
+        audio is archived next to it.
+        """
+        name = f"recording_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        if directory:
+            name = os.path.join(directory, name)
+        self.recording_filename = f"{name}.wav"
+
+        self._start_seq = self._capture.write_seq
+        resampler = StreamingResampler(self._rate, self._analysis_rate, self._channels)
+        self._writer = StreamingWavWriter(
+            self.recording_filename,
+            channels=1,
+            sample_width=pyaudio.get_sample_size(pyaudio.paInt16),
+            rate=self._analysis_rate,
+            transform=None if resampler.passthrough else resampler
+        ).open(source=self.reader('recording', policy=self._record_policy))
+
+        self.original_filename = None
+        if self._keep_original and not resampler.passthrough:
+            self.original_filename = f"{name}_original.wav"
+            self._original_writer = StreamingWavWriter(
+                self.original_filename,
+                channels=self._channels,
+                sample_width=pyaudio.get_sample_size(pyaudio.paInt16),
+                rate=self._rate
+            ).open(source=self.reader('original', policy=self._record_policy))
         return self.recording_filename
 
+    def reader(self, name, policy=NEVER_DROP):
+        """Capture reader for another consumer of the current recording, e.g. live transcription.
+
+        It starts at the recording's first chunk however late it is created
+        and has its own cursor, so neither the metering loop nor the file
+        writers wait for it or make it lose audio. Chunks are capture-format
+        views into the ring; closing the recorder ends the reader.
+        """
+        return self._capture.reader(name=name, policy=policy, start_seq=self._start_seq)
+
     def pause(self):
-        """Pause recording"""
-        self.paused = True
+        """Pause recording; PortAudio stops calling back until resumed"""
+        with self._lock:
+            if self.closed or self.paused:
+                return
+            self.paused = True
+            self._audio_stream.stop_stream()
 
     def resume(self):
         """Resume recording"""
-        self.paused = False
+        with self._lock:
+            if self.closed or not self.paused:
+                return
+            self.paused = False
+            self._audio_stream.start_stream()
 
     def stop(self):
-        """Stop recording and save the file"""
-        if not self.recording_data:
+        """Stop recording and finalize the file"""
+        writer, self._writer = self._writer, None
+        if writer is None:
             return None
             
         try:
-            with wave.open(self.recording_filename, 'wb') as wf:
-                wf.setnchannels(1)
-                wf.setsampwidth(self._audio_interface.get_sample_size(pyaudio.paInt16))
-                wf.setframerate(self._rate)
-                wf.writeframes(b''.join(self.recording_data))
+            writer.close()
+            original, self._original_writer = self._original_writer, None
+            if original:
+                # The archive copy is not needed for analysis; let it finish
+                # concurrently with the model call
+                threading.Thread(target=original.close).start()
+            self._report_backlog()
+            if writer.bytes_written == 0:
+                os.remove(writer.filename)
+                return None
             
             return self.recording_filename
         except Exception as e:
             print(f"Error saving audio file: {str(e)}")
             return None
 
+    def stats(self):
+        """Capture backlog and overflow counters"""
+        stats = self._capture.stats()
+        stats['input_overflows'] = self.input_overflows
+        stats['input_underflows'] = self.input_underflows
+        return stats
+
+    def _report_backlog(self):
+        """Log when this box fell behind during the recording"""
+        stats = self.stats()
+        dropped = sum(r['dropped'] for r in stats['readers'].values())
+        spilled = sum(r['spilled'] for r in stats['readers'].values())
+        if dropped or spilled or self.input_overflows:
+            print(f"Capture backlog: {dropped} chunks dropped, {spilled} spilled, "
+                  f"{self.input_overflows} input overflows - {stats['readers']}")
+
     def get_audio_data(self):
         """Generator yielding audio data and levels"""
-        while not self.closed:
-            data = self._buff.get()
-            if data is None:
-                return
-            
-            if not self.paused:
-                yield data  # Returns tuple of (audio_data, audio_level)
+        reader = self._capture.reader(
+            name='meter',
+            policy=self._meter_policy,
+            capacity=self._meter_capacity
+        )
+        for data in reader:
+            # data is only valid until the next read; copy it if it must be kept
+            yield data, measure_level(data)
+
+def create_recorder(on_audio_level=None, audio_config=None, on_start=None):
+    """Factory function to create and set up a recorder instance
 
-def create_recorder(on_audio_level=None):
-    """Factory function to create and set up a recorder instance"""
-    recorder = AudioRecorder()
+    `on_start(filename)` is called once the recording file is open; other
+    consumers of the audio take their own `recorder.reader()` from there
+    rather than hooking into the metering loop, which drops chunks to keep
+    the level display current.
+    """
+    if audio_config is not None:
+        recorder = AudioRecorder.from_config(audio_config)
+    else:
+        recorder = AudioRecorder()
     
     def record_and_visualize():
         try:
             with recorder as stream:
                 filename = stream.start()
                 print(f"Recording started: {filename}")
+                if on_start:
+                    on_start(filename)
                 
                 for audio_data, level in stream.get_audio_data():
                     if on_audio_level:
@@ -121,7 +261,7 @@ def create_recorder(on_audio_level=None):
 # Example usage:
 if __name__ == "__main__":
     def print_level(level):
-        print(f"Audio level: {level}")
+        print(f"Audio level: peak={level.peak} rms={level.rms:.1f} dBFS={level.dbfs:.1f}")
     
     recorder, record_func = create_recorder(on_audio_level=print_level)
     record_func() 
\ No newline at end of file
@@ -1,11 +1,12 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, filedialog
-import pyaudio
-import wave
 import threading
 import os
 import time
 from datetime import datetime
+from audio_recorder import AudioRecorder
+from config import Config
+from audio_input import AudioInput
 from conversation_analyzer import ConversationAnalyzer
 import json
 
@@ -16,23 +17,17 @@ class AudioRecorderGUI:
         self.root.title("Audio Recorder & Analyzer")
         self.root.geometry("800x600")  # Increased size for analysis display
         
-        # Initialize analyzer
-        self.analyzer = ConversationAnalyzer()
-        
-        # Audio configuration
-        self.chunk = 1024
-        self.format = pyaudio.paInt16
-        self.channels = 1
-        self.rate = 44100
+        # Initialize analyzer and the capture settings shared with the web app
+        self.config = Config()
+        self.analyzer = ConversationAnalyzer(self.config)
+        # Connect to the model while the first consultation is being recorded
+        threading.Thread(target=self.analyzer.warm_up, daemon=True).start()
         
         # Recording state
         self.is_recording = False
         self.is_paused = False
-        self.frames = []
-        
-        # PyAudio instance
-        self.p = None
-        self.stream = None
+        self.recorder = None
+        self.timestamp = None
         
         # Time tracking
         self.start_time = None
@@ -144,10 +139,6 @@ class AudioRecorderGUI:
         )
         self.analysis_text.pack(fill=tk.BOTH, expand=True)
         
-    def initialize_pyaudio(self):
-        if self.p is None:
-            self.p = pyaudio.PyAudio()
-            
     def update_timer(self):
         if self.is_recording and not self.is_paused:
             current = time.time() - self.start_time
@@ -163,24 +154,17 @@ class AudioRecorderGUI:
         
     def start_recording(self):
         try:
-            self.initialize_pyaudio()
+            # Callback-driven capture streams straight to disk; no polling thread
+            self.recorder = AudioRecorder.from_config(self.config.audio).open()
+            audio_filepath = self.recorder.start(directory=self.recordings_dir)
+            self.timestamp = os.path.basename(audio_filepath)[len("recording_"):-len(".wav")]
             
             # Reset recording state
             self.is_recording = True
             self.is_paused = False
-            self.frames = []
             self.start_time = time.time()
             self.total_elapsed = 0
             
-            # Open audio stream
-            self.stream = self.p.open(
-                format=self.format,
-                channels=self.channels,
-                rate=self.rate,
-                input=True,
-                frames_per_buffer=self.chunk
-            )
-            
             # Update GUI
             self.status_var.set("Recording...")
             self.record_btn.configure(state=tk.DISABLED)
@@ -188,11 +172,6 @@ class AudioRecorderGUI:
             self.stop_btn.configure(state=tk.NORMAL)
             self.file_label.configure(text="")
             
-            # Start recording thread
-            self.recording_thread = threading.Thread(target=self.record_audio)
-            self.recording_thread.daemon = True
-            self.recording_thread.start()
-            
             # Start timer
             self.update_timer()
             
@@ -206,6 +185,7 @@ class AudioRecorderGUI:
             
         if self.is_paused:
             # Resume recording
+            self.recorder.resume()
             self.is_paused = False
             self.start_time = time.time()
             self.status_var.set("Recording...")
@@ -214,21 +194,12 @@ class AudioRecorderGUI:
             self.update_timer()
         else:
             # Pause recording
+            self.recorder.pause()
             self.is_paused = True
             self.total_elapsed += time.time() - self.start_time
             self.status_var.set("Paused")
             self.pause_btn.configure(text="Resume")
             
-    def record_audio(self):
-        while self.is_recording:
-            if not self.is_paused:
-                try:
-                    data = self.stream.read(self.chunk, exception_on_overflow=False)
-                    self.frames.append(data)
-                except Exception as e:
-                    print(f"Error recording: {e}")
-                    break
-                    
     def stop_recording(self):
         if not self.is_recording:
             return
@@ -238,27 +209,13 @@ class AudioRecorderGUI:
             self.is_recording = False
             self.is_paused = False
             
-            # Clean up audio stream
-            if self.stream:
-                self.stream.stop_stream()
-                self.stream.close()
-                self.stream = None
+            # Finalize the file on disk and release the input stream
+            recorder, self.recorder = self.recorder, None
+            audio_filepath = recorder.stop()
+            recorder.close()
+            timestamp = self.timestamp
             
-            # Save recording
-            if self.frames:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                
-                # Save audio file
-                audio_filename = f"recording_{timestamp}.wav"
-                audio_filepath = os.path.join(self.recordings_dir, audio_filename)
-                
-                # Save the audio file
-                with wave.open(audio_filepath, 'wb') as wf:
-                    wf.setnchannels(self.channels)
-                    wf.setsampwidth(self.p.get_sample_size(self.format))
-                    wf.setframerate(self.rate)
-                    wf.writeframes(b''.join(self.frames))
-                
+            if audio_filepath:
                 self.status_var.set("Analyzing recording...")
                 self.file_label.configure(
                     text=f"Audio saved to:\n{os.path.abspath(audio_filepath)}"
@@ -285,14 +242,14 @@ class AudioRecorderGUI:
             print(f"\n=== start analyzing recording {timestamp} ===")
             print(f"audio file path: {audio_filepath}")
             
-            # Read the audio file
-            with open(audio_filepath, 'rb') as audio_file:
-                audio_data = audio_file.read()
-            print(f"audio file size: {len(audio_data)} bytes")
+            # Map the audio file; the analyzer converts uploads to the analysis format
+            audio = AudioInput.from_file(audio_filepath)
+            print(f"audio file size: {os.path.getsize(audio_filepath)} bytes, "
+                  f"{audio.sample_rate} Hz x {audio.channels} ch, {audio.duration:.1f}s")
             
             print("calling LLM API...")
             # Get analysis from Gemini
-            analysis = self.analyzer.analyze_audio(audio_data)
+            analysis = self.analyzer.analyze_audio(audio)
             
             if analysis:
                 print("LLM API call success!")
@@ -385,14 +342,14 @@ class AudioRecorderGUI:
         self.analysis_text.insert(tk.END, text)
         
     def cleanup_recording(self):
-        if self.stream:
+        if self.recorder:
             try:
-                self.stream.stop_stream()
-                self.stream.close()
+                self.recorder.stop()
+                self.recorder.close()
             except:
                 pass
             finally:
-                self.stream = None
+                self.recorder = None
         
         self.is_recording = False
         self.is_paused = False
@@ -400,8 +357,6 @@ class AudioRecorderGUI:
     def on_closing(self):
         if self.is_recording:
             self.stop_recording()
-        if self.p:
-            self.p.terminate()
         self.root.destroy()
         
     def upload_recording(self):
@@ -0,0 +1,198 @@
+"""Analyze a backlog of recordings in parallel
+
+Walks a directory for recording_*.wav, skips recordings that already have
+a consultation, and analyzes the rest with a bounded number in flight.
+Results are saved through ConsultationRecorder as consultation_<ts>.json,
+the name the desktop recorder uses. Every outcome is written to a
+checkpoint as soon as it is known, so an interrupted run can simply be
+started again: finished recordings are skipped and failed ones retried
+(up to --max-attempts across runs).
+
+Run from the repository root:
+    python batch_analyze.py recordings/ --workers 4
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from audio_input import AudioInput
+from config import Config
+from consultation_recorder import ConsultationRecorder
+from conversation_analyzer import ConversationAnalyzer
+
+DONE = 'done'
+FAILED = 'failed'
+
+
+class BatchCheckpoint:
+    """Outcome of each recording handled so far, keyed by absolute path"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def get(self, recording):
+        with self._lock:
+            return self._entries.get(os.path.abspath(recording))
+
+    def record(self, recording, entry):
+        with self._lock:
+            previous = self._entries.get(os.path.abspath(recording), {})
+            entry['attempts'] = previous.get('attempts', 0) + 1
+            self._entries[os.path.abspath(recording)] = entry
+            self._save()
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class BatchAnalyzer:
+    """Runs analyses for many recordings, at most `workers` at a time"""
+
+    def __init__(self, analyzer, recorder, checkpoint, workers=2, max_attempts=3, use_cache=True):
+        self.analyzer = analyzer
+        self.recorder = recorder
+        self.checkpoint = checkpoint
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.use_cache = use_cache
+        self.results = []
+        self.skipped = {}
+
+    def plan(self, directory):
+        """Recordings in `directory` still to analyze, oldest first"""
+        pending = []
+        for path in sorted(glob.glob(os.path.join(directory, 'recording_*.wav'))):
+            # Kept alongside resampled recordings; the analysis uses the other one
+            if path.endswith('_original.wav'):
+                continue
+            entry = self.checkpoint.get(path) or {}
+            if self.recorder.has_consultation(path):
+                self.skipped[path] = 'has consultation'
+            elif entry.get('status') == FAILED and entry.get('attempts', 0) >= self.max_attempts:
+                self.skipped[path] = f"failed {entry['attempts']} times: {entry.get('error')}"
+            else:
+                pending.append(path)
+        return pending
+
+    async def run(self, recordings):
+        slots = asyncio.Semaphore(self.workers)
+        await asyncio.gather(*(self._analyze(path, slots, len(recordings)) for path in recordings))
+        return self.results
+
+    async def _analyze(self, path, slots, total):
+        async with slots:
+            name = os.path.basename(path)
+            start = time.perf_counter()
+            entry = {'audio_seconds': None}
+            try:
+                audio = await asyncio.to_thread(AudioInput.from_file, path)
+                entry['audio_seconds'] = round(audio.duration, 2)
+                analysis = await self.analyzer.analyze_audio_async(audio, use_cache=self.use_cache)
+                if not analysis:
+                    raise RuntimeError('Failed to analyze audio')
+                filename = self.recorder.save_consultation(analysis, self.recorder.name_for_recording(path))
+                if filename is None:
+                    raise RuntimeError('Failed to save consultation')
+                entry.update(status=DONE, consultation=filename)
+            except Exception as e:
+                entry.update(status=FAILED, error=str(e))
+            entry['seconds'] = round(time.perf_counter() - start, 2)
+            entry['finished_at'] = time.time()
+            self.checkpoint.record(path, entry)
+            self.results.append(dict(entry, recording=name))
+
+            outcome = f"saved {entry['consultation']}" if entry['status'] == DONE else f"FAILED: {entry['error']}"
+            print(f"[{len(self.results)}/{total}] {name}: {outcome} ({entry['seconds']:.1f}s)")
+
+
+def summarize(results, elapsed):
+    """Throughput, latency percentiles and failures of a batch run"""
+    done = [result for result in results if result['status'] == DONE]
+    failed = [result for result in results if result['status'] == FAILED]
+    latencies = [result['seconds'] for result in done]
+    audio_seconds = sum(result['audio_seconds'] or 0 for result in done)
+    minutes = elapsed / 60
+    return {
+        'analyzed': len(done),
+        'failed': len(failed),
+        'elapsed_seconds': round(elapsed, 2),
+        'recordings_per_minute': round(len(done) / minutes, 2) if minutes else None,
+        'audio_minutes_per_minute': round(audio_seconds / 60 / minutes, 2) if minutes else None,
+        'latency_p50_seconds': round(float(np.percentile(latencies, 50)), 2) if latencies else None,
+        'latency_p95_seconds': round(float(np.percentile(latencies, 95)), 2) if latencies else None,
+        'failures': {result['recording']: result['error'] for result in failed}
+    }
+
+
+def print_summary(summary, skipped):
+    print("\n=== Batch summary ===")
+    print(f"Analyzed {summary['analyzed']}, failed {summary['failed']}, skipped {skipped} "
+          f"in {summary['elapsed_seconds']:.1f}s")
+    if summary['analyzed']:
+        print(f"Throughput: {summary['recordings_per_minute']} recordings/min, "
+              f"{summary['audio_minutes_per_minute']} audio-min/min")
+        print(f"Latency: p50 {summary['latency_p50_seconds']}s, p95 {summary['latency_p95_seconds']}s")
+    for recording, error in summary['failures'].items():
+        print(f"  {recording}: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze every recording_*.wav in a directory")
+    parser.add_argument('directory', nargs='?', default='.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help="recordings analyzed at once (default: jobs.workers from config.json)")
+    parser.add_argument('--checkpoint', default='cache/batch_checkpoint.json')
+    parser.add_argument('--consultations', default='consultations', help="where consultations are saved")
+    parser.add_argument('--max-attempts', type=int, default=3,
+                        help="give up on a recording after this many failed runs")
+    parser.add_argument('--no-cache', action='store_true', help="force fresh model calls")
+    parser.add_argument('--report', help="also write the summary to this JSON file")
+    args = parser.parse_args()
+
+    config = Config()
+    batch = BatchAnalyzer(
+        ConversationAnalyzer(config),
+        ConsultationRecorder(args.consultations),
+        BatchCheckpoint(args.checkpoint),
+        workers=args.workers or config.jobs.workers,
+        max_attempts=args.max_attempts,
+        use_cache=not args.no_cache
+    )
+    recordings = batch.plan(args.directory)
+    print(f"{len(recordings)} recordings to analyze, {len(batch.skipped)} skipped, "
+          f"{batch.workers} at a time")
+
+    start = time.perf_counter()
+    try:
+        asyncio.run(batch.run(recordings))
+    except KeyboardInterrupt:
+        print("\nInterrupted; run again to resume from the checkpoint")
+    summary = summarize(batch.results, time.perf_counter() - start)
+    summary['skipped'] = len(batch.skipped)
+    print_summary(summary, len(batch.skipped))
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+import threading
+from array import array
+
+# Reader policies when a consumer falls behind the writer
+DROP_OLDEST = 'drop_oldest'  # skip to recent audio, counting what was lost
+NEVER_DROP = 'never_drop'    # keep a copy of every chunk before it is overwritten
+
+
+class CaptureBuffer:
+    """Preallocated ring of fixed-size slots holding captured audio.
+
+    The audio callback is the only writer: `write()` copies the chunk into
+    the arena and then publishes it by advancing `write_seq`, without taking
+    a lock or allocating per-chunk objects. Consumers each own a
+    `CaptureReader` with their own cursor, which copies what it reads out
+    of the arena into a buffer of its own.
+
+    Each reader is a bounded queue over the ring with its own policy. A
+    NEVER_DROP reader that falls a full ring behind makes the writer copy
+    the chunk it is about to lose into that reader's spill map, so it only
+    costs allocations while the consumer is actually stalled.
+    """
+
+    def __init__(self, slot_size, slots):
+        self.slot_size = slot_size
+        self.slots = slots
+        self._arena = bytearray(slot_size * slots)
+        self._view = memoryview(self._arena)
+        self._lengths = array('I', [0] * slots)
+        # Total number of chunks ever written; only the writer advances it
+        self.write_seq = 0
+        self.closed = False
+        self._readers = ()
+        self._never_drop = ()
+        # Every reader ever created, so stats survive a reader closing
+        self._reader_stats = {}
+
+    def write(self, data):
+        """Copy a chunk into the next slot; called from the audio thread"""
+        if len(data) > self.slot_size:
+            # Oversized callbacks are rare; split them across several slots
+            view = memoryview(data)
+            for offset in range(0, len(data), self.slot_size):
+                self._store(view[offset:offset + self.slot_size])
+        else:
+            self._store(data)
+
+        for reader in self._readers:
+            reader._wakeup.set()
+
+    def _store(self, data):
+        # Chunk that leaves the readable window once this one is published
+        leaving = self.write_seq - self.slots + 1
+        for reader in self._never_drop:
+            if reader.read_seq <= leaving and leaving >= 0:
+                slot = leaving % self.slots
+                start = slot * self.slot_size
+                reader._spill[leaving] = bytes(self._view[start:start + self._lengths[slot]])
+                reader.spilled += 1
+
+        slot = self.write_seq % self.slots
+        start = slot * self.slot_size
+        self._arena[start:start + len(data)] = data
+        self._lengths[slot] = len(data)
+        # Publish only after the slot is filled
+        self.write_seq += 1
+
+    def reader(self, name=None, policy=DROP_OLDEST, capacity=None, from_start=False, start_seq=None):
+        """Create a consumer cursor, starting at the next chunk written.
+
+        `capacity` bounds how many chunks a DROP_OLDEST reader may lag
+        behind before the oldest are dropped; it defaults to the ring size.
+        `start_seq` starts the reader at an earlier chunk instead, as far
+        back as the ring still holds; older chunks count as dropped.
+        """
+        if policy not in (DROP_OLDEST, NEVER_DROP):
+            raise ValueError(f"Unknown capture reader policy: {policy}")
+        capacity = min(capacity or self.slots - 1, self.slots - 1)
+        if policy == NEVER_DROP:
+            # Spilling starts when the writer laps the reader, so it may use the whole ring
+            capacity = self.slots - 1
+        read_seq = 0 if from_start else self.write_seq
+        if start_seq is not None:
+            read_seq = max(start_seq, self.write_seq - (self.slots - 1), 0)
+        reader = CaptureReader(self, read_seq, name, policy, capacity)
+        if start_seq is not None:
+            reader.dropped = read_seq - start_seq
+        self._readers = self._readers + (reader,)
+        self._reader_stats[reader.name] = reader
+        if policy == NEVER_DROP:
+            self._never_drop = self._never_drop + (reader,)
+        return reader
+
+    def _remove_reader(self, reader):
+        self._readers = tuple(r for r in self._readers if r is not reader)
+        self._never_drop = tuple(r for r in self._never_drop if r is not reader)
+
+    def stats(self):
+        """Per-reader backlog counters"""
+        return {
+            'chunks_written': self.write_seq,
+            'readers': {name: reader.stats() for name, reader in self._reader_stats.items()}
+        }
+
+    def close(self):
+        """Mark the end of capture and wake every reader"""
+        self.closed = True
+        for reader in self._readers:
+            reader._wakeup.set()
+
+
+class CaptureReader:
+    """Cursor over a CaptureBuffer yielding memoryviews of what it read.
+
+    Each read is copied out of the arena into a buffer the reader reuses,
+    so a view stays intact however far the writer gets while the consumer
+    holds it, until the consumer's next `read()`. A DROP_OLDEST reader that falls more than
+    `capacity` chunks behind skips to the most recent `capacity` chunks and
+    counts the ones it missed in `dropped`; a NEVER_DROP reader reads the
+    chunks the writer spilled for it instead.
+    """
+
+    def __init__(self, buffer, read_seq, name=None, policy=DROP_OLDEST, capacity=None):
+        self._buffer = buffer
+        self.read_seq = read_seq
+        self.name = name or f"reader-{id(self):x}"
+        self.policy = policy
+        self.capacity = capacity or buffer.slots - 1
+        self.dropped = 0
+        self.spilled = 0
+        self.high_water = 0
+        self.closed = False
+        self._spill = {}
+        # Reused for every read; views of it are valid until the next one
+        self._copy = bytearray()
+        self._wakeup = threading.Event()
+
+    def __iter__(self):
+        while True:
+            view = self.read()
+            if view is None:
+                return
+            yield view
+
+    @property
+    def pending(self):
+        """Number of chunks written but not read yet"""
+        return self._buffer.write_seq - self.read_seq
+
+    def read(self, max_chunks=1, timeout=None):
+        """Block until data is available and return it as a memoryview.
+
+        Up to `max_chunks` consecutive full slots are returned as a single
+        view as long as they do not wrap around the end of the arena. The
+        view is only valid until the next call. Returns None once the reader or buffer is closed and drained, or if
+        `timeout` expires first.
+        """
+        buffer = self._buffer
+        while self.pending <= 0:
+            if self.closed or buffer.closed:
+                buffer._remove_reader(self)
+                return None
+            self._wakeup.clear()
+            if self.pending > 0:
+                break
+            if not self._wakeup.wait(timeout):
+                return None
+
+        backlog = self.pending
+        if backlog > self.high_water:
+            self.high_water = backlog
+
+        # Keep one slot of margin so the writer never fills the slot being read.
+        # Read write_seq before the spill map: the writer spills a chunk before
+        # publishing the write that overwrites it, so for a NEVER_DROP reader
+        # anything behind `oldest` is already in the map below
+        oldest = buffer.write_seq - self.capacity
+
+        if self._spill:
+            data = self._spill.pop(self.read_seq, None)
+            if data is not None:
+                self.read_seq += 1
+                return memoryview(data)
+            # Drop copies of chunks that were read from the ring after all
+            for seq in [seq for seq in self._spill if seq < self.read_seq]:
+                del self._spill[seq]
+
+        if self.read_seq < oldest:
+            self.dropped += oldest - self.read_seq
+            self.read_seq = oldest
+
+        first = self.read_seq % buffer.slots
+        count = 1
+        size = buffer._lengths[first]
+        limit = min(max_chunks, self.pending, buffer.slots - first)
+        while count < limit and size == count * buffer.slot_size:
+            size += buffer._lengths[first + count]
+            count += 1
+
+        start = first * buffer.slot_size
+        if len(self._copy) < size:
+            self._copy = bytearray(size)
+        self._copy[:size] = buffer._view[start:start + size]
+        view = memoryview(self._copy)[:size]
+
+        # The writer may have reused slots of the span while it was copied.
+        # read_seq has not moved yet, so for a NEVER_DROP reader they were
+        # spilled first; a DROP_OLDEST reader drops them
+        lapped = min(buffer.write_seq - buffer.slots + 1, self.read_seq + count) - self.read_seq
+        if lapped > 0 and self.policy == NEVER_DROP:
+            for i in range(lapped):
+                data = self._spill.pop(self.read_seq + i)
+                view[i * buffer.slot_size:i * buffer.slot_size + len(data)] = data
+        elif lapped > 0:
+            self.dropped += lapped
+            if lapped == count:
+                self.read_seq += count
+                return self.read(max_chunks, timeout)
+            view = view[lapped * buffer.slot_size:]
+
+        self.read_seq += count
+        return view
+
+    def stats(self):
+        return {
+            'policy': self.policy,
+            'pending': self.pending,
+            'high_water': self.high_water,
+            'dropped': self.dropped,
+            'spilled': self.spilled
+        }
+
+    def close(self):
+        """Stop after the chunks already written have been read"""
+        self.closed = True
+        self._wakeup.set()
@@ -13,6 +13,9 @@ class GeminiConfig:
     top_p: float
     top_k: int
     max_output_tokens: int
+    # Empty uses google.generativeai; set to a REST endpoint (such as
+    # fake_gemini_server.py) to send model calls there instead
+    base_url: str = ""
     
     def __post_init__(self):
         os.environ["GEMINI_API_KEY"] = self.api_key
@@ -26,10 +29,202 @@ class GeminiConfig:
             "max_output_tokens": self.max_output_tokens
         }
 
+@dataclass
+class AudioConfig:
+    """Audio capture configuration shared by the web and desktop recorders"""
+    sample_rate: int = 16000
+    channels: int = 1
+    chunk_ms: int = 100
+    buffer_seconds: int = 30
+    meter_backlog_seconds: float = 1.0
+    # Format recordings are normalized to before analysis
+    analysis_sample_rate: int = 16000
+    # Also keep the capture-format recording when it differs
+    keep_original: bool = False
+
+    @property
+    def chunk(self) -> int:
+        """Frames per PortAudio callback"""
+        return int(self.sample_rate * self.chunk_ms / 1000)
+
+@dataclass
+class VadConfig:
+    """Silence trimming applied to audio before it is sent for analysis"""
+    enabled: bool = True
+    frame_ms: int = 30
+    margin_db: float = 10.0
+    min_threshold_db: float = -50.0
+    # Cap on the estimated noise floor, so speech-dense recordings keep soft speech
+    max_noise_floor_db: float = -50.0
+    min_silence_ms: int = 1500
+    keep_silence_ms: int = 400
+    padding_ms: int = 200
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        return {
+            "frame_ms": self.frame_ms,
+            "margin_db": self.margin_db,
+            "min_threshold_db": self.min_threshold_db,
+            "max_noise_floor_db": self.max_noise_floor_db,
+            "min_silence_ms": self.min_silence_ms,
+            "keep_silence_ms": self.keep_silence_ms,
+            "padding_ms": self.padding_ms
+        }
+
+@dataclass
+class UploadConfig:
+    """How audio is transported to the model"""
+    # "flac" (lossless, needs soundfile) or "wav"
+    codec: str = "flac"
+    # Larger payloads go through the File API instead of inline data
+    inline_max_bytes: int = 14 * 1024 * 1024
+    # File API endpoint; point at fake_gemini_server.py to test offline
+    base_url: str = "https://generativelanguage.googleapis.com"
+    chunk_mb: float = 8
+    max_retries: int = 5
+    # Reuse uploaded files (until they expire) when re-analyzing a recording
+    reuse_uploads: bool = True
+    registry_path: str = "cache/uploads.json"
+
+@dataclass
+class JobsConfig:
+    """Background analysis worker pool"""
+    workers: int = 2
+    max_queued: int = 16
+
+@dataclass
+class CacheConfig:
+    """Persistent cache of analysis results"""
+    enabled: bool = True
+    directory: str = "cache/analysis"
+    max_entries: int = 500
+    max_mb: float = 200
+    max_age_days: float = 30
+
+@dataclass
+class SegmentConfig:
+    """Split long recordings into windows transcribed in parallel"""
+    enabled: bool = True
+    # Recordings up to this length are analyzed in a single request
+    min_recording_seconds: float = 600
+    window_seconds: float = 300
+    # Audio shared by neighbouring windows around each cut
+    overlap_seconds: float = 6
+    # How far from the nominal window end to look for a pause to cut at
+    search_seconds: float = 20
+    workers: int = 4
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        return {
+            "window_seconds": self.window_seconds,
+            "overlap_seconds": self.overlap_seconds,
+            "search_seconds": self.search_seconds
+        }
+
+@dataclass
+class PipelineConfig:
+    """How the analysis is split into model calls"""
+    # Transcribe first, then extract Q&A and summary from the text alone,
+    # so the extraction can be re-run without the audio
+    two_stage: bool = True
+    # Stream replies and publish transcript lines and Q&A sections as they complete
+    stream: bool = True
+    # Send a response schema and validate replies section by section
+    structured_output: bool = True
+    # Follow-up calls that re-request only the sections that failed validation
+    repair_attempts: int = 1
+
+@dataclass
+class LimitsConfig:
+    """Concurrency, rate limiting and retries for model requests"""
+    # Model requests in flight at once, across all analyses
+    max_concurrent_requests: int = 4
+    requests_per_minute: float = 60
+    burst: int = 4
+    # Floor the rate backs off to after repeated 429 responses
+    min_requests_per_minute: float = 6
+    max_attempts: int = 6
+    backoff_base_seconds: float = 1.0
+    backoff_max_seconds: float = 30.0
+    # Budget for one analysis's model requests, retries and waits included
+    deadline_seconds: float = 600
+
+@dataclass
+class RealtimeConfig:
+    """Q&A notes kept up to date while a consultation is being recorded"""
+    interval_seconds: float = 10
+    # Already-analyzed lines repeated before the new ones for continuity
+    context_lines: int = 4
+    # Length each note is cut to in the state summary sent every tick
+    summary_value_chars: int = 160
+    # Lower-confidence updates only replace a note when at least this sure
+    revise_confidence: float = 0.7
+    tick_timeout_seconds: float = 30
+
+@dataclass
+class LiveConfig:
+    """Transcription while recording, so stop only has the tail left to process"""
+    enabled: bool = False
+    # "google" (Speech-to-Text v2) or "local" (offline stand-in for tests)
+    recognizer: str = "google"
+    project_id: str = ""
+    location: str = "global"
+    model: str = "medical_conversation"
+    language_code: str = "en-US"
+    # Streaming calls are capped at about five minutes; reopen before that
+    max_stream_seconds: float = 280
+    # How long stop waits for the recognizer to finish the tail
+    stop_timeout_seconds: float = 10
+    # Keep Q&A notes up to date from the final segments (see RealtimeConfig)
+    realtime_qa: bool = True
+
+@dataclass
+class SpeculativeConfig:
+    """Upload finished windows of long recordings while they are still recorded"""
+    enabled: bool = True
+    # How often the recording file is checked for newly settled windows
+    poll_seconds: float = 15
+
+@dataclass
+class MetricsConfig:
+    """Instrumentation: /metrics is always served; this sets the consultation log"""
+    # One JSON line per consultation; empty to turn the log off
+    log_path: str = "logs/consultations.jsonl"
+
+@dataclass
+class TracingConfig:
+    """Stage-level traces of each consultation, from start_recording to the emitted result"""
+    enabled: bool = True
+    # "file" (JSON lines at path), "otlp" (OTLP/HTTP collector) or "none"
+    exporter: str = "file"
+    path: str = "logs/traces.jsonl"
+    otlp_endpoint: str = "http://localhost:4318"
+    service_name: str = "consultation-analyzer"
+    # Share of traces exported; slow ones are always kept
+    sample_rate: float = 1.0
+    # Stop-to-result time from which a trace is logged with its stage breakdown
+    slow_seconds: float = 30
+    slow_log_path: str = "logs/slow_traces.log"
+
 @dataclass
 class Config:
     
     gemini: GeminiConfig
+    audio: AudioConfig
+    vad: VadConfig
+    upload: UploadConfig
+    jobs: JobsConfig
+    cache: CacheConfig
+    segments: SegmentConfig
+    pipeline: PipelineConfig
+    limits: LimitsConfig
+    realtime: RealtimeConfig
+    live: LiveConfig
+    speculative: SpeculativeConfig
+    metrics: MetricsConfig
+    tracing: TracingConfig
     
     @classmethod
     def from_file(cls, filepath: str = "config.json"):
@@ -37,14 +232,59 @@ class Config:
             config_data = json.load(f)
             
         return cls(
-            gemini=GeminiConfig(**config_data["gemini"])
+            gemini=GeminiConfig(**config_data["gemini"]),
+            audio=AudioConfig(**config_data.get("audio", {})),
+            vad=VadConfig(**config_data.get("vad", {})),
+            upload=UploadConfig(**config_data.get("upload", {})),
+            jobs=JobsConfig(**config_data.get("jobs", {})),
+            cache=CacheConfig(**config_data.get("cache", {})),
+            segments=SegmentConfig(**config_data.get("segments", {})),
+            pipeline=PipelineConfig(**config_data.get("pipeline", {})),
+            limits=LimitsConfig(**config_data.get("limits", {})),
+            realtime=RealtimeConfig(**config_data.get("realtime", {})),
+            live=LiveConfig(**config_data.get("live", {})),
+            speculative=SpeculativeConfig(**config_data.get("speculative", {})),
+            metrics=MetricsConfig(**config_data.get("metrics", {})),
+            tracing=TracingConfig(**config_data.get("tracing", {}))
         )
     
-    def __init__(self,  gemini: GeminiConfig = None):
+    def __init__(self,  gemini: GeminiConfig = None, audio: AudioConfig = None,
+                 vad: VadConfig = None, upload: UploadConfig = None,
+                 jobs: JobsConfig = None, cache: CacheConfig = None,
+                 segments: SegmentConfig = None, pipeline: PipelineConfig = None,
+                 limits: LimitsConfig = None, realtime: RealtimeConfig = None,
+                 live: LiveConfig = None, speculative: SpeculativeConfig = None,
+                 metrics: MetricsConfig = None, tracing: TracingConfig = None):
         if gemini is None:
             config = self.from_file()
             
             self.gemini = config.gemini
+            self.audio = audio or config.audio
+            self.vad = vad or config.vad
+            self.upload = upload or config.upload
+            self.jobs = jobs or config.jobs
+            self.cache = cache or config.cache
+            self.segments = segments or config.segments
+            self.pipeline = pipeline or config.pipeline
+            self.limits = limits or config.limits
+            self.realtime = realtime or config.realtime
+            self.live = live or config.live
+            self.speculative = speculative or config.speculative
+            self.metrics = metrics or config.metrics
+            self.tracing = tracing or config.tracing
         else:
         
-            self.gemini = gemini 
\ No newline at end of file
+            self.gemini = gemini
+            self.audio = audio or AudioConfig()
+            self.vad = vad or VadConfig()
+            self.upload = upload or UploadConfig()
+            self.jobs = jobs or JobsConfig()
+            self.cache = cache or CacheConfig()
+            self.segments = segments or SegmentConfig()
+            self.pipeline = pipeline or PipelineConfig()
+            self.limits = limits or LimitsConfig()
+            self.realtime = realtime or RealtimeConfig()
+            self.live = live or LiveConfig()
+            self.speculative = speculative or SpeculativeConfig()
+            self.metrics = metrics or MetricsConfig()
+            self.tracing = tracing or TracingConfig() 
\ No newline at end of file
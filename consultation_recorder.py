@@ -3,25 +3,55 @@ from datetime import datetime
 import os
 
 class ConsultationRecorder:
-    def __init__(self):
+    def __init__(self, base_dir='consultations'):
         # 创建存储目录
-        self.base_dir = 'consultations'
+        self.base_dir = base_dir
         if not os.path.exists(self.base_dir):
             os.makedirs(self.base_dir)
 
-    def save_consultation(self, analysis_data):
-        """保存咨询记录"""
+    def save_consultation(self, analysis_data, filename=None):
+        """保存咨询记录
+
+        Pass the `filename` of an existing consultation to overwrite it.
+        Returns the file name, or None if saving failed.
+        """
         try:
             # 用时间戳命名文件
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f'consultation_{timestamp}.json'
-            filepath = os.path.join(self.base_dir, filename)
+            if filename is None:
+                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                filename = f'consultation_{timestamp}.json'
+            filepath = self._path(filename)
 
             # 保存为JSON文件
             with open(filepath, 'w', encoding='utf-8') as f:
                 json.dump(analysis_data, f, ensure_ascii=False, indent=4)
 
             print(f"Consultation saved to: {filepath}")
+            return filename
 
         except Exception as e:
-            print(f"Error saving consultation: {str(e)}") 
\ No newline at end of file
+            print(f"Error saving consultation: {str(e)}")
+            return None
+
+    def load_consultation(self, filename):
+        """Read a saved consultation; raises FileNotFoundError if it doesn't exist"""
+        with open(self._path(filename), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def name_for_recording(recording):
+        """Consultation file name for a recording: recording_<ts>.wav -> consultation_<ts>.json"""
+        stem = os.path.splitext(os.path.basename(recording))[0]
+        if stem.startswith('recording_'):
+            stem = stem[len('recording_'):]
+        return f'consultation_{stem}.json'
+
+    def has_consultation(self, recording):
+        """Whether a consultation has been saved for the recording"""
+        return os.path.exists(self._path(self.name_for_recording(recording)))
+
+    def _path(self, filename):
+        # Consultations are addressed by bare file name only
+        if os.path.basename(filename) != filename:
+            raise ValueError(f"Invalid consultation name: {filename}")
+        return os.path.join(self.base_dir, filename) 
\ No newline at end of file
@@ -1,154 +1,767 @@
 import google.generativeai as genai
-from google import genai as genai_client
 from config import Config
+from analysis_cache import AnalysisCache, hash_bytes, hash_json
+from analysis_prompts import ANALYSIS_PROMPT, QA_PROMPT, TRANSCRIPT_PROMPT, qa_prompt, repair_prompt
+from analysis_schema import (ANALYSIS_SCHEMA, QA_SCHEMA, TRANSCRIPT_SCHEMA, assemble_sections,
+                             sections_schema, validate_section, validate_sections, validate_transcript)
+from audio_codec import encode_audio
+from audio_input import AudioInput
+from file_upload import ResumableUploader, UploadRegistry
+from gemini_rest import RestModel
+from json_stream import StreamingJSONParser, salvage_json
+from metrics import (AUDIO_SECONDS_BUCKETS, BYTE_BUCKETS, LATENCY_BUCKETS, REGISTRY, TOKEN_BUCKETS)
+from rate_limit import AdaptiveTokenBucket, RequestLimiter, error_status
+from resampler import normalize_pcm
+from segmenter import plan_windows, stitch_transcripts
+from vad import trim_silence
+import tracing
+import asyncio
+import contextvars
 import json
+import threading
+import time
+
+# Monotonic time by which the current analysis's model requests must finish
+_deadline = contextvars.ContextVar('analysis_deadline', default=None)
+# Request and parse time, tokens and payload summed over the current analysis's model calls
+_calls = contextvars.ContextVar('analysis_calls', default=None)
+
+MODEL_CALL_SECONDS = REGISTRY.histogram(
+    'gemini_call_seconds', "Model call latency, including limiter waits and retries",
+    LATENCY_BUCKETS, labels=('kind', 'outcome'))
+MODEL_INPUT_TOKENS = REGISTRY.histogram(
+    'gemini_input_tokens', "Prompt tokens per model call", TOKEN_BUCKETS, labels=('kind',))
+MODEL_OUTPUT_TOKENS = REGISTRY.histogram(
+    'gemini_output_tokens', "Reply tokens per model call", TOKEN_BUCKETS, labels=('kind',))
+MODEL_REQUEST_BYTES = REGISTRY.histogram(
+    'gemini_request_bytes', "Prompt text plus inline audio per model call", BYTE_BUCKETS, labels=('kind',))
+MODEL_ERRORS = REGISTRY.counter(
+    'gemini_call_errors', "Model calls that failed after retries", labels=('kind', 'status'))
+PARSE_FAILURES = REGISTRY.counter(
+    'gemini_parse_failures', "Replies that were not valid JSON", labels=('kind', 'outcome'))
+STAGE_SECONDS = REGISTRY.histogram(
+    'analysis_stage_seconds', "Pipeline stage wall time", LATENCY_BUCKETS, labels=('stage', 'cache'))
+ANALYSIS_SECONDS = REGISTRY.histogram(
+    'analysis_seconds', "Whole analyses, audio or transcript", LATENCY_BUCKETS, labels=('input', 'outcome'))
+ANALYSIS_AUDIO_SECONDS = REGISTRY.histogram(
+    'analysis_audio_seconds', "Length of analyzed recordings", AUDIO_SECONDS_BUCKETS, labels=('mode',))
+
+
+def _payload_bytes(contents):
+    """Prompt text plus inline audio of a request; uploaded files are only referenced"""
+    size = 0
+    for part in contents:
+        if isinstance(part, str):
+            size += len(part.encode('utf-8'))
+        elif 'data' in part:
+            size += memoryview(part['data']).nbytes
+    return size
+
+
+def _token_counts(response):
+    """(prompt, reply) tokens from a response's usage_metadata, 0 where missing"""
+    usage = getattr(response, 'usage_metadata', None)
+    return (getattr(usage, 'prompt_token_count', 0) or 0,
+            getattr(usage, 'candidates_token_count', 0) or 0)
+
+def parse_json_response(response_text):
+    """Extract the JSON object from a model reply, fenced in ``` or bare"""
+    if '```json' in response_text:
+        # Extract content between ```json and ```
+        json_str = response_text.split('```json')[1].split('```')[0].strip()
+    elif '```' in response_text:
+        # If no json marker, try to extract between ``` and ```
+        json_str = response_text.split('```')[1].split('```')[0].strip()
+    else:
+        json_str = response_text.strip()
+    return json.loads(json_str)
+
+class PartialPublisher:
+    """Turns values completed in a streamed reply into partial-result events.
+
+    `on_partial(kind, data)` receives 'transcript_entry' ({'index',
+    'entry'}), 'qa_section' ({'section', 'value'}) and 'summary' events,
+    and the time to the first of each kind is recorded for the pipeline
+    timings. Values that fail validation are held back; repaired sections
+    are published once the repair call returns.
+    """
+
+    def __init__(self, on_partial):
+        self.on_partial = on_partial
+        self.start = time.perf_counter()
+        self.first_line_seconds = None
+        self.first_section_seconds = None
+        self.lines = 0
+
+    def __call__(self, path, value):
+        if len(path) == 2 and path[0] == 'transcript':
+            entries, _ = validate_transcript([value])
+            if entries:
+                self.transcript_entry(entries[0])
+        elif len(path) == 2 and path[0] == 'qa_analysis':
+            section = self._valid(f"qa_analysis.{path[1]}", value)
+            if section is not None:
+                if self.first_section_seconds is None:
+                    self.first_section_seconds = self._elapsed()
+                self.on_partial('qa_section', {'section': path[1], 'value': section})
+        elif path == ('summary',):
+            summary = self._valid('summary', value)
+            if summary is not None:
+                self.on_partial('summary', summary)
+
+    def transcript_entry(self, entry):
+        if self.first_line_seconds is None:
+            self.first_line_seconds = self._elapsed()
+        self.on_partial('transcript_entry', {'index': self.lines, 'entry': entry})
+        self.lines += 1
+
+    @staticmethod
+    def _valid(name, value):
+        try:
+            return validate_section(name, value)
+        except (ValueError, KeyError):
+            return None
+
+    def _elapsed(self):
+        return round(time.perf_counter() - self.start, 3)
+
+    def timings(self):
+        timings = {
+            'first_line_seconds': self.first_line_seconds,
+            'first_section_seconds': self.first_section_seconds,
+            'total_seconds': self._elapsed()
+        }
+        print(f"Time to first transcript line: {timings['first_line_seconds']}s, "
+              f"to full result: {timings['total_seconds']}s")
+        return timings
+
 class ConversationAnalyzer:
     def __init__(self, config: Config = None):
         if config is None:
             config = Config()
+        self.config = config
             
         # Configure Gemini API
         genai.configure(api_key=config.gemini.api_key)
         
-        # Initialize model and client
-        self.model = genai.GenerativeModel(
-            model_name=config.gemini.model_name,
-            generation_config=config.gemini.generation_config
+        # Initialize model
+        if config.gemini.base_url:
+            self.model = RestModel(
+                config.gemini.api_key,
+                config.gemini.model_name,
+                generation_config=config.gemini.generation_config,
+                base_url=config.gemini.base_url
+            )
+        else:
+            self.model = genai.GenerativeModel(
+                model_name=config.gemini.model_name,
+                generation_config=config.gemini.generation_config
+            )
+        self.cache = AnalysisCache(
+            directory=config.cache.directory,
+            max_entries=config.cache.max_entries,
+            max_mb=config.cache.max_mb,
+            max_age_days=config.cache.max_age_days,
+            enabled=config.cache.enabled
+        )
+        upload = config.upload
+        self.uploader = ResumableUploader(
+            config.gemini.api_key,
+            base_url=upload.base_url,
+            chunk_mb=upload.chunk_mb,
+            max_retries=upload.max_retries,
+            pool_size=max(config.jobs.workers, config.segments.workers) * 2,
+            registry=UploadRegistry(upload.registry_path) if upload.reuse_uploads else None
         )
-        self.client = genai_client.Client(api_key=config.gemini.api_key)
+        limits = config.limits
+        self.limiter = RequestLimiter(
+            max_concurrent=limits.max_concurrent_requests,
+            bucket=AdaptiveTokenBucket(
+                requests_per_minute=limits.requests_per_minute,
+                burst=limits.burst,
+                min_requests_per_minute=limits.min_requests_per_minute
+            ),
+            max_attempts=limits.max_attempts,
+            backoff_base=limits.backoff_base_seconds,
+            backoff_max=limits.backoff_max_seconds
+        )
+        # Every analysis runs on this one loop, so the limiter (and the
+        # model's async channel) are shared however analyses are started
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    def _event_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='analyzer-loop', daemon=True).start()
+            return self._loop
+
+    def _run(self, coro):
+        """Run a coroutine on the analyzer loop and wait for it from synchronous code"""
+        return asyncio.run_coroutine_threadsafe(tracing.bind(coro), self._event_loop()).result()
+
+    async def _on_loop(self, coro):
+        """Await a coroutine on the analyzer loop from any event loop"""
+        loop = self._event_loop()
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(tracing.bind(coro), loop))
+
+    def submit(self, coro):
+        """Schedule a coroutine on the analyzer loop from any thread; returns a concurrent Future"""
+        return asyncio.run_coroutine_threadsafe(tracing.bind(coro), self._event_loop())
+
+    async def generate_json(self, contents, schema=None, timeout=None, kind='generate'):
+        """One model call under the shared request limits, parsed as a JSON object.
 
-    def analyze_audio(self, audio_data):
-        """Analyze complete audio recording and generate transcript, Q&A, and summary"""
+        `timeout` bounds the call including retries (defaults to
+        limits.deadline_seconds); `kind` labels it in the metrics. Raises
+        on failure.
+        """
+        async def call():
+            _deadline.set(time.monotonic() + (timeout or self.config.limits.deadline_seconds))
+            return await self._generate_json(contents, schema=schema, kind=kind)
+
+        return await self._on_loop(call())
+
+    def close(self):
+        """Stop the analyzer loop; pending analyses are abandoned"""
+        with self._loop_lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop = None
+
+    def warm_up(self):
+        """Open the model and File API connections ahead of the first analysis.
+
+        count_tokens_async goes through the same async client as
+        generate_content_async, on the analyzer loop, so the channel and TLS
+        session it sets up are reused by the first real request. Failures
+        are only logged; analysis will connect on demand.
+        """
+        start = time.perf_counter()
+        self._run(self._warm_up())
+        print(f"Analyzer warmed up in {time.perf_counter() - start:.2f}s")
+
+    async def _warm_up(self):
         try:
-            # Create file part for upload
-            audio_part = {
-                'data': audio_data,
-                'mime_type': 'audio/wav'
+            await self.model.count_tokens_async("warm up")
+        except Exception as e:
+            print(f"Model warm-up failed: {str(e)}")
+        await asyncio.to_thread(self.uploader.warm_up)
+
+    def _model_settings(self, segmented=False, audio=True):
+        """Everything besides the input and prompt that shapes a result"""
+        settings = {
+            'model_name': self.config.gemini.model_name,
+            'generation_config': self.config.gemini.generation_config,
+            'structured_output': self.config.pipeline.structured_output
+        }
+        if audio:
+            settings['vad'] = self.config.vad.params if self.config.vad.enabled else None
+            settings['segments'] = self.config.segments.params if segmented else None
+        return settings
+
+    def _use_segments(self, pcm, rate):
+        segments = self.config.segments
+        return segments.enabled and len(pcm) / 2 / rate > segments.min_recording_seconds
+
+    def _normalize_audio(self, audio: AudioInput):
+        """Convert to the analysis format (mono int16 at the analysis rate)"""
+        rate = self.config.audio.analysis_sample_rate
+        pcm = normalize_pcm(audio.pcm, audio.sample_rate, audio.channels, audio.sample_width, rate)
+        return pcm, rate
+
+    def _prepare_audio(self, pcm, rate):
+        """Trim long silences from normalized PCM before upload"""
+        if not self.config.vad.enabled:
+            return pcm, rate, {'original_bytes': len(pcm), 'payload_bytes': len(pcm)}
+
+        with tracing.span('vad') as span:
+            trimmed = trim_silence(pcm, rate, **self.config.vad.params)
+            span.set(audio_seconds=round(trimmed.original_duration, 2), kept_seconds=round(trimmed.trimmed_duration, 2))
+        audio_info = trimmed.summary()
+        audio_info['payload_bytes'] = len(trimmed.pcm)
+        print(f"VAD: {trimmed.original_duration:.1f}s -> {trimmed.trimmed_duration:.1f}s, "
+              f"saved {trimmed.bytes_saved} of {trimmed.original_bytes} bytes")
+        return trimmed.pcm, rate, audio_info
+
+    def _audio_part(self, pcm, rate, audio_info):
+        """Compress the payload and send it inline or through the File API"""
+        with tracing.span('encode', codec=self.config.upload.codec) as span:
+            encoded = encode_audio(pcm, rate, self.config.upload.codec)
+            span.set(encoded_bytes=len(encoded.data))
+        audio_info.update(encoded.summary())
+        # Keyed by content so re-analysis reuses the upload and a crashed
+        # upload resumes where it stopped
+        key = hash_bytes(encoded.data)
+
+        # A payload sent ahead while the recording was still running
+        # (upload_ahead) is referenced rather than sent inline again
+        uploaded_before = self.uploader.registry is not None and self.uploader.registry.get_file(key)
+        if not uploaded_before and len(encoded.data) <= self.config.upload.inline_max_bytes:
+            audio_info['transport'] = 'inline'
+            return {'data': encoded.data, 'mime_type': encoded.mime_type}
+
+        with tracing.span('upload', bytes=len(encoded.data)) as span:
+            uploaded = self.uploader.upload(encoded.data, encoded.mime_type, key=key)
+            span.set(reused=uploaded.reused)
+        audio_info['transport'] = 'file'
+        audio_info['file_name'] = uploaded.name
+        audio_info['upload_reused'] = uploaded.reused
+        return uploaded.to_part()
+
+    def would_upload(self, pcm, rate):
+        """Whether windows of this recording uploaded with upload_ahead would be used.
+
+        The analysis only analyzes a recording in windows past
+        segments.min_recording_seconds, and only finds earlier uploads
+        through the registry kept with upload.reuse_uploads (_audio_part
+        then references them instead of sending the audio inline).
+        Otherwise anything uploaded ahead is wasted.
+        """
+        return self.uploader.registry is not None and self._use_segments(pcm, rate)
+
+    def upload_ahead(self, pcm, rate):
+        """Upload a stretch of audio through the File API before it is analyzed.
+
+        The payload is trimmed and encoded exactly as _upload_part does it,
+        so when an analysis reaches the same audio it finds the upload by
+        content and references it instead of sending the audio at stop.
+        Returns (registry key, UploadedFile). Callers check would_upload on
+        the whole recording first.
+        """
+        if self.uploader.registry is None:
+            raise RuntimeError("upload_ahead needs upload.reuse_uploads")
+        with tracing.span('upload_ahead', audio_seconds=round(len(pcm) / 2 / rate, 2)):
+            pcm, rate, _ = self._prepare_audio(pcm, rate)
+            with tracing.span('encode', codec=self.config.upload.codec):
+                encoded = encode_audio(pcm, rate, self.config.upload.codec)
+            key = hash_bytes(encoded.data)
+            with tracing.span('upload', bytes=len(encoded.data)):
+                return key, self.uploader.upload(encoded.data, encoded.mime_type, key=key)
+
+    def forget_upload(self, key, name):
+        """Delete an upload made with upload_ahead that will not be analyzed"""
+        self.uploader.delete_file(name)
+        if self.uploader.registry:
+            self.uploader.registry.forget(key)
+
+    async def _generate_json(self, contents, publisher=None, schema=None, kind='generate'):
+        """Run one model call and parse the JSON object in its reply.
+
+        The call goes through the request limiter, which retries transient
+        and rate-limit failures within the analysis deadline. With
+        pipeline.structured_output the `schema` is sent as the response
+        schema. With a publisher (and pipeline.stream) the reply is
+        streamed, and transcript entries and Q&A sections are published as
+        they close. A reply that isn't valid JSON is salvaged for whatever
+        members did complete; callers validate what they get back.
+
+        Latency, tokens, payload size and failures are recorded under
+        `kind` in the model call metrics and the analysis's call totals.
+        """
+        generation_config = None
+        if schema is not None and self.config.pipeline.structured_output:
+            generation_config = {'response_mime_type': 'application/json', 'response_schema': schema}
+
+        start = time.perf_counter()
+        with tracing.span('model_call', kind=kind, stream=publisher is not None and self.config.pipeline.stream):
+            try:
+                return await self._call_model(contents, generation_config, publisher, kind, start)
+            except Exception as e:
+                MODEL_CALL_SECONDS.observe(time.perf_counter() - start, kind=kind, outcome='error')
+                MODEL_ERRORS.inc(kind=kind, status=error_status(e) or type(e).__name__)
+                calls = _calls.get()
+                if calls is not None:
+                    calls['errors'] += 1
+                raise
+
+    async def _call_model(self, contents, generation_config, publisher, kind, start):
+        if publisher is None or not self.config.pipeline.stream:
+            response = await self.limiter.call(
+                lambda: self.model.generate_content_async(contents=contents, generation_config=generation_config),
+                _deadline.get())
+            received = time.perf_counter()
+            with tracing.span('parse'):
+                reply = self._parse_reply(response.text, kind)
+            self._record_call(kind, contents, response, received - start, time.perf_counter() - received)
+            return reply
+
+        async def stream():
+            parsed = {}
+            sink = publisher
+
+            def on_value(path, value):
+                if path == ():
+                    parsed['value'] = value
+                elif sink:
+                    sink(path, value)
+
+            parser = StreamingJSONParser(on_value, max_depth=2)
+            text = []
+            parsing = 0.0
+            last = None
+            try:
+                response = await self.model.generate_content_async(
+                    contents=contents, generation_config=generation_config, stream=True)
+                async for chunk in response:
+                    # Usage comes complete with the final chunk
+                    last = chunk
+                    if chunk.parts:
+                        text.append(chunk.text)
+                        fed = time.perf_counter()
+                        try:
+                            parser.feed(chunk.text)
+                        except ValueError:
+                            # Malformed so far; the full reply is salvaged below
+                            sink = None
+                        parsing += time.perf_counter() - fed
+            except Exception as e:
+                if text:
+                    # Lines were already published; a retry would repeat them
+                    raise RuntimeError(f"Reply stream interrupted: {str(e)}") from e
+                raise
+            return parsed, text, parsing, last
+
+        parsed, text, parsing, last = await self.limiter.call(stream, _deadline.get())
+        received = time.perf_counter()
+        with tracing.span('parse', streamed_seconds=round(parsing, 4)):
+            reply = parsed['value'] if 'value' in parsed else self._parse_reply(''.join(text), kind)
+        parsing += time.perf_counter() - received
+        self._record_call(kind, contents, last, received - start - parsing, parsing)
+        return reply
+
+    @staticmethod
+    def _record_call(kind, contents, response, request_seconds, parse_seconds):
+        input_tokens, output_tokens = _token_counts(response)
+        request_bytes = _payload_bytes(contents)
+        MODEL_CALL_SECONDS.observe(request_seconds + parse_seconds, kind=kind, outcome='ok')
+        MODEL_INPUT_TOKENS.observe(input_tokens, kind=kind)
+        MODEL_OUTPUT_TOKENS.observe(output_tokens, kind=kind)
+        MODEL_REQUEST_BYTES.observe(request_bytes, kind=kind)
+        span = tracing.current()
+        if span is not None:
+            span.set(input_tokens=input_tokens, output_tokens=output_tokens, request_bytes=request_bytes)
+        calls = _calls.get()
+        if calls is not None:
+            calls['requests'] += 1
+            calls['request_seconds'] += request_seconds
+            calls['parse_seconds'] += parse_seconds
+            calls['input_tokens'] += input_tokens
+            calls['output_tokens'] += output_tokens
+            calls['request_bytes'] += request_bytes
+
+    @staticmethod
+    def _parse_reply(text, kind='generate'):
+        try:
+            return parse_json_response(text)
+        except (ValueError, IndexError) as e:
+            salvaged = salvage_json(text)
+            PARSE_FAILURES.inc(kind=kind, outcome='salvaged' if salvaged else 'failed')
+            calls = _calls.get()
+            if calls is not None:
+                calls['parse_failures'] += 1
+            if not salvaged:
+                raise
+            print(f"Reply is not valid JSON ({str(e)}); salvaged {', '.join(salvaged)}")
+            return salvaged
+
+    async def _repair_sections(self, transcript, reply, publisher=None):
+        """Keep the valid Q&A and summary sections and re-request only the rest.
+
+        Missing or invalid sections are asked for again in a text-only call
+        over the transcript, up to pipeline.repair_attempts times; sections
+        that never validate are left empty and listed under 'validation'.
+        """
+        valid, invalid = validate_sections(reply)
+        repaired = []
+        attempts = 0
+        while invalid and attempts < self.config.pipeline.repair_attempts:
+            attempts += 1
+            print(f"Re-requesting invalid sections: {', '.join(invalid)}")
+            try:
+                retry = await self._generate_json([repair_prompt(transcript, invalid)], schema=sections_schema(invalid),
+                                                  kind='repair')
+            except Exception as e:
+                print(f"Section repair failed: {str(e)}")
+                continue
+            fixed, invalid = validate_sections(retry, invalid)
+            valid.update(fixed)
+            repaired.extend(fixed)
+
+        result = assemble_sections(valid)
+        if publisher:
+            for name in repaired:
+                if name == 'summary':
+                    publisher(('summary',), result['summary'])
+                else:
+                    section = name.split('.', 1)[1]
+                    publisher(('qa_analysis', section), result['qa_analysis'][section])
+        result['validation'] = {'repaired': repaired, 'invalid': invalid, 'repair_calls': attempts}
+        return result
+
+    async def _run_stage(self, name, key, use_cache, run, report, cacheable=None):
+        """Run one pipeline stage (`run` is a coroutine function) through the cache and time it"""
+        start = time.perf_counter()
+        with tracing.span(name.lower()) as span:
+            value = self.cache.get(key) if use_cache else None
+            status = 'hit'
+            if value is None:
+                status = 'miss'
+                value = await run()
+                if cacheable is None or cacheable(value):
+                    self.cache.put(key, value)
+            else:
+                report('cached')
+            span.set(cache=status)
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=name.lower(), cache=status)
+        print(f"{name} stage: {seconds:.2f}s (cache {status})")
+        return value, {'seconds': round(seconds, 3), 'cache': status}
+
+    def _upload_part(self, pcm, rate, report):
+        """Trim, encode and send one stretch of audio"""
+        pcm, rate, audio_info = self._prepare_audio(pcm, rate)
+
+        # Create audio part, inline or uploaded depending on size
+        report('uploading')
+        audio_part = self._audio_part(pcm, rate, audio_info)
+        print(f"Audio payload: {audio_info['codec']} {audio_info['encoded_bytes']} bytes "
+              f"({audio_info['compression_ratio']:.2f}x, {audio_info['encode_ms']} ms), "
+              f"sent {audio_info['transport']}")
+        return audio_part, audio_info
+
+    async def _analyze_whole(self, pcm, rate, report, publisher):
+        """Transcript, Q&A and summary from a single request over the whole recording"""
+        audio_part, audio_info = await asyncio.to_thread(self._upload_part, pcm, rate, report)
+
+        # Get complete analysis
+        report('generating')
+        reply = await self._generate_json([ANALYSIS_PROMPT, audio_part], publisher, ANALYSIS_SCHEMA, kind='analysis')
+        transcript = self._valid_transcript(reply, audio_info)
+        analysis_data = dict(await self._repair_sections(transcript, reply, publisher), transcript=transcript)
+        # Offset map lets transcript times be mapped back to the recording
+        analysis_data['audio_processing'] = audio_info
+        return analysis_data
+
+    @staticmethod
+    def _valid_transcript(reply, audio_info):
+        """Well-formed transcript entries of a reply; raises if there are none"""
+        transcript, dropped = validate_transcript(reply.get('transcript'))
+        if dropped:
+            print(f"Dropped {dropped} malformed transcript entries")
+            audio_info['transcript_entries_dropped'] = dropped
+        if not transcript:
+            raise ValueError("Model reply contains no usable transcript")
+        return transcript
+
+    async def _transcribe_whole(self, pcm, rate, report, publisher):
+        audio_part, audio_info = await asyncio.to_thread(self._upload_part, pcm, rate, report)
+        report('transcribing')
+        reply = await self._generate_json([TRANSCRIPT_PROMPT, audio_part], publisher, TRANSCRIPT_SCHEMA,
+                                          kind='transcript')
+        transcript = self._valid_transcript(reply, audio_info)
+        return {'transcript': transcript, 'audio_processing': audio_info}
+
+    async def _transcribe_window(self, window, pcm):
+        start = time.perf_counter()
+        audio_part, audio_info = await asyncio.to_thread(
+            self._upload_part, window.pcm(pcm), window.rate, lambda stage: None)
+        reply = await self._generate_json([TRANSCRIPT_PROMPT, audio_part], schema=TRANSCRIPT_SCHEMA, kind='transcript')
+        transcript = self._valid_transcript(reply, audio_info)
+        audio_info.update(window.to_dict())
+        audio_info['entries'] = len(transcript)
+        audio_info['seconds'] = round(time.perf_counter() - start, 2)
+        return transcript, audio_info
+
+    async def _transcribe_segmented(self, pcm, rate, report, publisher):
+        """Transcribe overlapping windows concurrently and stitch the results.
+
+        Windows are cut at pauses, so wall-clock time follows the window
+        length (and worker count) rather than the recording length, and no
+        single response has to fit the whole transcript in max_output_tokens.
+        Up to segments.workers windows are in progress at once; their model
+        calls also count against the shared request limits.
+        """
+        segments = self.config.segments
+        windows = plan_windows(pcm, rate, **segments.params)
+        print(f"Segmented analysis: {len(windows)} windows of ~{segments.window_seconds:.0f}s, "
+              f"{segments.workers} workers")
+
+        report('transcribing')
+        workers = asyncio.Semaphore(segments.workers)
+
+        async def transcribe(window):
+            async with workers:
+                with tracing.span('window', index=window.index, audio_seconds=round(window.duration, 2)):
+                    return await self._transcribe_window(window, pcm)
+
+        results = await asyncio.gather(*(transcribe(window) for window in windows))
+
+        transcript = stitch_transcripts([part for part, _ in results])
+        entries = sum(len(part) for part, _ in results)
+        print(f"Stitched {entries} entries into {len(transcript)}")
+        return {
+            'transcript': transcript,
+            'audio_processing': {
+                'mode': 'segmented',
+                'windows': [info for _, info in results],
+                'duplicates_removed': entries - len(transcript)
             }
-            
-            # Get complete analysis
-            analysis_response = self.model.generate_content(
-                contents=[
-                    """Please analyze this medical consultation recording and provide the analysis in the following JSON format:
-
-                    {
-                        "transcript": [
-                                {"speaker": "Doctor", "text": "Doctor's statement here"},
-                                {"speaker": "Patient", "text": "Patient's response here"},
-                                {"speaker": "Doctor", "text": "Doctor's next statement"},
-                                ...
-                            ],
-                        "qa_analysis": {
-                            "cause": {
-                                "work": "answer about work posture/stress",
-                                "sleep": "answer about sleep quality",
-                                "sports_injuries": "answer about sports/hobbies injuries",
-                                "mva": "answer about motor vehicle accidents",
-                                "summary": "biggest cause summary"
-                            },
-                            "presentation": {
-                                "main_complaint": "answer about main complaint by analyzing the whole conversation about: 
-                                1. when do you feel the pain
-                                2. where eactly do you feel the pain
-                                3. how wuold you describe the pain (Achy, Stiff, Dull, Burning, Superficial, Numb, Tingling, Sharp, Deep, Clicking, Locking, Throbbing, Weakening, Shooting)",
-                                "onset": "answer about when it started",
-                                "is_chronic": "yes/no for >3 months"
-                            },
-                            "life_effect": {
-                                "activities_impact": "answer about impact on daily activities by analyzing the whole conversation about: 
-                                1. How does this problem affect your daily activities
-                                2. How does this problem affect your work/study
-                                3. How does this problem affect your sleep
-                                4. How does this problem affect your hobbies/sports
-                                5. How does this problem affect your mental state
-                                6. How does this problem affect your relationships",
-                                "nerve_root": "answer about nerve root symptoms",
-                                "clumsy": "answer about clumsy symptoms",
-                                "focus": "answer about focus issues",
-                                "immune": "answer about immune system",
-                                "stress": "answer about stress level"
-                            },
-                            "intent": {
-                                "previous_care": "answer about previous care/adjustments",
-                                "previous_exercises": "answer about previous exercises",
-                                "lifestyle_changes": "answer about lifestyle/environment changes",
-                                "why_not_healed": "answer about why not healed",
-                                "goal": "answer about treatment goals by analyzing the whole conversation about:
-                                1. What would you like to do more of once this problem is gone
-                                2. Would you like to be more productive at work, sleep better, enjoy yor hobbies, get back into sports or exercise or just feel healthier and happier"
-                            }
-                        },
-                        "summary": {
-                            "presentation": "symptoms and conditions summary",
-                            "life_effect": "impact on daily activities summary",
-                            "goal": "treatment objectives summary, based on the (activities_impact) in (life_effect)
-                            for example: if the patient says that the problem affects their work/study, then the goal should be more productive at work, if the patient says that the problem affects their sleep, then the goal should be better sleep, if the patient says that the problem affects their hobbies/sports, then the goal should be get back into sports or exercise, if the patient says that the problem affects their mental state, then the goal should be feel healthier and happier"
-                        }
+        }
+
+    async def _extract(self, transcript, use_cache, report, publisher=None):
+        key = self.cache.make_key(hash_json(transcript), QA_PROMPT, self._model_settings(audio=False))
+
+        async def run():
+            report('extracting')
+            reply = await self._generate_json([qa_prompt(transcript)], publisher, QA_SCHEMA, kind='extract')
+            return await self._repair_sections(transcript, reply, publisher)
+
+        # Don't keep a result with sections that never validated
+        return await self._run_stage('Extraction', key, use_cache, run, report,
+                               cacheable=lambda value: not value['validation']['invalid'])
+
+    def _start_deadline(self):
+        _deadline.set(time.monotonic() + self.config.limits.deadline_seconds)
+        calls = {'requests': 0, 'request_seconds': 0.0, 'parse_seconds': 0.0, 'input_tokens': 0,
+                 'output_tokens': 0, 'request_bytes': 0, 'parse_failures': 0, 'errors': 0}
+        _calls.set(calls)
+        return calls
+
+    @staticmethod
+    def _call_timings(calls):
+        """Model call totals for 'pipeline'; summed, so concurrent calls can exceed the wall time"""
+        return {name: round(value, 3) for name, value in calls.items()}
+
+    def analyze_transcript(self, transcript, on_progress=None, use_cache=True):
+        """Blocking version of analyze_transcript_async"""
+        return self._run(self._analyze_transcript(transcript, on_progress, use_cache))
+
+    async def analyze_transcript_async(self, transcript, on_progress=None, use_cache=True):
+        """Re-run the text-only Q&A and summary stage on a stored transcript.
+
+        Returns {'qa_analysis', 'summary', 'pipeline'}, or None on failure.
+        """
+        return await self._on_loop(self._analyze_transcript(transcript, on_progress, use_cache))
+
+    async def _analyze_transcript(self, transcript, on_progress, use_cache):
+        calls = self._start_deadline()
+        start = time.perf_counter()
+        try:
+            extraction, timing = await self._extract(transcript, use_cache, on_progress or (lambda stage: None))
+            ANALYSIS_SECONDS.observe(time.perf_counter() - start, input='transcript', outcome='ok')
+            return dict(extraction, pipeline={'extract': timing, 'calls': self._call_timings(calls)})
+        except Exception as e:
+            ANALYSIS_SECONDS.observe(time.perf_counter() - start, input='transcript', outcome='error')
+            print(f"Transcript analysis error: {str(e)}")
+            return None
+
+    def analyze_audio(self, audio, on_progress=None, use_cache=True, on_partial=None):
+        """Blocking version of analyze_audio_async, for the desktop GUI and worker threads"""
+        return self._run(self._analyze_audio(audio, on_progress, use_cache, on_partial))
+
+    async def analyze_audio_async(self, audio, on_progress=None, use_cache=True, on_partial=None):
+        """Analyze complete audio recording and generate transcript, Q&A, and summary
+
+        `audio` is an AudioInput; WAV bytes/memoryview, a WAV path and the
+        legacy base64 string are converted with AudioInput.coerce.
+        `on_progress(stage)` is called as the analysis moves through stages.
+
+        With pipeline.two_stage (and always for segmented recordings) the
+        audio is only transcribed, and Q&A and summary come from a
+        text-only call over the transcript, which analyze_transcript can
+        re-run later. Each stage is cached by its input, prompt and model
+        settings and timed under 'pipeline'; pass `use_cache=False` to force
+        fresh model calls.
+
+        `on_partial(kind, data)` receives each transcript entry and Q&A
+        section as soon as it is generated (see PartialPublisher).
+
+        Any number of analyses can be awaited at once: their model requests
+        share the analyzer's concurrency and rate limits, transient failures
+        are retried, and each analysis gives up (returning None) once
+        limits.deadline_seconds have passed. Callbacks run on the analyzer's
+        event loop thread.
+        """
+        return await self._on_loop(self._analyze_audio(audio, on_progress, use_cache, on_partial))
+
+    async def _analyze_audio(self, audio, on_progress, use_cache, on_partial):
+        def report(stage):
+            if on_progress:
+                on_progress(stage)
+
+        publisher = PartialPublisher(on_partial) if on_partial else None
+        calls = self._start_deadline()
+        start = time.perf_counter()
+        with tracing.span('analyze_audio'):
+            try:
+                report('preparing')
+                audio = AudioInput.coerce(audio)
+                with tracing.span('normalize', input_bytes=audio.nbytes):
+                    pcm, rate = await asyncio.to_thread(self._normalize_audio, audio)
+                segmented = self._use_segments(pcm, rate)
+                audio_hash = await asyncio.to_thread(hash_bytes, pcm)
+
+                if not (segmented or self.config.pipeline.two_stage):
+                    key = self.cache.make_key(audio_hash, ANALYSIS_PROMPT, self._model_settings())
+                    analysis_data, timing = await self._run_stage(
+                        'Analysis', key, use_cache, lambda: self._analyze_whole(pcm, rate, report, publisher), report,
+                        cacheable=lambda value: not value['validation']['invalid'])
+                    analysis_data = dict(analysis_data, pipeline={'analyze': timing})
+                else:
+                    key = self.cache.make_key(audio_hash, TRANSCRIPT_PROMPT, self._model_settings(segmented))
+                    transcribe = self._transcribe_segmented if segmented else self._transcribe_whole
+                    transcription, transcribe_timing = await self._run_stage(
+                        'Transcription', key, use_cache, lambda: transcribe(pcm, rate, report, publisher), report)
+                    if publisher and publisher.lines == 0:
+                        # Segmented or cached transcripts weren't streamed line by
+                        # line; publish them before the extraction starts
+                        for entry in transcription['transcript']:
+                            publisher.transcript_entry(entry)
+                    extraction, extract_timing = await self._extract(
+                        transcription['transcript'], use_cache, report, publisher)
+                    analysis_data = {
+                        'transcript': transcription['transcript'],
+                        'qa_analysis': extraction['qa_analysis'],
+                        'summary': extraction['summary'],
+                        'validation': extraction['validation'],
+                        'audio_processing': transcription['audio_processing'],
+                        'pipeline': {'transcribe': transcribe_timing, 'extract': extract_timing}
                     }
-                    
-                    Guidelines(must follow):
-
-                    1. For the transcript:
-                    - Use an array format with square brackets []
-                    - Each entry should have "speaker" (either "Doctor" or "Patient") and "text" fields
-                    - Keep each logical statement as a separate entry
-                    - Identify speakers based on context, voice characteristics, and content
-
-                    2. For the qa_analysis:
-                    - Always analyze the whole conversation then provide answers
-                    - Keep answers concise (1-2 sentences) but informative
-                    - Use direct quotes from the patient when possible
-                    - For yes/no questions, start with "Yes" or "No" followed by explanation
-                    - If information is not mentioned in the recording, use "Not mentioned" instead of guessing
-                    - The "summary" field in each section should synthesize the key points
-
-                    3. For the summary section:
-                    - "presentation" should focus on symptoms, duration, and severity
-                    - "life_effect" should highlight the most significant impacts on daily life
-                    - "goal" should clearly state what the patient hopes to achieve from treatment
-                    - Each summary should be 2-3 sentences maximum
-
-                    Please ensure the response is in valid JSON format.
-                    """,
-                    audio_part
-                ]
-            )
- 
-            # print(analysis_response.text)
-            # Parse JSON response
-            # Extract JSON from markdown code block
-            response_text = analysis_response.text
-            if '```json' in response_text:
-                # Extract content between ```json and ```
-                json_str = response_text.split('```json')[1].split('```')[0].strip()
-            else:
-                # If no json marker, try to extract between ``` and ```
-                json_str = response_text.split('```')[1].split('```')[0].strip()
-                
-            # Parse JSON
-            analysis_data = json.loads(json_str)
-            # print(analysis_data)
-            return analysis_data
+
+                audio_seconds = round(len(pcm) / 2 / rate, 2)
+                analysis_data['audio_processing'] = dict(
+                    analysis_data['audio_processing'], input_bytes=audio.nbytes, audio_seconds=audio_seconds)
+                analysis_data['pipeline']['calls'] = self._call_timings(calls)
+                if publisher:
+                    analysis_data['pipeline']['streaming'] = publisher.timings()
+                ANALYSIS_SECONDS.observe(time.perf_counter() - start, input='audio', outcome='ok')
+                ANALYSIS_AUDIO_SECONDS.observe(audio_seconds, mode=analysis_data['audio_processing'].get('mode', 'whole'))
+                return analysis_data
                 
-        # except Exception as e:
-        #     print(f"Audio analysis error: {str(e)}")
-        #     return None
-        #     try:
-        #         analysis_data = json.loads(analysis_response.text)
-        #         return {
-        #             'transcript': analysis_data.get('transcript', ''),
-        #             'qa_analysis': {
-        #                 'cause': analysis_data.get('qa_analysis', {}).get('cause', {}),
-        #                 'presentation': analysis_data.get('qa_analysis', {}).get('presentation', {}),
-        #                 'life_effect': analysis_data.get('qa_analysis', {}).get('life_effect', {}),
-        #                 'intent': analysis_data.get('qa_analysis', {}).get('intent', {})
-        #             },
-        #             'summary': analysis_data.get('summary', {})
-        #         }
-        #     except json.JSONDecodeError as e:
-        #         print(f"JSON parsing error: {str(e)}")
-        #         return None
+            # except Exception as e:
+            #     print(f"Audio analysis error: {str(e)}")
+            #     return None
+            #     try:
+            #         analysis_data = json.loads(analysis_response.text)
+            #         return {
+            #             'transcript': analysis_data.get('transcript', ''),
+            #             'qa_analysis': {
+            #                 'cause': analysis_data.get('qa_analysis', {}).get('cause', {}),
+            #                 'presentation': analysis_data.get('qa_analysis', {}).get('presentation', {}),
+            #                 'life_effect': analysis_data.get('qa_analysis', {}).get('life_effect', {}),
+            #                 'intent': analysis_data.get('qa_analysis', {}).get('intent', {})
+            #             },
+            #             'summary': analysis_data.get('summary', {})
+            #         }
+            #     except json.JSONDecodeError as e:
+            #         print(f"JSON parsing error: {str(e)}")
+            #         return None
             
-        except Exception as e:
-            print(f"Audio analysis error: {str(e)}")
-            return None
\ No newline at end of file
+            except Exception as e:
+                ANALYSIS_SECONDS.observe(time.perf_counter() - start, input='audio', outcome='error')
+                print(f"Audio analysis error: {str(e)}")
+                return None
\ No newline at end of file
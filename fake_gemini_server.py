@@ -0,0 +1,539 @@
+"""Local stand-in for the Gemini API, for testing and benchmarking offline.
+
+Serves the File API (resumable uploads) and generateContent,
+streamGenerateContent and countTokens with templated analysis replies.
+Run it standalone and point `gemini.base_url` and `upload.base_url` in
+config.json at it:
+
+    python fake_gemini_server.py --port 8765 --fail-every 3 --first-token-seconds 0.5
+
+or start it in-process with FakeGeminiServer().start().
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import wave
+from collections import deque
+from dataclasses import dataclass, field, fields
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from analysis_schema import QA_SECTIONS, SLOTS, Summary
+
+try:
+    import soundfile
+except ImportError:  # FLAC durations are estimated from the size instead
+    soundfile = None
+
+FILE_TTL_HOURS = 48
+# Roughly how the API counts: ~4 characters per text token, 32 tokens per audio second
+CHARS_PER_TOKEN = 4
+AUDIO_TOKENS_PER_SECOND = 32
+
+LINES = [
+    "So what brings you in today?",
+    "My lower back has been aching for about three weeks now.",
+    "Does the pain travel down either leg at all?",
+    "Sometimes into the right thigh, mostly after sitting for a long time.",
+    "How are you sleeping with it?",
+    "Not well, I wake up a couple of times a night when I turn over.",
+    "Have you had any treatment for it so far?",
+    "Just some stretches I found online and painkillers now and then.",
+]
+
+
+@dataclass
+class FakeModel:
+    """How the stand-in answers generateContent.
+
+    Replies fit the request: a transcript (about one line per
+    `seconds_per_line` of audio) when audio is attached, and the Q&A and
+    summary sections the response schema or prompt asks for. `replies`
+    can supply canned 'transcript' entries and 'sections' instead.
+    Realtime QA ticks get an update for the first slot still empty.
+    Replies take `first_token_seconds`, plus the prompt at
+    `prompt_tokens_per_second` (0 for free) and generation at
+    `tokens_per_second`, and stream in `stream_chunk_chars` pieces.
+    `error_rate` of requests fail with 503, requests beyond
+    `rate_limit_rpm` in a minute get 429 with a retry delay, and
+    `malformed_rate` of replies are cut off a third of the way from the end.
+    For `drop_rate` of requests the connection is closed without a reply.
+    """
+    first_token_seconds: float = 0.3
+    tokens_per_second: float = 300.0
+    stream_chunk_chars: int = 160
+    error_rate: float = 0.0
+    rate_limit_rpm: float = 0.0
+    malformed_rate: float = 0.0
+    seconds_per_line: float = 6.0
+    replies: dict = field(default_factory=dict)
+    seed: Optional[int] = None
+    prompt_tokens_per_second: float = 0.0
+    drop_rate: float = 0.0
+
+    def transcript(self, audio):
+        if 'transcript' in self.replies:
+            return self.replies['transcript']
+        seconds = sum(audio_seconds(data, mime_type) for data, mime_type in audio)
+        digest = hashlib.sha1(b''.join(data[:4096] for data, _ in audio)).hexdigest()[:6]
+        return [
+            {'speaker': 'Doctor' if i % 2 == 0 else 'Patient', 'text': f"{LINES[i % len(LINES)]} [{digest}:{i}]"}
+            for i in range(max(2, int(seconds / self.seconds_per_line)))
+        ]
+
+    @staticmethod
+    def slot_updates(prompt):
+        empty = re.search(r'Still empty: (.*)', prompt)
+        slot = empty.group(1).split(', ')[0] if empty else SLOTS[0]
+        return [{'slot': slot, 'value': f"{slot.split('.')[1].replace('_', ' ').capitalize()} "
+                                        "as described by the patient.", 'confidence': 0.8}]
+
+    def sections(self, qa_sections, summary):
+        canned = self.replies.get('sections', {})
+        reply = {}
+        if qa_sections:
+            reply['qa_analysis'] = {
+                name: canned.get('qa_analysis', {}).get(name) or _template(QA_SECTIONS[name])
+                for name in qa_sections
+            }
+        if summary:
+            reply['summary'] = canned.get('summary') or _template(Summary)
+        return reply
+
+
+def _template(model):
+    return {f.name: f"{f.name.replace('_', ' ').capitalize()} as described by the patient." for f in fields(model)}
+
+
+def audio_seconds(data, mime_type):
+    """Duration of an audio payload, estimated from its size if it can't be read"""
+    try:
+        if soundfile is not None:
+            return soundfile.info(io.BytesIO(data)).duration
+        if mime_type == 'audio/wav':
+            with wave.open(io.BytesIO(data)) as reader:
+                return reader.getnframes() / reader.getframerate()
+    except Exception:
+        pass
+    # 16 kHz mono int16, FLAC at roughly 60% of that
+    return len(data) / (16000 * 2 * (0.6 if mime_type == 'audio/flac' else 1))
+
+
+class FakeGeminiServer:
+    """In-memory File API implementing the resumable upload protocol.
+
+    `fail_every=N` makes every Nth chunk request store only half of its
+    body and answer 503, so clients have to query the offset and resume.
+    Uploaded files stay PROCESSING for `processing_seconds`. Model calls
+    behave as described by `model` (a FakeModel). With
+    `uplink_bytes_per_second`, request bodies are held back as if every
+    client shared one uplink of that speed.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, fail_every=0, processing_seconds=0.0, model=None,
+                 uplink_bytes_per_second=0.0):
+        self.fail_every = fail_every
+        self.processing_seconds = processing_seconds
+        self.uplink_bytes_per_second = uplink_bytes_per_second
+        self._uplink_free_at = 0.0
+        self.model = model or FakeModel()
+        self.sessions = {}
+        self.files = {}
+        self.chunk_requests = 0
+        self.failures_injected = 0
+        self.generate_requests = 0
+        self.errors_injected = 0
+        self.connections_dropped = 0
+        self.rate_limited = 0
+        self._recent = deque()
+        self._random = random.Random(self.model.seed)
+        self.lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def serve_forever(self):
+        """Serve on the calling thread until interrupted"""
+        try:
+            self._httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._httpd.server_close()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def file_resource(self, name):
+        entry = self.files[name]
+        state = 'ACTIVE' if time.time() >= entry['ready_at'] else 'PROCESSING'
+        return {
+            'name': name,
+            'displayName': entry['display_name'],
+            'mimeType': entry['mime_type'],
+            'sizeBytes': str(len(entry['data'])),
+            'uri': f"{self.base_url}/v1beta/{name}",
+            'state': state,
+            'expirationTime': entry['expires'],
+        }
+
+    def transfer(self, size):
+        """Hold a request body for as long as it takes over the simulated uplink"""
+        if not self.uplink_bytes_per_second:
+            return
+        with self.lock:
+            start = max(time.monotonic(), self._uplink_free_at)
+            self._uplink_free_at = start + size / self.uplink_bytes_per_second
+            done = self._uplink_free_at
+        time.sleep(max(0.0, done - time.monotonic()))
+
+    def drop(self):
+        """Whether to hang up on this model call instead of answering it"""
+        if not self.model.drop_rate:
+            # Leave the seeded sequence of errors and cut-off replies as it was
+            return False
+        with self.lock:
+            if self._random.random() < self.model.drop_rate:
+                self.connections_dropped += 1
+                return True
+        return False
+
+    def admit(self):
+        """Apply the configured quota and error rate; returns (status, message) to fail with"""
+        model = self.model
+        with self.lock:
+            self.generate_requests += 1
+            now = time.monotonic()
+            if model.rate_limit_rpm:
+                while self._recent and now - self._recent[0] > 60:
+                    self._recent.popleft()
+                if len(self._recent) >= model.rate_limit_rpm:
+                    self.rate_limited += 1
+                    wait = 60 - (now - self._recent[0])
+                    return 429, f"Resource has been exhausted (e.g. check quota). Please retry in {wait:.2f}s."
+                self._recent.append(now)
+            if self._random.random() < model.error_rate:
+                self.errors_injected += 1
+                return 503, "The model is overloaded. Please try again later."
+        return None
+
+    def audio_parts(self, request):
+        """(data, mime_type) of each audio part, inline or uploaded"""
+        audio = []
+        for content in request.get('contents', []):
+            for part in content.get('parts', []):
+                if 'inlineData' in part:
+                    inline = part['inlineData']
+                    audio.append((base64.b64decode(inline['data']), inline.get('mimeType')))
+                elif 'fileData' in part:
+                    name = urlparse(part['fileData']['fileUri']).path.split('/v1beta/', 1)[-1]
+                    with self.lock:
+                        entry = self.files.get(name)
+                    if entry is None:
+                        raise KeyError(f"File {name} does not exist")
+                    audio.append((entry['data'], entry['mime_type']))
+        return audio
+
+    def reply_for(self, request):
+        """Reply text for a generateContent request and its usage metadata"""
+        audio = self.audio_parts(request)
+        prompt = ''.join(part.get('text', '') for content in request.get('contents', [])
+                         for part in content.get('parts', []))
+        config = request.get('generationConfig', {})
+        requested = config.get('responseSchema', {}).get('properties')
+        if requested is not None:
+            want_transcript = 'transcript' in requested
+            qa_sections = list(requested.get('qa_analysis', {}).get('properties', {}))
+            summary = 'summary' in requested
+        else:
+            want_transcript = bool(audio)
+            extraction = 'qa_analysis' in prompt or not audio
+            qa_sections = list(QA_SECTIONS) if extraction else []
+            summary = extraction
+
+        reply = {}
+        if requested is not None and 'updates' in requested:
+            reply['updates'] = self.model.slot_updates(prompt)
+        if want_transcript:
+            reply['transcript'] = self.model.transcript(audio)
+        reply.update(self.model.sections(qa_sections, summary))
+        text = json.dumps(reply, indent=2, ensure_ascii=False)
+        if config.get('responseMimeType') != 'application/json':
+            text = f"```json\n{text}\n```"
+        with self.lock:
+            malformed = self._random.random() < self.model.malformed_rate
+        if malformed:
+            text = text[:len(text) * 2 // 3]
+
+        prompt_tokens = len(prompt) // CHARS_PER_TOKEN + int(
+            sum(audio_seconds(data, mime_type) for data, mime_type in audio) * AUDIO_TOKENS_PER_SECOND)
+        output_tokens = len(text) // CHARS_PER_TOKEN
+        usage = {
+            'promptTokenCount': prompt_tokens,
+            'candidatesTokenCount': output_tokens,
+            'totalTokenCount': prompt_tokens + output_tokens
+        }
+        return text, usage
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def fake(self):
+        return self.server.fake
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length) if length else b''
+        self.fake.transfer(len(body))
+        return body
+
+    def _reply(self, status, payload=None, headers=None):
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._reply(status, {'error': {'code': status, 'message': message}})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        method = re.fullmatch(r'/v1beta/models/[^/:]+:(\w+)', url.path)
+        if method:
+            return self._model_call(method.group(1))
+        if url.path != '/upload/v1beta/files':
+            self._body()
+            return self._error(404, f"Unknown path {url.path}")
+
+        command = self.headers.get('X-Goog-Upload-Command', '')
+        upload_id = parse_qs(url.query).get('upload_id', [None])[0]
+        if command == 'start':
+            return self._start()
+        with self.fake.lock:
+            session = self.fake.sessions.get(upload_id)
+        if session is None:
+            self._body()
+            return self._error(404, "Unknown upload session")
+        if command == 'query':
+            self._body()
+            return self._reply(200, headers=self._status_headers(session))
+        if command.startswith('upload'):
+            return self._upload(upload_id, session, 'finalize' in command)
+        self._body()
+        self._error(400, f"Unsupported upload command {command!r}")
+
+    def _model_call(self, method):
+        try:
+            request = json.loads(self._body() or b'{}')
+        except ValueError:
+            return self._error(400, "Invalid JSON payload")
+        fake = self.fake
+        if method == 'countTokens':
+            request['contents'] = request.get('contents', [])
+            try:
+                _, usage = fake.reply_for(request)
+            except KeyError as e:
+                return self._error(400, str(e))
+            return self._reply(200, {'totalTokens': usage['promptTokenCount']})
+        if method not in ('generateContent', 'streamGenerateContent'):
+            return self._error(404, f"Unknown method {method}")
+        if fake.drop():
+            # The client sees the server disconnect without a response
+            self.close_connection = True
+            return
+
+        error = fake.admit()
+        if error:
+            return self._error(*error)
+        try:
+            text, usage = fake.reply_for(request)
+        except KeyError as e:
+            return self._error(400, str(e))
+
+        model = fake.model
+        size = max(1, model.stream_chunk_chars)
+        chunks = [text[i:i + size] for i in range(0, len(text), size)] or ['']
+        chunk_seconds = size / CHARS_PER_TOKEN / model.tokens_per_second
+        prompt_seconds = 0
+        if model.prompt_tokens_per_second:
+            prompt_seconds = usage['promptTokenCount'] / model.prompt_tokens_per_second
+        time.sleep(model.first_token_seconds + prompt_seconds)
+        if method == 'generateContent':
+            time.sleep(chunk_seconds * len(chunks))
+            return self._reply(200, _response(text, usage))
+
+        # Server-sent events, one per chunk, with usage on the last
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(chunk_seconds)
+            event = _response(chunk, usage if i == len(chunks) - 1 else None)
+            self._write_chunk(f"data: {json.dumps(event)}\r\n\r\n".encode('utf-8'))
+        self._write_chunk(b'')
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def _start(self):
+        metadata = json.loads(self._body() or b'{}').get('file', {})
+        upload_id = uuid.uuid4().hex
+        with self.fake.lock:
+            self.fake.sessions[upload_id] = {
+                'size': int(self.headers.get('X-Goog-Upload-Header-Content-Length', 0)),
+                'mime_type': self.headers.get('X-Goog-Upload-Header-Content-Type', 'application/octet-stream'),
+                'display_name': metadata.get('display_name', ''),
+                'data': bytearray(),
+                'final': False,
+            }
+        self._reply(200, headers={
+            'X-Goog-Upload-URL': f"{self.fake.base_url}/upload/v1beta/files?upload_id={upload_id}",
+            'X-Goog-Upload-Status': 'active',
+        })
+
+    def _status_headers(self, session):
+        return {
+            'X-Goog-Upload-Status': 'final' if session['final'] else 'active',
+            'X-Goog-Upload-Size-Received': str(len(session['data'])),
+        }
+
+    def _upload(self, upload_id, session, finalize):
+        body = self._body()
+        offset = int(self.headers.get('X-Goog-Upload-Offset', -1))
+        fake = self.fake
+        with fake.lock:
+            if session['final'] or offset != len(session['data']):
+                return self._error(400, f"Offset {offset} does not match {len(session['data'])} received")
+            fake.chunk_requests += 1
+            if fake.fail_every and fake.chunk_requests % fake.fail_every == 0:
+                # Simulate a connection that dropped midway through the chunk
+                session['data'] += body[:len(body) // 2]
+                fake.failures_injected += 1
+                return self._error(503, "Injected failure")
+            session['data'] += body
+            if not finalize:
+                return self._reply(200, headers=self._status_headers(session))
+
+            if len(session['data']) != session['size']:
+                return self._error(400, f"Received {len(session['data'])} of {session['size']} bytes")
+            session['final'] = True
+            name = f"files/{upload_id[:12]}"
+            expires = datetime.now(timezone.utc) + timedelta(hours=FILE_TTL_HOURS)
+            fake.files[name] = {
+                'data': bytes(session['data']),
+                'mime_type': session['mime_type'],
+                'display_name': session['display_name'],
+                'ready_at': time.time() + fake.processing_seconds,
+                'expires': expires.strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            }
+            resource = fake.file_resource(name)
+        self._reply(200, {'file': resource}, headers=self._status_headers(session))
+
+    def do_GET(self):
+        name = urlparse(self.path).path[len('/v1beta/'):]
+        if name == 'files':
+            with self.fake.lock:
+                files = [self.fake.file_resource(name) for name in self.fake.files]
+            return self._reply(200, {'files': files})
+        with self.fake.lock:
+            if name not in self.fake.files:
+                return self._error(404, f"{name} not found")
+            resource = self.fake.file_resource(name)
+        self._reply(200, resource)
+
+    def do_DELETE(self):
+        name = urlparse(self.path).path[len('/v1beta/'):]
+        with self.fake.lock:
+            if self.fake.files.pop(name, None) is None:
+                return self._error(404, f"{name} not found")
+        self._reply(200, {})
+
+
+def _response(text, usage=None):
+    response = {'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}, 'index': 0}]}
+    if usage:
+        response['candidates'][0]['finishReason'] = 'STOP'
+        response['usageMetadata'] = usage
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake of the Gemini API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fail-every', type=int, default=0,
+                        help="fail every Nth chunk request after storing half of it")
+    parser.add_argument('--processing-seconds', type=float, default=0.0)
+    parser.add_argument('--uplink-bytes-per-second', type=float, default=0.0,
+                        help="simulated client uplink shared by all requests (0 for unlimited)")
+    parser.add_argument('--first-token-seconds', type=float, default=0.3)
+    parser.add_argument('--tokens-per-second', type=float, default=300.0)
+    parser.add_argument('--stream-chunk-chars', type=int, default=160)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of model calls failing with 503")
+    parser.add_argument('--rate-limit-rpm', type=float, default=0.0, help="answer 429 beyond this many calls a minute")
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help="fraction of replies cut off")
+    parser.add_argument('--replies', help="JSON file with canned 'transcript' and/or 'sections'")
+    parser.add_argument('--drop-rate', type=float, default=0.0,
+                        help="fraction of model calls whose connection is closed without a reply")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--prompt-tokens-per-second', type=float, default=0.0,
+                        help="prompt processing rate added to the latency (0 for none)")
+    args = parser.parse_args()
+
+    replies = {}
+    if args.replies:
+        with open(args.replies, 'r', encoding='utf-8') as f:
+            replies = json.load(f)
+    model = FakeModel(args.first_token_seconds, args.tokens_per_second, args.stream_chunk_chars,
+                      args.error_rate, args.rate_limit_rpm, args.malformed_rate, replies=replies, seed=args.seed,
+                      prompt_tokens_per_second=args.prompt_tokens_per_second, drop_rate=args.drop_rate)
+    server = FakeGeminiServer(args.host, args.port, args.fail_every, args.processing_seconds, model,
+                              args.uplink_bytes_per_second)
+    print(f"Fake Gemini API listening on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
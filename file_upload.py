@@ -0,0 +1,299 @@
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com"
+API_VERSION = "v1beta"
+# Every chunk but the last must be a multiple of this
+CHUNK_GRANULARITY = 256 * 1024
+# Don't reuse an uploaded file this close to its expiry
+EXPIRY_MARGIN_SECONDS = 3600
+
+
+class UploadError(Exception):
+    """Raised when a file can't be uploaded after all retries"""
+
+
+@dataclass
+class UploadedFile:
+    """Handle to a file stored by the File API"""
+    name: str
+    uri: str
+    mime_type: str
+    expires_at: Optional[float] = None
+    state: str = 'ACTIVE'
+    # Whether upload() returned an earlier upload of the same content
+    reused: bool = field(default=False, compare=False)
+
+    @classmethod
+    def from_response(cls, data):
+        data = data.get('file', data)
+        return cls(
+            data['name'],
+            data['uri'],
+            data.get('mimeType'),
+            _parse_time(data.get('expirationTime')),
+            data.get('state', 'ACTIVE')
+        )
+
+    def to_part(self):
+        """Content part referencing the file in a generate_content call"""
+        return {'file_data': {'file_uri': self.uri, 'mime_type': self.mime_type}}
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'uri': self.uri,
+            'mime_type': self.mime_type,
+            'expires_at': self.expires_at,
+            'state': self.state
+        }
+
+
+def _parse_time(value):
+    """RFC 3339 timestamp (as returned by the API) to epoch seconds"""
+    if not value:
+        return None
+    value = value.rstrip('Z')
+    if '.' in value:
+        # Python only parses up to microseconds
+        whole, fraction = value.split('.', 1)
+        value = f"{whole}.{fraction[:6]}"
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp()
+
+
+class UploadRegistry:
+    """Remembers uploaded files and unfinished upload sessions by content hash.
+
+    Re-analyzing a recording reuses its uploaded file until it is about to
+    expire, and an upload interrupted by a crash resumes from its session
+    URL instead of starting over.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def get_file(self, key):
+        with self._lock:
+            entry = self._entries.get(key, {}).get('file')
+        if not entry:
+            return None
+        expires_at = entry.get('expires_at')
+        if expires_at and expires_at - time.time() < EXPIRY_MARGIN_SECONDS:
+            self.forget(key)
+            return None
+        return UploadedFile(**entry)
+
+    def get_session(self, key):
+        with self._lock:
+            return self._entries.get(key, {}).get('session')
+
+    def set_file(self, key, uploaded):
+        self._update(key, {'file': uploaded.to_dict()})
+
+    def set_session(self, key, upload_url):
+        self._update(key, {'session': upload_url})
+
+    def forget(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._save()
+
+    def _update(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._save()
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class ResumableUploader:
+    """Chunked, resumable uploads to the Gemini File API.
+
+    Implements the API's resumable protocol directly so a failed chunk can
+    be retried from the offset the server acknowledged rather than from
+    the start. `base_url` can point at fake_gemini_server for offline runs.
+    """
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, chunk_mb=8, max_retries=5,
+                 timeout=60, registry=None, processing_timeout=120, pool_size=8):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        chunk = int(chunk_mb * 1024 * 1024)
+        self.chunk_size = max(CHUNK_GRANULARITY, chunk - chunk % CHUNK_GRANULARITY)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.registry = registry
+        self.processing_timeout = processing_timeout
+        # One session for all workers so they share warm keep-alive
+        # connections; urllib3's pool is thread-safe and the session holds
+        # no per-request state beyond the API key header
+        self._session = requests.Session()
+        self._session.headers['x-goog-api-key'] = api_key
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+    def warm_up(self):
+        """Open a pooled connection (DNS, TCP and TLS) to the File API"""
+        try:
+            self._session.get(f"{self.base_url}/{API_VERSION}/files", params={'pageSize': 1}, timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"File API warm-up failed: {str(e)}")
+
+    def upload(self, data, mime_type, key=None, display_name=None):
+        """Upload `data` (or reuse a previous upload of it) and return an UploadedFile.
+
+        `key` identifies the content for reuse and resumption; uploads
+        without a key are neither reused nor resumable across calls.
+        """
+        if key and self.registry:
+            uploaded = self.registry.get_file(key)
+            if uploaded and self.get_file(uploaded.name):
+                uploaded.reused = True
+                return uploaded
+
+        view = memoryview(data).cast('B')
+        upload_url = self.registry.get_session(key) if key and self.registry else None
+        offset = self._query_offset(upload_url) if upload_url else None
+        if offset is None:
+            upload_url = self._start(len(view), mime_type, display_name)
+            offset = 0
+            if key and self.registry:
+                self.registry.set_session(key, upload_url)
+        else:
+            print(f"Resuming upload at {offset} of {len(view)} bytes")
+
+        response = self._send_chunks(upload_url, view, offset)
+        uploaded = self._wait_active(UploadedFile.from_response(response))
+        if key and self.registry:
+            self.registry.set_file(key, uploaded)
+        return uploaded
+
+    def get_file(self, name):
+        """Current metadata of an uploaded file, or None if it is gone"""
+        try:
+            response = self._request('GET', f"{self.base_url}/{API_VERSION}/{name}")
+        except UploadError:
+            return None
+        return UploadedFile.from_response(response.json())
+
+    def delete_file(self, name):
+        try:
+            self._request('DELETE', f"{self.base_url}/{API_VERSION}/{name}")
+        except UploadError as e:
+            print(f"Error deleting {name}: {str(e)}")
+
+    def _start(self, size, mime_type, display_name):
+        response = self._request('POST', f"{self.base_url}/upload/{API_VERSION}/files", headers={
+            'X-Goog-Upload-Protocol': 'resumable',
+            'X-Goog-Upload-Command': 'start',
+            'X-Goog-Upload-Header-Content-Length': str(size),
+            'X-Goog-Upload-Header-Content-Type': mime_type,
+        }, json={'file': {'display_name': display_name or 'consultation-audio'}})
+        upload_url = response.headers.get('X-Goog-Upload-URL')
+        if not upload_url:
+            raise UploadError("File API did not return an upload URL")
+        return upload_url
+
+    def _query_offset(self, upload_url):
+        """Bytes the server holds for a session, or None if it can't continue"""
+        try:
+            response = self._request('POST', upload_url, headers={'X-Goog-Upload-Command': 'query'})
+        except UploadError:
+            return None
+        if response.headers.get('X-Goog-Upload-Status') != 'active':
+            return None
+        return int(response.headers.get('X-Goog-Upload-Size-Received', 0))
+
+    def _send_chunks(self, upload_url, view, offset):
+        failures = 0
+        while True:
+            end = min(offset + self.chunk_size, len(view))
+            last = end == len(view)
+            try:
+                response = self._session.post(upload_url, data=view[offset:end], timeout=self.timeout, headers={
+                    'X-Goog-Upload-Command': 'upload, finalize' if last else 'upload',
+                    'X-Goog-Upload-Offset': str(offset),
+                })
+                if response.status_code < 300:
+                    if last:
+                        return response.json()
+                    offset = end
+                    failures = 0
+                    continue
+                if not _retryable(response.status_code):
+                    raise UploadError(f"Chunk at {offset} rejected: HTTP {response.status_code} {response.text[:200]}")
+                error = f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                error = str(e)
+
+            failures += 1
+            if failures > self.max_retries:
+                raise UploadError(f"Upload failed at offset {offset} after {self.max_retries} retries: {error}")
+            print(f"Upload chunk at {offset} failed ({error}), retry {failures}/{self.max_retries}")
+            _backoff(failures)
+            # The server may have kept part of the chunk; continue from what it has
+            received = self._query_offset(upload_url)
+            if received is None:
+                raise UploadError("Upload session expired; start a new upload")
+            offset = received
+
+    def _wait_active(self, uploaded):
+        """Audio files are processed after upload and can't be used until ACTIVE"""
+        deadline = time.monotonic() + self.processing_timeout
+        while uploaded.state == 'PROCESSING':
+            if time.monotonic() > deadline:
+                raise UploadError(f"{uploaded.name} is still processing")
+            time.sleep(1)
+            uploaded = self.get_file(uploaded.name) or uploaded
+        if uploaded.state == 'FAILED':
+            raise UploadError(f"File API failed to process {uploaded.name}")
+        return uploaded
+
+    def _request(self, method, url, **kwargs):
+        """Send a small control request, retrying transient failures"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self._session.request(method, url, timeout=self.timeout, **kwargs)
+                if response.status_code < 300:
+                    return response
+                if not _retryable(response.status_code):
+                    raise UploadError(f"{method} {url}: HTTP {response.status_code} {response.text[:200]}")
+                error = f"HTTP {response.status_code}"
+            except requests.RequestException as e:
+                error = str(e)
+            if attempt < self.max_retries:
+                _backoff(attempt + 1)
+        raise UploadError(f"{method} {url} failed after {self.max_retries} retries: {error}")
+
+
+def _retryable(status):
+    return status == 429 or status >= 500
+
+
+def _backoff(attempt, base=0.5, cap=30.0):
+    """Full-jitter exponential backoff"""
+    time.sleep(random.uniform(0, min(cap, base * 2 ** attempt)))
@@ -0,0 +1,180 @@
+"""Async client for the Gemini REST API, used when gemini.base_url is set.
+
+google.generativeai only talks to a custom endpoint over its REST
+transport, and that transport can't stream from the async client. This
+implements the three calls the analyzer makes (generateContent,
+streamGenerateContent over SSE and countTokens) with the same call
+signatures and the parts of the response objects it reads, so a
+RestModel can stand in for GenerativeModel: against
+fake_gemini_server.py for offline runs and benchmarks, or against the
+real API.
+"""
+import base64
+import json
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import httpx
+from google.api_core import exceptions
+
+import tracing
+
+API_VERSION = "v1beta"
+
+
+class RestReply:
+    """One generateContent response (or streamed chunk)"""
+
+    def __init__(self, data):
+        candidates = data.get('candidates') or []
+        content = candidates[0].get('content', {}) if candidates else {}
+        self.parts = [part for part in content.get('parts', []) if 'text' in part]
+        usage = data.get('usageMetadata', {})
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=usage.get('promptTokenCount', 0),
+            candidates_token_count=usage.get('candidatesTokenCount', 0),
+            total_token_count=usage.get('totalTokenCount', 0)
+        )
+
+    @property
+    def text(self):
+        return ''.join(part['text'] for part in self.parts)
+
+
+def _part(part):
+    """REST form of a content part as the analyzer builds them"""
+    if isinstance(part, str):
+        return {'text': part}
+    if 'file_data' in part:
+        file_data = part['file_data']
+        return {'fileData': {'fileUri': file_data['file_uri'], 'mimeType': file_data['mime_type']}}
+    data = base64.b64encode(bytes(part['data'])).decode('ascii')
+    return {'inlineData': {'mimeType': part['mime_type'], 'data': data}}
+
+
+def _schema(schema):
+    """Response schema with the upper-case type names the REST API expects"""
+    converted = {}
+    for key, value in schema.items():
+        if key == 'type':
+            converted[key] = value.upper()
+        elif key == 'properties':
+            converted[key] = {name: _schema(child) for name, child in value.items()}
+        elif key == 'items':
+            converted[key] = _schema(value)
+        else:
+            converted[key] = value
+    return converted
+
+
+def _generation_config(base, overrides):
+    config = {
+        'temperature': base.get('temperature'),
+        'topP': base.get('top_p'),
+        'topK': base.get('top_k'),
+        'maxOutputTokens': base.get('max_output_tokens')
+    }
+    overrides = overrides or {}
+    if 'response_mime_type' in overrides:
+        config['responseMimeType'] = overrides['response_mime_type']
+    if 'response_schema' in overrides:
+        config['responseSchema'] = _schema(overrides['response_schema'])
+    return {key: value for key, value in config.items() if value is not None}
+
+
+@contextmanager
+def _transport_errors():
+    """Raise connection failures and timeouts as the api_core errors the gRPC client raises"""
+    try:
+        yield
+    except httpx.TimeoutException as e:
+        raise exceptions.DeadlineExceeded(f"{type(e).__name__}: {e}") from e
+    except httpx.TransportError as e:
+        raise exceptions.ServiceUnavailable(f"{type(e).__name__}: {e}") from e
+
+
+class RestModel:
+    """Drop-in for the async half of genai.GenerativeModel, over plain HTTP.
+
+    Errors are raised as google.api_core exceptions carrying the HTTP
+    status, as the gRPC client raises them, so the request limiter treats
+    429s and 5xx the same way; dropped connections surface as 503 and
+    timeouts as 504. Use from a single event loop.
+    """
+
+    def __init__(self, api_key, model_name, generation_config=None, base_url="", timeout=600):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.generation_config = generation_config or {}
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={'x-goog-api-key': self.api_key},
+                timeout=httpx.Timeout(self.timeout, connect=10)
+            )
+        return self._client
+
+    def _url(self, method):
+        return f"{self.base_url}/{API_VERSION}/models/{self.model_name}:{method}"
+
+    def _body(self, contents, generation_config=None):
+        return {
+            'contents': [{'role': 'user', 'parts': [_part(part) for part in contents]}],
+            'generationConfig': _generation_config(self.generation_config, generation_config)
+        }
+
+    @staticmethod
+    async def _raise_for_status(response):
+        if response.status_code < 300:
+            return
+        with _transport_errors():
+            body = await response.aread()
+        try:
+            message = json.loads(body)['error']['message']
+        except (ValueError, KeyError, TypeError):
+            message = body.decode('utf-8', 'replace')[:200]
+        raise exceptions.from_http_status(response.status_code, message)
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False):
+        with tracing.span('request.encode'):
+            body = self._body(contents, generation_config)
+        if not stream:
+            with _transport_errors():
+                response = await self.client.post(self._url('generateContent'), json=body)
+            await self._raise_for_status(response)
+            return RestReply(response.json())
+
+        request = self.client.build_request(
+            'POST', self._url('streamGenerateContent'), params={'alt': 'sse'}, json=body)
+        with _transport_errors():
+            response = await self.client.send(request, stream=True)
+        try:
+            await self._raise_for_status(response)
+        except Exception:
+            await response.aclose()
+            raise
+        return self._events(response)
+
+    @staticmethod
+    async def _events(response):
+        try:
+            with _transport_errors():
+                async for line in response.aiter_lines():
+                    if line.startswith('data:'):
+                        yield RestReply(json.loads(line[len('data:'):]))
+        finally:
+            await response.aclose()
+
+    async def count_tokens_async(self, contents):
+        if isinstance(contents, str):
+            contents = [contents]
+        body = {'contents': [{'role': 'user', 'parts': [_part(part) for part in contents]}]}
+        with _transport_errors():
+            response = await self.client.post(self._url('countTokens'), json=body)
+        await self._raise_for_status(response)
+        return SimpleNamespace(total_tokens=response.json().get('totalTokens', 0))
@@ -0,0 +1,126 @@
+import bisect
+import json
+
+
+class StreamingJSONParser:
+    """Incremental scanner that reports objects and arrays as soon as they close.
+
+    Text is fed in arbitrary pieces as a model streams its reply; anything
+    before the first '{' (such as a ```json fence) is skipped. For every
+    object or array that completes, `on_value(path, value)` is called with
+    its path from the root, e.g. ('transcript', 3) or ('qa_analysis',
+    'cause'), and the parsed value. Each character is scanned once;
+    containers nested deeper than `max_depth` are scanned but not parsed.
+    """
+
+    def __init__(self, on_value, max_depth=None):
+        self._on_value = on_value
+        self._max_depth = max_depth
+        self._chunks = []
+        self._offsets = []
+        self._length = 0
+        self._started = False
+        self._done = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        # One frame per open container: [is_object, start, path, expecting_key, key, index]
+        self._stack = []
+
+    @property
+    def done(self):
+        """Whether the root value has closed"""
+        return self._done
+
+    def feed(self, text):
+        offset = self._length
+        self._chunks.append(text)
+        self._offsets.append(offset)
+        self._length += len(text)
+        if self._done:
+            return
+
+        for i, char in enumerate(text, offset):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    frame = self._stack[-1] if self._stack else None
+                    if frame and frame[0] and frame[3]:
+                        frame[4] = json.loads(self._slice(self._string_start, i + 1))
+                continue
+
+            if not self._started:
+                if char != '{':
+                    continue
+                self._started = True
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in '{[':
+                self._stack.append([char == '{', i, self._child_path(), char == '{', None, 0])
+            elif char in '}]':
+                is_object, start, path, _, _, _ = self._stack.pop()
+                if self._max_depth is None or len(path) <= self._max_depth:
+                    self._on_value(path, json.loads(self._slice(start, i + 1)))
+                if not self._stack:
+                    self._done = True
+                    return
+            elif char == ':':
+                self._stack[-1][3] = False
+            elif char == ',':
+                frame = self._stack[-1]
+                if frame[0]:
+                    frame[3] = True
+                else:
+                    frame[5] += 1
+
+    def _slice(self, start, end):
+        """Text between two absolute offsets, joining only the chunks it spans"""
+        first = bisect.bisect_right(self._offsets, start) - 1
+        last = bisect.bisect_right(self._offsets, end - 1)
+        text = ''.join(self._chunks[first:last])
+        base = self._offsets[first]
+        return text[start - base:end - base]
+
+    def _child_path(self):
+        if not self._stack:
+            return ()
+        is_object, _, path, _, key, index = self._stack[-1]
+        return path + ((key,) if is_object else (index,))
+
+
+def salvage_json(text):
+    """Recover what can be parsed from a truncated or malformed JSON object.
+
+    Members of the root object that closed are kept whole; for members cut
+    off mid-way, their completed children are kept (as a list for arrays,
+    a dict for objects). Returns {} if nothing completed.
+    """
+    completed = {}
+    parser = StreamingJSONParser(lambda path, value: completed.setdefault(path, value), max_depth=2)
+    try:
+        parser.feed(text)
+    except (ValueError, IndexError):
+        # Unbalanced brackets or an unparsable value; keep what closed before it
+        pass
+    if () in completed:
+        return completed[()]
+
+    result = {}
+    for path, value in completed.items():
+        if len(path) == 1:
+            result[path[0]] = value
+    for path, value in completed.items():
+        if len(path) != 2 or path[:1] in completed:
+            continue
+        key, child = path
+        if isinstance(child, int):
+            result.setdefault(key, []).append(value)
+        else:
+            result.setdefault(key, {})[child] = value
+    return result
@@ -0,0 +1,399 @@
+"""Transcription while a consultation is being recorded
+
+A LiveTranscriber drains its own NEVER_DROP reader of the capture ring
+(AudioRecorder.reader), converts the chunks to 16 kHz mono and runs them
+through a recognizer on its own thread, so a stalled level meter or a
+slow recognizer never costs the transcript audio. Interim and final
+segments are handed to `on_segment` as they arrive (app.py emits them over
+Socket.IO); final segments are also appended to
+recording_<ts>.transcript.jsonl next to the recording and collected into
+a transcript, so that at stop only the last few seconds remain to be
+recognized and the Q&A and summary can run on text that already exists.
+
+Recognizers turn an iterator of PCM chunks into TranscriptSegments:
+
+    GoogleSpeechRecognizer  Cloud Speech-to-Text v2, medical_conversation
+    LocalRecognizer         offline stand-in that "recognizes" a script at
+                            a fixed pace, for tests and benchmarks
+"""
+import json
+import os
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+from resampler import StreamingResampler
+
+try:
+    from google.cloud.speech_v2 import SpeechClient
+    from google.cloud.speech_v2.types import cloud_speech
+except ImportError:  # only needed for the "google" recognizer
+    SpeechClient = None
+    cloud_speech = None
+
+RATE = 16000
+SAMPLE_WIDTH = 2
+# Streaming requests must stay under 15 KB of audio each
+MAX_REQUEST_BYTES = 15 * 1024
+# Names given to diarized speakers in the order they are first heard
+SPEAKERS = ("Doctor", "Patient")
+
+
+@dataclass
+class TranscriptSegment:
+    """One recognized stretch of speech; `start`/`end` are seconds into the recording"""
+    text: str
+    is_final: bool
+    start: float
+    end: float
+    speaker: Optional[str] = None
+    confidence: Optional[float] = None
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def transcript_path(recording):
+    """Where a recording's live transcript is kept: recording_<ts>.wav -> recording_<ts>.transcript.jsonl"""
+    return f"{os.path.splitext(recording)[0]}.transcript.jsonl"
+
+
+class Recognizer(ABC):
+    """Turns a stream of 16 kHz mono int16 PCM chunks into TranscriptSegments"""
+    name = "recognizer"
+
+    @abstractmethod
+    def stream(self, chunks):
+        """Yield segments for `chunks`, called once per recording on the transcriber's thread.
+
+        `chunks` ends when the recording stops; the recognizer should then
+        yield whatever it still holds as final segments.
+        """
+
+
+class GoogleSpeechRecognizer(Recognizer):
+    """Cloud Speech-to-Text v2 streaming recognition with the medical_conversation model.
+
+    Uses the recognizer-less "_" resource with the config sent inline, so
+    no recognizer has to be created first. A streaming call is limited to
+    about five minutes of audio, so the stream is reopened every
+    `max_stream_seconds`; a call that fails is reopened too, losing only
+    the audio it had in flight, until `max_failures` fail in a row.
+
+    Speaker diarization labels the words of final results; each final
+    segment goes to the speaker of most of its words, named from
+    `speakers` in the order the labels are first heard (the clinician
+    usually speaks first). Labels only hold within one streaming call, so
+    the naming starts over when the stream is reopened. Segments without
+    labels keep no speaker.
+    """
+    name = "google"
+
+    def __init__(self, project_id, location="global", model="medical_conversation",
+                 language_code="en-US", max_stream_seconds=280, max_failures=3, speakers=SPEAKERS):
+        if SpeechClient is None:
+            raise RuntimeError("The google recognizer needs google-cloud-speech installed")
+        client_options = None
+        if location != "global":
+            client_options = {'api_endpoint': f"{location}-speech.googleapis.com"}
+        self.client = SpeechClient(client_options=client_options)
+        self.recognizer = f"projects/{project_id}/locations/{location}/recognizers/_"
+        self.max_stream_seconds = max_stream_seconds
+        self.max_failures = max_failures
+        self.speakers = speakers
+        self.streaming_config = cloud_speech.StreamingRecognitionConfig(
+            config=cloud_speech.RecognitionConfig(
+                explicit_decoding_config=cloud_speech.ExplicitDecodingConfig(
+                    encoding=cloud_speech.ExplicitDecodingConfig.AudioEncoding.LINEAR16,
+                    sample_rate_hertz=RATE,
+                    audio_channel_count=1
+                ),
+                language_codes=[language_code],
+                model=model,
+                features=cloud_speech.RecognitionFeatures(
+                    enable_automatic_punctuation=True,
+                    diarization_config=cloud_speech.SpeakerDiarizationConfig(
+                        min_speaker_count=len(speakers),
+                        max_speaker_count=len(speakers)
+                    )
+                )
+            ),
+            streaming_features=cloud_speech.StreamingRecognitionFeatures(interim_results=True)
+        )
+
+    def _speaker(self, alternative, names):
+        """Speaker of most of a final result's words; `names` maps labels seen so far"""
+        labels = [word.speaker_label for word in alternative.words if word.speaker_label]
+        if not labels:
+            return None
+        for label in labels:
+            if label not in names:
+                index = len(names)
+                names[label] = self.speakers[index] if index < len(self.speakers) else f"Speaker {index + 1}"
+        return names[Counter(labels).most_common(1)[0][0]]
+
+    def stream(self, chunks):
+        chunks = iter(chunks)
+        state = {'offset': 0.0, 'sent': 0.0, 'done': False}
+
+        def requests():
+            yield cloud_speech.StreamingRecognizeRequest(
+                recognizer=self.recognizer, streaming_config=self.streaming_config)
+            for chunk in chunks:
+                for i in range(0, len(chunk), MAX_REQUEST_BYTES):
+                    yield cloud_speech.StreamingRecognizeRequest(audio=chunk[i:i + MAX_REQUEST_BYTES])
+                state['sent'] += len(chunk) / (RATE * SAMPLE_WIDTH)
+                if state['sent'] >= self.max_stream_seconds:
+                    return
+            state['done'] = True
+
+        last_end = 0.0
+        failures = 0
+        while not state['done']:
+            state['sent'] = 0.0
+            names = {}
+            try:
+                for response in self.client.streaming_recognize(requests=requests()):
+                    for result in response.results:
+                        if not result.alternatives or not result.alternatives[0].transcript.strip():
+                            continue
+                        alternative = result.alternatives[0]
+                        end = state['offset'] + result.result_end_offset.total_seconds()
+                        yield TranscriptSegment(
+                            text=alternative.transcript.strip(),
+                            is_final=result.is_final,
+                            start=round(last_end, 2),
+                            end=round(end, 2),
+                            speaker=self._speaker(alternative, names) if result.is_final else None,
+                            confidence=alternative.confidence if result.is_final else None
+                        )
+                        if result.is_final:
+                            last_end = end
+                failures = 0
+            except Exception as e:
+                failures += 1
+                if failures >= self.max_failures:
+                    raise
+                print(f"Streaming recognition error, reopening the stream: {str(e)}")
+            state['offset'] += state['sent']
+
+
+# Offline stand-in script; lines alternate between doctor and patient
+LOCAL_SCRIPT = [
+    "What brings you in today?",
+    "I've had a cough for about three weeks and it isn't getting better.",
+    "Is it worse at any particular time of day?",
+    "Mostly at night, it keeps me up and I'm tired at work.",
+    "Any fever, or have you coughed up anything?",
+    "No fever, just some clear phlegm in the mornings.",
+    "What are you hoping we can do about it today?",
+    "I'd like to sleep through the night again, and make sure it's nothing serious.",
+]
+
+
+class LocalRecognizer(Recognizer):
+    """Offline stand-in: "recognizes" a script at a fixed pace of audio.
+
+    Every `seconds_per_line` of audio completes one line of the script as
+    a final segment, with interim segments revealing its words every
+    `interim_seconds` before that; at the end of the audio the line in
+    progress is finalized. The audio content is ignored, so tests can feed
+    silence or noise and get realistic segment timing.
+    """
+    name = "local"
+
+    def __init__(self, lines=None, seconds_per_line=5.0, interim_seconds=1.0):
+        self.lines = lines or LOCAL_SCRIPT
+        self.seconds_per_line = seconds_per_line
+        self.interim_seconds = interim_seconds
+
+    def _line(self, index):
+        speaker = "Doctor" if index % 2 == 0 else "Patient"
+        return speaker, self.lines[index % len(self.lines)]
+
+    def _segment(self, index, fraction, is_final):
+        speaker, text = self._line(index)
+        words = text.split()
+        shown = words if is_final else words[:max(1, int(len(words) * fraction))]
+        start = index * self.seconds_per_line
+        return TranscriptSegment(
+            text=' '.join(shown),
+            is_final=is_final,
+            start=round(start, 2),
+            end=round(start + fraction * self.seconds_per_line, 2),
+            speaker=speaker,
+            confidence=0.9 if is_final else None
+        )
+
+    def stream(self, chunks):
+        seconds = 0.0
+        line = 0
+        next_interim = self.interim_seconds
+        for chunk in chunks:
+            seconds += len(chunk) / (RATE * SAMPLE_WIDTH)
+            while seconds >= (line + 1) * self.seconds_per_line:
+                yield self._segment(line, 1.0, True)
+                line += 1
+                next_interim = line * self.seconds_per_line + self.interim_seconds
+            if seconds >= next_interim:
+                yield self._segment(line, (seconds - line * self.seconds_per_line) / self.seconds_per_line, False)
+                next_interim += self.interim_seconds
+        # The line in progress when the recording stopped
+        if seconds - line * self.seconds_per_line >= self.interim_seconds:
+            segment = self._segment(line, (seconds - line * self.seconds_per_line) / self.seconds_per_line, False)
+            segment.is_final = True
+            segment.confidence = 0.6
+            yield segment
+
+
+def create_recognizer(live):
+    """Recognizer selected by the `live` config section"""
+    if live.recognizer == "google":
+        return GoogleSpeechRecognizer(
+            live.project_id,
+            location=live.location,
+            model=live.model,
+            language_code=live.language_code,
+            max_stream_seconds=live.max_stream_seconds
+        )
+    if live.recognizer == "local":
+        return LocalRecognizer()
+    raise ValueError(f"Unknown recognizer: {live.recognizer}")
+
+
+class LiveTranscriber:
+    """Runs a recognizer over a recording while it is being captured.
+
+    Audio comes from the capture reader given to `start()`, read on the
+    recognizer thread; without one, `feed()` takes chunks and copies them
+    onto an unbounded queue instead. Either way chunks are in the capture
+    format (rate/channels of the recorder) and none are dropped while the
+    recognizer catches up. `close()` marks the end of the audio, waits up
+    to `timeout` for the recognizer to finish the tail and returns the
+    final transcript; `complete` tells whether it got to the end of the
+    audio. Final segments also go to `qa_engine` (a RealtimeQAEngine) when
+    one is given.
+    """
+
+    def __init__(self, recognizer, rate=RATE, channels=1, on_segment=None, qa_engine=None):
+        self.recognizer = recognizer
+        self.on_segment = on_segment
+        self.qa_engine = qa_engine
+        self.path = None
+        self.segments = []
+        self.interim = 0
+        self.error = None
+        # Set by close(): the recognizer finished all of the audio without error
+        self.complete = False
+        self.audio_seconds = 0.0
+        self._resampler = StreamingResampler(rate, RATE, channels)
+        self._queue = queue.Queue()
+        self._source = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped_at = None
+        self._finished_at = None
+
+    def start(self, path=None, source=None):
+        """Start recognizing; final segments are appended to `path` (JSONL) if given.
+
+        `source` is a CaptureReader to take the audio from, which is closed
+        along with the transcriber; without it the audio is fed with `feed()`.
+        """
+        self.path = path
+        self._source = source
+        if path:
+            open(path, 'w', encoding='utf-8').close()
+        self._thread = threading.Thread(target=self._run, name='live-transcriber', daemon=True)
+        self._thread.start()
+        return self
+
+    def feed(self, data):
+        """Queue one capture chunk; `data` may be a capture reader's view, which is reused"""
+        if self.error is None:
+            self._queue.put(bytes(data))
+
+    def _chunks(self):
+        if self._source is None:
+            yield from iter(self._queue.get, None)
+            return
+        for data in self._source:
+            # The reader reuses the view on its next read; the recognizer may hold on to it
+            yield bytes(data)
+
+    def _audio(self):
+        for data in self._chunks():
+            pcm = self._resampler.process(data)
+            if pcm:
+                self.audio_seconds += len(pcm) / (RATE * SAMPLE_WIDTH)
+                yield pcm
+        tail = self._resampler.flush()
+        if tail:
+            self.audio_seconds += len(tail) / (RATE * SAMPLE_WIDTH)
+            yield tail
+
+    def _run(self):
+        try:
+            for segment in self.recognizer.stream(self._audio()):
+                self._publish(segment)
+        except Exception as e:
+            self.error = str(e)
+            print(f"Live transcription error: {str(e)}")
+        finally:
+            self._finished_at = time.perf_counter()
+
+    def _publish(self, segment):
+        if segment.is_final:
+            with self._lock:
+                self.segments.append(segment)
+            if self.path:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(segment.to_dict(), ensure_ascii=False) + '\n')
+            if self.qa_engine is not None:
+                text = f"{segment.speaker}: {segment.text}" if segment.speaker else segment.text
+                self.qa_engine.add_transcript(text)
+        else:
+            self.interim += 1
+        if self.on_segment:
+            try:
+                self.on_segment(segment)
+            except Exception as e:
+                print(f"Error publishing transcript segment: {str(e)}")
+
+    def transcript(self):
+        """Final segments so far as transcript entries"""
+        with self._lock:
+            return [{'speaker': segment.speaker or 'Unknown', 'text': segment.text} for segment in self.segments]
+
+    def close(self, timeout=10):
+        """End of audio: wait for the recognizer to finish and return the transcript.
+
+        If it is still running after `timeout`, the segments so far are
+        returned and `complete` stays False.
+        """
+        if self._stopped_at is None:
+            self._stopped_at = time.perf_counter()
+            if self._source is not None:
+                self._source.close()
+            else:
+                self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self.complete = not self._thread.is_alive() and self.error is None
+        return self.transcript()
+
+    def stats(self):
+        finished = self._finished_at
+        return {
+            'recognizer': self.recognizer.name,
+            'segments': len(self.segments),
+            'interim': self.interim,
+            'audio_seconds': round(self.audio_seconds, 2),
+            'tail_seconds': round(finished - self._stopped_at, 3) if finished and self._stopped_at else None,
+            'complete': self.complete,
+            'error': self.error
+        }
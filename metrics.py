@@ -0,0 +1,176 @@
+"""Counters and histograms exposed in the Prometheus text format
+
+A small in-process stand-in for prometheus_client: metrics are declared
+once at import time in the module that records them, registered with
+REGISTRY, and `REGISTRY.render()` produces the text served on /metrics.
+Everything is thread-safe, since model calls are recorded on the
+analyzer's event loop thread and job outcomes on the analysis workers.
+
+ConsultationLog writes one JSON line per consultation, with the same
+numbers for that consultation alone.
+"""
+import json
+import math
+import os
+import threading
+from datetime import datetime
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+TOKEN_BUCKETS = (100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000)
+BYTE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 5e6, 1e7, 2e7, 5e7)
+AUDIO_SECONDS_BUCKETS = (30, 60, 120, 300, 600, 900, 1800, 2700, 3600)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @property
+    def exposed_name(self):
+        return self.name
+
+    def render(self):
+        lines = [f"# HELP {self.exposed_name} {self.help}", f"# TYPE {self.exposed_name} {self.kind}"]
+        with self._lock:
+            for key in sorted(self._series):
+                lines.extend(self._render_series(key, self._series[key]))
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label set"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._series.get(self._key(labels), 0)
+
+    @property
+    def exposed_name(self):
+        return f"{self.name}_total"
+
+    def _render_series(self, key, value):
+        return [f"{self.exposed_name}{_labels(self.labelnames, key)} {_number(value)}"]
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets per label set"""
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets, labels=()):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    def _render_series(self, key, series):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, series['counts']):
+            cumulative += count
+            labels = _labels(self.labelnames, key, [('le', _number(bound))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_number(series['sum'])}")
+        lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics, rendered together for /metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Re-importing a module must not create a second series set
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name, help, buckets, labels=()):
+        return self._register(Histogram(name, help, buckets, labels))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+class ConsultationLog:
+    """Appends one JSON object per line to `path`; a no-op without a path"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def write(self, record):
+        if not self.path:
+            return
+        line = json.dumps(dict(time=datetime.now().astimezone().isoformat(), **record), ensure_ascii=False)
+        try:
+            with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        except OSError as e:
+            print(f"Error writing consultation log: {str(e)}")
@@ -0,0 +1,156 @@
+import asyncio
+import random
+import re
+import time
+
+# HTTP statuses worth retrying; 429 also slows the token bucket down
+RATE_LIMITED = 429
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a call can't complete, retries included, before its deadline"""
+
+
+def error_status(error):
+    """HTTP status of an API error (google.api_core errors carry it as .code)"""
+    code = getattr(error, 'code', None)
+    return code if isinstance(code, int) else None
+
+
+def retry_after(error):
+    """Seconds the server asked us to wait, if the error says so"""
+    match = (re.search(r'retry in (\d+(?:\.\d+)?)s', str(error), re.IGNORECASE)
+             or re.search(r'retry_delay\s*{\s*seconds:\s*(\d+)', str(error)))
+    return float(match.group(1)) if match else None
+
+
+def is_retryable(error):
+    status = error_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(error, (ConnectionError, asyncio.TimeoutError))
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class AdaptiveTokenBucket:
+    """Token bucket whose refill rate follows the rate limits the API reports.
+
+    Starts at `requests_per_minute` with up to `burst` requests at once.
+    Each 429 halves the rate (down to `min_requests_per_minute`), empties
+    the bucket and pauses it for the server's retry delay; each success
+    adds back `recovery` of the configured rate, so throughput climbs back
+    once the quota allows it. Must be used from a single event loop.
+    """
+
+    def __init__(self, requests_per_minute=60, burst=4, min_requests_per_minute=6, recovery=0.05):
+        self.max_rate = requests_per_minute / 60
+        self.min_rate = min(min_requests_per_minute / 60, self.max_rate)
+        self.rate = self.max_rate
+        self.burst = max(1, burst)
+        self.recovery = recovery
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self.rate_limited = 0
+
+    def _refill(self, now):
+        if now > self._paused_until:
+            elapsed = now - max(self._updated, self._paused_until)
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    async def acquire(self, deadline=None):
+        """Wait for a token; raises DeadlineExceededError rather than wait past `deadline`"""
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                if deadline is not None and now + wait > deadline:
+                    raise DeadlineExceededError(f"Rate limit wait of {wait:.1f}s would pass the deadline")
+                await asyncio.sleep(wait)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate * self.recovery)
+
+    def on_rate_limited(self, delay=None):
+        now = time.monotonic()
+        self._refill(now)
+        self.rate_limited += 1
+        self.rate = max(self.min_rate, self.rate / 2)
+        self._tokens = 0.0
+        self._paused_until = max(self._paused_until, now + (delay if delay is not None else 1 / self.rate))
+
+    def stats(self):
+        return {
+            'requests_per_minute': round(self.rate * 60, 2),
+            'rate_limited': self.rate_limited
+        }
+
+
+class RequestLimiter:
+    """Admission control and retries for model requests.
+
+    At most `max_concurrent` requests are in flight; each needs a token
+    from an AdaptiveTokenBucket, and transient failures (429, 5xx,
+    timeouts, dropped connections) are retried with full-jitter
+    exponential backoff, up to `max_attempts` tries in all. A deadline
+    bounds the whole thing: no wait, backoff or attempt runs past it.
+    """
+
+    def __init__(self, max_concurrent=4, bucket=None, max_attempts=6, backoff_base=1.0, backoff_max=30.0):
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.bucket = bucket or AdaptiveTokenBucket()
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retries = 0
+
+    async def call(self, request, deadline=None, description="Model request"):
+        """Await `request()` (a coroutine function) under the limits and return its result"""
+        attempt = 0
+        while True:
+            async with self.semaphore:
+                await self.bucket.acquire(deadline)
+                try:
+                    if deadline is None:
+                        result = await request()
+                    else:
+                        result = await asyncio.wait_for(request(), max(0.0, deadline - time.monotonic()))
+                except Exception as e:
+                    error = e
+                else:
+                    self.bucket.on_success()
+                    return result
+
+            if deadline is not None and time.monotonic() >= deadline:
+                raise DeadlineExceededError(f"{description} did not finish before its deadline") from error
+            status = error_status(error)
+            server_delay = retry_after(error) if status == RATE_LIMITED else None
+            if status == RATE_LIMITED:
+                self.bucket.on_rate_limited(server_delay)
+            attempt += 1
+            if not is_retryable(error) or attempt >= self.max_attempts:
+                raise error
+            delay = max(backoff_delay(attempt, self.backoff_base, self.backoff_max), server_delay or 0)
+            if deadline is not None and time.monotonic() + delay > deadline:
+                raise DeadlineExceededError(f"{description} failed and its retry would pass the deadline") from error
+            self.retries += 1
+            print(f"{description} failed ({str(error)[:120]}), retry {attempt}/{self.max_attempts - 1} "
+                  f"in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        return dict(self.bucket.stats(), retries=self.retries)
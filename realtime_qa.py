@@ -0,0 +1,213 @@
+import asyncio
+import textwrap
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from analysis_prompts import realtime_qa_prompt
+from analysis_schema import QA_SECTIONS, SLOT_UPDATES_SCHEMA, SLOTS, validate_slot_updates
+
+# Per-tick records kept for stats()
+HISTORY_TICKS = 500
+
+
+@dataclass
+class Slot:
+    """Running notes for one Q&A field"""
+    value: str = ""
+    confidence: float = 0.0
+    # Transcript lines seen when the value was last set, and when
+    line: Optional[int] = None
+    updated_at: Optional[float] = None
+
+
+class RealtimeQAEngine:
+    """Keeps the Q&A notes of a consultation up to date while it is recorded.
+
+    Final transcript lines are added as they are recognized. Each tick
+    sends the model only the lines added since the last tick, a few
+    earlier lines for context and a compact summary of the notes so far,
+    and merges the slot updates it returns; ticks with no new lines are
+    skipped. Prompt size (and so per-tick latency) depends on the tick
+    interval rather than on how long the consultation has been running.
+
+    An update replaces a note when it is at least as confident, or at
+    least `revise_confidence` sure (the model sees the current notes, so
+    a confident change is a deliberate correction). `on_update(changes,
+    snapshot)` is called with the slots each tick changed.
+
+    Model calls share the analyzer's request limits and run on its event
+    loop; lines can be added from any thread.
+    """
+
+    def __init__(self, analyzer, interval_seconds=10, context_lines=4, summary_value_chars=160,
+                 revise_confidence=0.7, tick_timeout_seconds=30, on_update=None):
+        self.analyzer = analyzer
+        self.interval_seconds = interval_seconds
+        self.context_lines = context_lines
+        self.summary_value_chars = summary_value_chars
+        self.revise_confidence = revise_confidence
+        self.tick_timeout_seconds = tick_timeout_seconds
+        self.on_update = on_update
+        self.slots = {name: Slot() for name in SLOTS}
+        self.ticks = 0
+        self.skipped = 0
+        self.failed = 0
+        self.history = deque(maxlen=HISTORY_TICKS)
+        self._lines = []
+        self._analyzed = 0
+        self._lock = threading.Lock()
+        self._tick_lock = None
+        self._task = None
+
+    @classmethod
+    def from_config(cls, analyzer, realtime, on_update=None):
+        return cls(
+            analyzer,
+            interval_seconds=realtime.interval_seconds,
+            context_lines=realtime.context_lines,
+            summary_value_chars=realtime.summary_value_chars,
+            revise_confidence=realtime.revise_confidence,
+            tick_timeout_seconds=realtime.tick_timeout_seconds,
+            on_update=on_update
+        )
+
+    def add_transcript(self, text, is_final=True):
+        """Add a recognized line ("Speaker: text" or plain text); interim results are ignored"""
+        text = text.strip()
+        if is_final and text:
+            with self._lock:
+                self._lines.append(text)
+
+    @property
+    def lines(self):
+        with self._lock:
+            return len(self._lines)
+
+    def _state(self):
+        notes = []
+        empty = []
+        with self._lock:
+            for name, slot in self.slots.items():
+                if slot.value:
+                    value = textwrap.shorten(slot.value, self.summary_value_chars, placeholder=' ...')
+                    notes.append(f"{name} [{slot.confidence:.1f}]: {value}")
+                else:
+                    empty.append(name)
+        return notes, empty
+
+    async def tick(self):
+        """Analyze the lines added since the last tick; returns the changed slots, or None if skipped"""
+        if self._tick_lock is None:
+            self._tick_lock = asyncio.Lock()
+        async with self._tick_lock:
+            with self._lock:
+                end = len(self._lines)
+                lines = self._lines[self._analyzed:end]
+                context = self._lines[max(0, self._analyzed - self.context_lines):self._analyzed]
+            if not lines:
+                self.skipped += 1
+                return None
+
+            notes, empty = self._state()
+            prompt = realtime_qa_prompt(notes, empty, context, lines)
+            start = time.perf_counter()
+            try:
+                reply = await self.analyzer.generate_json(
+                    [prompt], SLOT_UPDATES_SCHEMA, self.tick_timeout_seconds, kind='realtime_qa')
+            except Exception as e:
+                # The lines stay pending and go out with the next tick
+                self.failed += 1
+                print(f"Realtime QA tick failed: {str(e)}")
+                return None
+            seconds = time.perf_counter() - start
+
+            updates = validate_slot_updates(reply.get('updates') if isinstance(reply, dict) else None)
+            changes = self._merge(updates, end)
+            self._analyzed = end
+            self.ticks += 1
+            self.history.append({
+                'lines': len(lines),
+                'prompt_chars': len(prompt),
+                'seconds': round(seconds, 3),
+                'updates': len(updates),
+                'changed': len(changes)
+            })
+
+        if changes and self.on_update:
+            try:
+                self.on_update(changes, self.snapshot())
+            except Exception as e:
+                print(f"Error publishing realtime QA update: {str(e)}")
+        return changes
+
+    def _merge(self, updates, line):
+        changes = {}
+        now = time.time()
+        with self._lock:
+            for update in updates:
+                slot = self.slots[update.slot]
+                value = update.value.strip()
+                if not value or (value == slot.value and update.confidence <= slot.confidence):
+                    continue
+                if update.confidence < slot.confidence and update.confidence < self.revise_confidence:
+                    continue
+                slot.value = value
+                slot.confidence = update.confidence
+                slot.line = line
+                slot.updated_at = now
+                changes[update.slot] = {'value': value, 'confidence': update.confidence}
+        return changes
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            await self.tick()
+
+    def start(self):
+        """Tick every interval_seconds in the background until stop() or finalize()"""
+        if self._task is None:
+            self._task = self.analyzer.submit(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def finalize_async(self):
+        """Stop ticking, analyze whatever lines are still pending and return the snapshot"""
+        self.stop()
+        await self.tick()
+        return self.snapshot()
+
+    def finalize(self):
+        """Blocking version of finalize_async, for use from other threads"""
+        return self.analyzer.submit(self.finalize_async()).result()
+
+    def qa_analysis(self):
+        """Notes in the qa_analysis layout, "Not mentioned" for empty slots"""
+        with self._lock:
+            return {
+                section: {name.split('.', 1)[1]: slot.value or "Not mentioned"
+                          for name, slot in self.slots.items() if name.startswith(f"{section}.")}
+                for section in QA_SECTIONS
+            }
+
+    def snapshot(self):
+        with self._lock:
+            confidence = {name: slot.confidence for name, slot in self.slots.items() if slot.value}
+            lines = len(self._lines)
+        return {'qa_analysis': self.qa_analysis(), 'confidence': confidence, 'lines': lines}
+
+    def stats(self):
+        seconds = [tick['seconds'] for tick in self.history]
+        return {
+            'ticks': self.ticks,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'filled': sum(1 for slot in self.slots.values() if slot.value),
+            'mean_tick_seconds': round(sum(seconds) / len(seconds), 3) if seconds else None,
+            'last_prompt_chars': self.history[-1]['prompt_chars'] if self.history else None
+        }
@@ -0,0 +1,143 @@
+import numpy as np
+
+# Analysis format expected by ConversationAnalyzer
+ANALYSIS_RATE = 16000
+# Low-pass filter length used when downsampling
+FILTER_TAPS = 63
+# Frames read per block when normalizing a file
+BLOCK_FRAMES = 16000
+
+
+def _lowpass(cutoff, taps=FILTER_TAPS):
+    """Windowed-sinc low-pass filter; cutoff is a fraction of the input rate"""
+    n = np.arange(taps) - (taps - 1) / 2
+    h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+    return (h / h.sum()).astype(np.float32)
+
+
+def to_int16(frames, sample_width):
+    """View or convert raw PCM of any common sample width as int16"""
+    if sample_width == 2:
+        return np.frombuffer(frames, dtype='<i2')
+    if sample_width == 1:
+        # 8-bit WAV is unsigned
+        return ((np.frombuffer(frames, dtype=np.uint8).astype(np.int16) - 128) << 8)
+    if sample_width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        return (raw[:, 1].astype(np.int16) | (raw[:, 2].astype(np.int16) << 8))
+    if sample_width == 4:
+        return (np.frombuffer(frames, dtype='<i4') >> 16).astype(np.int16)
+    raise ValueError(f"Unsupported sample width: {sample_width}")
+
+
+class StreamingResampler:
+    """Downmixes interleaved int16 PCM to mono and resamples it chunk by chunk.
+
+    State (filter history, fractional read position) carries over between
+    `process()` calls, so feeding a recording in arbitrary chunks gives the
+    same output as converting it in one go. Call `flush()` once at the end
+    to drain the filter delay.
+    """
+
+    def __init__(self, in_rate, out_rate=ANALYSIS_RATE, channels=1):
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.channels = channels
+        self.passthrough = in_rate == out_rate and channels == 1
+
+        # Anti-alias only when downsampling; linear interpolation is enough up
+        self._filter = _lowpass(0.5 * 0.9 * out_rate / in_rate) if out_rate < in_rate else None
+        taps = len(self._filter) if self._filter is not None else 1
+        self._history = np.zeros(taps - 1, dtype=np.float32)
+        # Filter group delay, trimmed from the start and flushed at the end
+        self._delay = (taps - 1) // 2
+        self._skip = self._delay
+
+        # Filtered samples not yet consumed, and the index of the first one
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._pending_start = 0
+        self._next_out = 0
+
+    def process(self, data):
+        """Convert one chunk; returns int16 mono bytes at out_rate"""
+        if self.passthrough:
+            return bytes(data)
+
+        samples = np.frombuffer(data, dtype='<i2')
+        if self.channels > 1:
+            samples = samples[:len(samples) - len(samples) % self.channels]
+            samples = samples.reshape(-1, self.channels).mean(axis=1, dtype=np.float32)
+        else:
+            samples = samples.astype(np.float32)
+        return self._resample(samples)
+
+    def flush(self):
+        """Drain the samples still held back by the filter"""
+        if self.passthrough or self._delay == 0:
+            return b''
+        return self._resample(np.zeros(self._delay, dtype=np.float32))
+
+    def _resample(self, samples):
+        if self._filter is not None:
+            padded = np.concatenate((self._history, samples))
+            self._history = padded[len(padded) - len(self._history):]
+            samples = np.convolve(padded, self._filter, mode='valid').astype(np.float32)
+            if self._skip:
+                dropped = min(self._skip, len(samples))
+                samples = samples[dropped:]
+                self._skip -= dropped
+
+        if self.in_rate == self.out_rate:
+            return self._to_bytes(samples)
+
+        pending = np.concatenate((self._pending, samples))
+        end = self._pending_start + len(pending)
+        # Output k sits at input position k * in_rate / out_rate; it needs
+        # the sample after it for interpolation
+        last = (end - 1) * self.out_rate // self.in_rate
+        while last >= 0 and (last * self.in_rate) // self.out_rate + 1 >= end:
+            last -= 1
+        if last < self._next_out:
+            self._pending = pending
+            return b''
+
+        k = np.arange(self._next_out, last + 1, dtype=np.int64)
+        position = k * self.in_rate
+        index = position // self.out_rate
+        frac = (position % self.out_rate).astype(np.float32) / self.out_rate
+        local = index - self._pending_start
+        out = pending[local] * (1 - frac) + pending[local + 1] * frac
+
+        self._next_out = last + 1
+        keep_from = min((self._next_out * self.in_rate) // self.out_rate - self._pending_start,
+                        len(pending))
+        self._pending = pending[keep_from:]
+        self._pending_start += keep_from
+        return self._to_bytes(out)
+
+    @staticmethod
+    def _to_bytes(samples):
+        return np.clip(np.rint(samples), -32768, 32767).astype('<i2').tobytes()
+
+
+def is_analysis_format(rate, channels, sample_width, target_rate=ANALYSIS_RATE):
+    return rate == target_rate and channels == 1 and sample_width == 2
+
+
+def normalize_pcm(pcm, rate, channels=1, sample_width=2, target_rate=ANALYSIS_RATE,
+                  block_frames=BLOCK_FRAMES):
+    """Return PCM in the analysis format (mono int16 at target_rate).
+
+    Input already in that format is returned as is (no copy); anything
+    else is converted block by block through a StreamingResampler.
+    """
+    if is_analysis_format(rate, channels, sample_width, target_rate):
+        return pcm
+
+    resampler = StreamingResampler(rate, target_rate, channels)
+    view = memoryview(pcm).cast('B')
+    step = block_frames * channels * sample_width
+    out = [resampler.process(to_int16(view[i:i + step], sample_width))
+           for i in range(0, len(view), step)]
+    out.append(resampler.flush())
+    return b''.join(out)
@@ -0,0 +1,143 @@
+import re
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import List
+
+import numpy as np
+
+from vad import frame_levels
+
+# Entries compared at each window boundary when looking for the overlap
+MAX_OVERLAP_ENTRIES = 8
+# Normalized text similarity at which two entries count as the same utterance
+MATCH_RATIO = 0.75
+# A matched run must cover this many words, so a lone "Yes." can't anchor it
+MIN_OVERLAP_WORDS = 4
+
+
+@dataclass
+class Window:
+    """A span of the recording transcribed on its own, in samples"""
+    index: int
+    start: int
+    end: int
+    rate: int
+
+    @property
+    def start_seconds(self):
+        return self.start / self.rate
+
+    @property
+    def duration(self):
+        return (self.end - self.start) / self.rate
+
+    def pcm(self, pcm):
+        """Slice this window out of mono int16 PCM without copying"""
+        return memoryview(pcm).cast('B')[self.start * 2:self.end * 2]
+
+    def to_dict(self):
+        return {
+            'index': self.index,
+            'start_seconds': round(self.start_seconds, 3),
+            'duration': round(self.duration, 3)
+        }
+
+
+def plan_windows(pcm, rate, window_seconds=300, overlap_seconds=6, search_seconds=20,
+                 frame_ms=30, smooth_ms=300):
+    """Split mono int16 PCM into overlapping windows cut at pauses.
+
+    Each cut is placed at the quietest point (levels smoothed over
+    `smooth_ms`) within `search_seconds` of the nominal window end, and the
+    windows on either side of it share `overlap_seconds` centred on that
+    pause. `search_seconds` is capped at a quarter window, and a remainder
+    too short to leave a quarter window after the next cut joins the last
+    window.
+    """
+    samples = np.frombuffer(pcm, dtype='<i2')
+    total = len(samples)
+    window = int(window_seconds * rate)
+    if total <= window * 1.25:
+        return [Window(0, 0, total, rate)]
+
+    frame = max(1, int(rate * frame_ms / 1000))
+    levels = frame_levels(samples, frame)
+    smooth = max(1, int(smooth_ms / frame_ms))
+    levels = np.convolve(levels, np.ones(smooth) / smooth, mode='same')
+
+    cuts = []
+    position = 0
+    search = min(int(search_seconds * rate), window // 4)
+    while total - (position + window + search) > window // 4:
+        low = (position + window - search) // frame
+        high = min(position + window + search, total) // frame
+        cut = (low + int(np.argmin(levels[low:high]))) * frame
+        cuts.append(cut)
+        position = cut
+
+    half_overlap = int(overlap_seconds * rate / 2)
+    bounds = [0] + cuts + [total]
+    return [
+        Window(i, max(0, start - half_overlap if i else 0), min(total, end + half_overlap), rate)
+        for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:]))
+    ]
+
+
+def _normalize(text):
+    return re.sub(r'[^\w\s]', '', text.lower()).split()
+
+
+def _same_utterance(a, b):
+    """Whether two entries transcribe the same speech, allowing for one cut short"""
+    words_a, words_b = _normalize(a.get('text', '')), _normalize(b.get('text', ''))
+    if not words_a or not words_b:
+        return False
+    shorter, longer = sorted((' '.join(words_a), ' '.join(words_b)), key=len)
+    if len(shorter) >= 12 and shorter in longer:
+        return True
+    return SequenceMatcher(None, words_a, words_b).ratio() >= MATCH_RATIO
+
+
+def _longer(a, b):
+    return a if len(a.get('text', '')) >= len(b.get('text', '')) else b
+
+
+def stitch_transcripts(parts: List[List[dict]]):
+    """Join per-window transcripts, dropping entries repeated in the overlaps.
+
+    At each boundary the tail of the running transcript is aligned with the
+    head of the next window: the earliest run of matching entries that
+    reaches the end of the tail (or all but its last, possibly truncated,
+    entry) is treated as the overlap. Matched entries keep whichever copy
+    is longer, since the window edge can cut an utterance short.
+    """
+    stitched = []
+    for part in parts:
+        if not stitched:
+            stitched = list(part)
+            continue
+
+        tail_start = max(0, len(stitched) - MAX_OVERLAP_ENTRIES)
+        best = None
+        for i in range(tail_start, len(stitched)):
+            for j in range(min(len(part), MAX_OVERLAP_ENTRIES)):
+                run = 0
+                while (i + run < len(stitched) and j + run < len(part)
+                       and _same_utterance(stitched[i + run], part[j + run])):
+                    run += 1
+                words = sum(len(_normalize(entry.get('text', ''))) for entry in part[j:j + run])
+                if run and words >= MIN_OVERLAP_WORDS and i + run >= len(stitched) - 1:
+                    best = (i, j, run)
+                    break
+            if best:
+                break
+
+        if best is None:
+            stitched.extend(part)
+            continue
+        i, j, run = best
+        merged = [_longer(stitched[i + k], part[j + k]) for k in range(run)]
+        # Entries after the matched run in the tail were cut off at the window
+        # edge; the next window has them in full
+        stitched = stitched[:i] + merged + list(part[j + run:])
+    return stitched
@@ -0,0 +1,114 @@
+"""Upload a recording's finished windows while it is still being recorded
+
+Long recordings are analyzed in windows (see segmenter.plan_windows), and
+every window but the last is fixed long before the recording ends: its
+cut can no longer move once the audio runs a quarter window past the
+search range. A SpeculativeUploader follows the recording file as the
+StreamingWavWriter fills it and sends each window through the File API as
+soon as it is fixed, so the uplink works during the consultation instead
+of in one burst at stop, and the analysis only has the tail left to send.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+from segmenter import plan_windows
+from wav_writer import HEADER_SIZE
+import tracing
+
+
+class SpeculativeUploader:
+    """Uploads the settled windows of one recording in progress.
+
+    Every `poll_seconds` the recording file is re-planned (memory-mapped,
+    so nothing is held between polls). Once the analyzer would use
+    uploads made ahead (ConversationAnalyzer.would_upload: the recording
+    is long enough to be analyzed in windows), each window the final plan
+    is certain to contain is uploaded with ConversationAnalyzer.upload_ahead;
+    the analysis of the finished recording then finds those uploads by
+    content. `finish()` stops polling and waits for an upload in flight;
+    `discard()` also deletes the uploads, for recordings that won't be
+    analyzed as audio.
+    """
+
+    def __init__(self, analyzer, path, poll_seconds=15):
+        self.analyzer = analyzer
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self.uploads = []
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._span = None
+
+    def start(self):
+        # Uploads are traced under the span current when the recording started
+        self._span = tracing.current()
+        self._thread = threading.Thread(target=self._run, name='speculative-upload', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                with tracing.activate(self._span):
+                    self.poll()
+            except Exception as e:
+                # The analysis sends whatever wasn't uploaded here
+                self.error = str(e)
+                print(f"Speculative upload stopped: {str(e)}")
+                return
+
+    def _recording(self):
+        """PCM written so far, mapped read-only"""
+        size = os.path.getsize(self.path) - HEADER_SIZE
+        size -= size % 2
+        if size <= 0:
+            return None
+        return np.memmap(self.path, dtype=np.uint8, mode='r', offset=HEADER_SIZE, shape=(size,))
+
+    def poll(self):
+        """Upload any window that has settled since the last poll"""
+        pcm = self._recording()
+        rate = self.analyzer.config.audio.analysis_sample_rate
+        if pcm is None or not self.analyzer.would_upload(pcm, rate):
+            return
+        # Growing the recording can only move the last window
+        windows = plan_windows(pcm, rate, **self.analyzer.config.segments.params)[:-1]
+        for window in windows[len(self.uploads):]:
+            if self._stop.is_set():
+                return
+            start = time.perf_counter()
+            key, uploaded = self.analyzer.upload_ahead(window.pcm(pcm), rate)
+            self.uploads.append({
+                'index': window.index,
+                'key': key,
+                'file_name': uploaded.name,
+                'audio_seconds': round(window.duration, 2),
+                'seconds': round(time.perf_counter() - start, 2)
+            })
+            print(f"Uploaded window {window.index} ({window.duration:.0f}s) ahead of stop as {uploaded.name}")
+
+    def finish(self):
+        """Stop following the recording; returns once no upload is in flight"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.stats()
+
+    def discard(self):
+        """Stop and delete everything uploaded, for a recording that won't be analyzed as audio"""
+        self.finish()
+        for upload in self.uploads:
+            self.analyzer.forget_upload(upload['key'], upload['file_name'])
+        self.uploads = []
+
+    def stats(self):
+        return {
+            'windows': len(self.uploads),
+            'audio_seconds': round(sum(upload['audio_seconds'] for upload in self.uploads), 2),
+            'upload_seconds': round(sum(upload['seconds'] for upload in self.uploads), 2),
+            'error': self.error
+        }
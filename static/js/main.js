@@ -42,6 +42,7 @@ startButton.addEventListener('click', async () => {
 
         // 开始录音
         mediaRecorder.start();
+        liveTranscriptStarted = false;
         socket.emit('start_recording');
 
         // 更新按钮状态
@@ -137,145 +138,231 @@ function visualize() {
     animationId = requestAnimationFrame(visualize);
 }
 
-// 处理分析结果
-socket.on('audio_analysis', (response) => {
-    // 隐藏分析状态
-    document.getElementById('analysisStatus').style.display = 'none';
+// 分析任务排队与进度
+const analysisStatusText = document.getElementById('analysisStatusText');
 
-    if (response.status === 'error') {
-        alert(response.message);
-        return;
-    }
-
-    const analysis = response.data;
+socket.on('analysis_queued', (job) => {
+    document.getElementById('analysisStatus').style.display = 'block';
+    analysisStatusText.textContent = `Analysis queued (position ${job.position})...`;
+});
 
-    // Display Transcript
-    const transcriptContent = document.getElementById('transcript-content');
-    
-    // 检查 transcript 是否为数组
-    if (Array.isArray(analysis.transcript)) {
-        // 数组格式 - 构建对话形式的HTML
-        let transcriptHtml = '';
-        analysis.transcript.forEach(item => {
-            transcriptHtml += `<p><strong>${item.speaker}:</strong> ${item.text}</p>`;
-        });
-        transcriptContent.innerHTML = transcriptHtml;
-    } else {
-        // 如果不是数组，按原来方式处理
-        transcriptContent.innerHTML = `<p>${analysis.transcript}</p>`;
-    }
+socket.on('analysis_progress', (job) => {
+    const stages = {
+        started: 'Starting analysis...',
+        preparing: 'Preparing audio...',
+        uploading: 'Uploading audio...',
+        generating: 'Analyzing consultation recording...',
+        transcribing: 'Transcribing recording...',
+        extracting: 'Extracting Q&A and summary...',
+        cached: 'Using previous analysis of this recording...',
+        saving: 'Saving consultation...'
+    };
+    analysisStatusText.textContent = stages[job.stage] || 'Analyzing consultation recording...';
+});
 
-    // Display Q&A Analysis
-    // CAUSE
+// 分析结果渲染
+function renderCause(cause) {
     const causeContent = document.getElementById('cause-content');
     causeContent.innerHTML = `
         <div class="form-item">
             <label>Work:</label>
-            <span>${analysis.qa_analysis.cause.work || 'N/A'}</span>
+            <span>${cause.work || 'N/A'}</span>
         </div>
         <div class="form-item">
             <label>Sleep:</label>
-            <span>${analysis.qa_analysis.cause.sleep || 'N/A'}</span>
+            <span>${cause.sleep || 'N/A'}</span>
         </div>
         <div class="form-item">
             <label>Sports/Hobbies:</label>
-            <span>${analysis.qa_analysis.cause.sports_injuries || 'N/A'}</span>
+            <span>${cause.sports_injuries || 'N/A'}</span>
         </div>
         <div class="form-item">
             <label>MVA:</label>
-            <span>${analysis.qa_analysis.cause.mva || 'N/A'}</span>
+            <span>${cause.mva || 'N/A'}</span>
         </div>
         <div class="form-item">
             <label>Summary:</label>
-            <span>${analysis.qa_analysis.cause.summary || 'N/A'}</span>
+            <span>${cause.summary || 'N/A'}</span>
         </div>
     `;
+}
 
-    // PRESENTATION
+function renderPresentation(presentation) {
     const presentationContent = document.getElementById('presentation-content');
     presentationContent.innerHTML = `
         <div class="form-item">
             <label>Main Complaint:</label>
-            <span>${analysis.qa_analysis.presentation.main_complaint || 'N/A'}</span>
+            <span>${presentation.main_complaint || 'N/A'}</span>
         </div>
         <div class="form-item">
             <label>Onset:</label>
-            <span>${analysis.qa_analysis.presentation.onset || 'N/A'}</span>
+            <span>${presentation.onset || 'N/A'}</span>
         </div>
         <div class="form-item">
             <label>Chronic:</label>
-            <span>${analysis.qa_analysis.presentation.is_chronic || 'N/A'}</span>
+            <span>${presentation.is_chronic || 'N/A'}</span>
         </div>
     `;
+}
 
-    // LIFE EFFECT
+function renderLifeEffect(life_effect) {
     const lifeEffectContent = document.getElementById('life-effect-content');
     lifeEffectContent.innerHTML = `
         <div class="form-item">
             <label>Activities Impact:</label>
-            <span>${analysis.qa_analysis.life_effect.activities_impact || 'N/A'}</span>
+            <span>${life_effect.activities_impact || 'N/A'}</span>
         </div>
         <div class="form-item">
             <label>Nerve Root:</label>
-            <span>${analysis.qa_analysis.life_effect.nerve_root || 'N/A'}</span>
+            <span>${life_effect.nerve_root || 'N/A'}</span>
         </div>
         <div class="form-item">
             <label>Clumsy:</label>
-            <span>${analysis.qa_analysis.life_effect.clumsy || 'N/A'}</span>
+            <span>${life_effect.clumsy || 'N/A'}</span>
         </div>
         <div class="form-item">
             <label>Focus:</label>
-            <span>${analysis.qa_analysis.life_effect.focus || 'N/A'}</span>
+            <span>${life_effect.focus || 'N/A'}</span>
         </div>
         <div class="form-item">
             <label>Immune:</label>
-            <span>${analysis.qa_analysis.life_effect.immune || 'N/A'}</span>
+            <span>${life_effect.immune || 'N/A'}</span>
         </div>
         <div class="form-item">
             <label>Stress:</label>
-            <span>${analysis.qa_analysis.life_effect.stress || 'N/A'}</span>
+            <span>${life_effect.stress || 'N/A'}</span>
         </div>
     `;
+}
 
-    // INTENT
+function renderIntent(intent) {
     const intentContent = document.getElementById('intent-content');
     intentContent.innerHTML = `
         <div class="form-item">
             <label>Previous Care:</label>
-            <span>${analysis.qa_analysis.intent.previous_care || 'N/A'}</span>
+            <span>${intent.previous_care || 'N/A'}</span>
         </div>
         <div class="form-item">
             <label>Previous Exercises:</label>
-            <span>${analysis.qa_analysis.intent.previous_exercises || 'N/A'}</span>
+            <span>${intent.previous_exercises || 'N/A'}</span>
         </div>
         <div class="form-item">
             <label>Lifestyle Changes:</label>
-            <span>${analysis.qa_analysis.intent.lifestyle_changes || 'N/A'}</span>
+            <span>${intent.lifestyle_changes || 'N/A'}</span>
         </div>
         <div class="form-item">
             <label>Why Not Healed:</label>
-            <span>${analysis.qa_analysis.intent.why_not_healed || 'N/A'}</span>
+            <span>${intent.why_not_healed || 'N/A'}</span>
         </div>
         <div class="form-item">
             <label>Goal:</label>
-            <span>${analysis.qa_analysis.intent.goal || 'N/A'}</span>
+            <span>${intent.goal || 'N/A'}</span>
         </div>
     `;
+}
 
-    // Display Summary
+function renderSummary(summary) {
     const summaryContent = document.getElementById('summary-content');
     summaryContent.innerHTML = `
         <div class="summary-item">
             <h4>Presentation</h4>
-            <p>${analysis.summary.presentation}</p>
+            <p>${summary.presentation}</p>
         </div>
         <div class="summary-item">
             <h4>Life Effect</h4>
-            <p>${analysis.summary.life_effect}</p>
+            <p>${summary.life_effect}</p>
         </div>
         <div class="summary-item">
             <h4>Goal</h4>
-            <p>${analysis.summary.goal}</p>
+            <p>${summary.goal}</p>
         </div>
     `;
-});
\ No newline at end of file
+}
+
+const qaRenderers = {
+    cause: renderCause,
+    presentation: renderPresentation,
+    life_effect: renderLifeEffect,
+    intent: renderIntent
+};
+
+// 流式部分结果: transcript lines and Q&A sections as soon as they are generated
+socket.on('analysis_partial', (partial) => {
+    const transcriptContent = document.getElementById('transcript-content');
+    if (partial.kind === 'transcript_entry') {
+        if (partial.data.index === 0) {
+            transcriptContent.innerHTML = '';
+        }
+        const item = partial.data.entry;
+        transcriptContent.insertAdjacentHTML('beforeend', `<p><strong>${item.speaker}:</strong> ${item.text}</p>`);
+    } else if (partial.kind === 'qa_section' && qaRenderers[partial.data.section]) {
+        qaRenderers[partial.data.section](partial.data.value);
+    } else if (partial.kind === 'summary') {
+        renderSummary(partial.data);
+    }
+});
+
+// 实时转录: interim segments replace each other until the final one arrives
+let liveTranscriptStarted = false;
+
+socket.on('transcript_segment', (segment) => {
+    const transcriptContent = document.getElementById('transcript-content');
+    if (!liveTranscriptStarted) {
+        transcriptContent.innerHTML = '';
+        liveTranscriptStarted = true;
+    }
+    const interim = transcriptContent.querySelector('.interim');
+    if (interim) {
+        interim.remove();
+    }
+    const speaker = segment.speaker ? `<strong>${segment.speaker}:</strong> ` : '';
+    const cls = segment.is_final ? '' : ' class="interim"';
+    transcriptContent.insertAdjacentHTML('beforeend', `<p${cls}>${speaker}${segment.text}</p>`);
+});
+
+// Q&A notes kept up to date during the recording
+socket.on('qa_update', (update) => {
+    const sections = new Set(Object.keys(update.changes).map(slot => slot.split('.')[0]));
+    sections.forEach(section => {
+        if (qaRenderers[section]) {
+            qaRenderers[section](update.qa_analysis[section]);
+        }
+    });
+});
+
+// 处理分析结果
+socket.on('audio_analysis', (response) => {
+    // 隐藏分析状态
+    document.getElementById('analysisStatus').style.display = 'none';
+
+    if (response.status === 'error') {
+        alert(response.message);
+        return;
+    }
+
+    const analysis = response.data;
+
+    // Display Transcript
+    const transcriptContent = document.getElementById('transcript-content');
+    
+    // 检查 transcript 是否为数组
+    if (Array.isArray(analysis.transcript)) {
+        // 数组格式 - 构建对话形式的HTML
+        let transcriptHtml = '';
+        analysis.transcript.forEach(item => {
+            transcriptHtml += `<p><strong>${item.speaker}:</strong> ${item.text}</p>`;
+        });
+        transcriptContent.innerHTML = transcriptHtml;
+    } else {
+        // 如果不是数组，按原来方式处理
+        transcriptContent.innerHTML = `<p>${analysis.transcript}</p>`;
+    }
+
+    // Display Q&A Analysis
+    Object.entries(qaRenderers).forEach(([section, render]) => {
+        render(analysis.qa_analysis[section]);
+    });
+
+    // Display Summary
+    renderSummary(analysis.summary);
+});
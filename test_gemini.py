@@ -1,7 +1,7 @@
 import os
 from config import Config
 from conversation_analyzer import ConversationAnalyzer
-import base64
+from audio_input import AudioInput
 
 def test_audio_analysis():
     """Test audio analysis functionality"""
@@ -18,15 +18,12 @@ def test_audio_analysis():
             print(f"Error: Test file {audio_file_path} not found")
             return
             
-        # Read and encode audio file
-        with open(audio_file_path, 'rb') as f:
-            audio_data = f.read()
-            # Convert to base64
-            audio_base64 = base64.b64encode(audio_data).decode('utf-8')
+        # Map audio file
+        audio = AudioInput.from_file(audio_file_path)
         
         # Analyze audio
         print("Analyzing audio file...")
-        analysis = analyzer.analyze_audio(audio_base64)
+        analysis = analyzer.analyze_audio(audio)
         
         if analysis:
             print("\n=== Analysis Results ===")
@@ -0,0 +1,50 @@
+"""Microbenchmark: per-sample Python level loop vs. audio_level.measure_level
+
+Run from the repository root:
+    python -m testscript.bench_audio_level
+"""
+import sys
+import os
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_level import measure_level
+
+# (label, frames per callback) for the capture paths we ship
+CHUNKS = [
+    ("web 16 kHz / 100 ms", 1600),
+    ("gui 44.1 kHz / 1024", 1024),
+]
+
+
+def legacy_level(in_data):
+    """The loop previously used in AudioRecorder._fill_buffer"""
+    return max(abs(int.from_bytes(in_data[i:i+2], byteorder='little', signed=True))
+               for i in range(0, len(in_data), 2))
+
+
+def bench(func, data, number):
+    best = min(timeit.repeat(lambda: func(data), number=number, repeat=5))
+    return best / number * 1e6  # microseconds per call
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'chunk':<22}{'legacy us':>12}{'numpy us':>12}{'speedup':>10}{'budget %':>10}")
+    for label, frames in CHUNKS:
+        data = rng.integers(-32768, 32767, frames, dtype=np.int16).tobytes()
+        assert legacy_level(data) == measure_level(data).peak
+
+        legacy = bench(legacy_level, data, 200)
+        vectorized = bench(measure_level, data, 5000)
+        # Share of the callback period a single stream spends metering
+        rate = 16000 if frames == 1600 else 44100
+        period_us = frames / rate * 1e6
+        print(f"{label:<22}{legacy:>12.1f}{vectorized:>12.1f}"
+              f"{legacy / vectorized:>9.0f}x{vectorized / period_us * 100:>9.3f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Benchmark: capture callback cost of queue + list vs. the CaptureBuffer ring
+
+Drives both callback implementations with synthetic 100 ms chunks. Objects
+allocated per callback are counted with the consumers stalled (everything
+the audio thread allocates is then still alive); callback duration is
+measured with a consumer thread metering and "writing" the audio.
+
+Run from the repository root:
+    python -m testscript.bench_capture_buffer
+"""
+import sys
+import os
+import gc
+import queue
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_level import measure_level
+from capture_buffer import CaptureBuffer
+
+RATE = 16000
+CHUNK = int(RATE / 10)
+CALLBACKS = 20000
+
+
+class LegacyCapture:
+    """The previous AudioRecorder callback: level + queue + recording list"""
+
+    def __init__(self):
+        self.buff = queue.Queue()
+        self.recording_data = []
+
+    def callback(self, in_data):
+        self.buff.put((in_data, measure_level(in_data)))
+        self.recording_data.append(in_data)
+
+    def consume(self, stop):
+        while not stop.is_set():
+            try:
+                self.buff.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+class RingCapture:
+    """The CaptureBuffer callback with metering and file writing as readers"""
+
+    def __init__(self):
+        self.capture = CaptureBuffer(CHUNK * 2, 300)
+        self.meter = self.capture.reader()
+        self.writer = self.capture.reader()
+
+    def callback(self, in_data):
+        self.capture.write(in_data)
+
+    def consume(self, stop):
+        sink = bytearray(CHUNK * 2 * 64)
+        while not stop.is_set():
+            view = self.meter.read(timeout=0.1)
+            if view is not None:
+                measure_level(view)
+            view = self.writer.read(max_chunks=64, timeout=0)
+            if view is not None:
+                sink[:len(view)] = view
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def count_allocations(capture, in_data, n=1000):
+    gc.collect()
+    gc.disable()
+    try:
+        before = sys.getallocatedblocks()
+        for _ in range(n):
+            capture.callback(in_data)
+        return (sys.getallocatedblocks() - before) / n
+    finally:
+        gc.enable()
+
+
+def run(label, factory, in_data):
+    blocks = count_allocations(factory(), in_data)
+
+    capture = factory()
+    stop = threading.Event()
+    consumer = threading.Thread(target=capture.consume, args=(stop,), daemon=True)
+    consumer.start()
+    durations = [0.0] * CALLBACKS
+    for i in range(CALLBACKS):
+        start = time.perf_counter()
+        capture.callback(in_data)
+        durations[i] = time.perf_counter() - start
+    stop.set()
+    consumer.join()
+
+    durations_us = [d * 1e6 for d in durations]
+    print(f"{label:<14}"
+          f"{blocks:>14.2f}"
+          f"{percentile(durations_us, 50):>10.1f}"
+          f"{percentile(durations_us, 99):>10.1f}"
+          f"{max(durations_us):>10.1f}")
+
+
+def main():
+    # PyAudio hands the callback a fresh bytes object; reuse one so only the
+    # callback's own allocations are counted
+    in_data = os.urandom(CHUNK * 2)
+    print(f"{'path':<14}{'blocks/call':>14}{'p50 us':>10}{'p99 us':>10}{'max us':>10}")
+    run("queue+list", LegacyCapture, in_data)
+    run("ring", RingCapture, in_data)
+
+
+if __name__ == "__main__":
+    main()
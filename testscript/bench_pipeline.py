@@ -0,0 +1,213 @@
+"""Benchmark: stop-to-emit pipeline stages against the local Gemini stand-in
+
+Runs the path a recording takes from stop to the client (write the WAV,
+read and normalize it, analyze it, save the consultation, emit the result
+over Socket.IO) at several recording lengths and concurrency levels, with
+model calls answered by fake_gemini_server. For each configuration it
+reports p50/p95 per stage:
+
+    wav_write  whole recording through StreamingWavWriter
+    read       AudioInput.from_file plus normalization
+    encode     FLAC/WAV encoding inside the analysis (summed over windows)
+    request    model calls, including waits and retries (summed over calls)
+    parse      JSON parsing of replies (summed over calls)
+    analyze    analyze_audio_async wall time (covers encode/request/parse)
+    save       ConsultationRecorder.save_consultation
+    emit       audio_analysis emitted to a Socket.IO test client
+    total      stop-to-emit wall time
+
+Results are written to cache/bench/ and compared with the previous run
+(or --baseline); stages whose p50 grew by more than --threshold (and by
+more than --min-ms) are flagged and the exit status is 1.
+
+Run from the repository root:
+    python -m testscript.bench_pipeline --lengths 30 120 900 --concurrency 1 4
+"""
+import sys
+import os
+import argparse
+import asyncio
+import glob
+import json
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_input import AudioInput
+from config import Config, GeminiConfig, UploadConfig, CacheConfig, LimitsConfig
+from consultation_recorder import ConsultationRecorder
+from conversation_analyzer import ConversationAnalyzer
+from fake_gemini_server import FakeGeminiServer, FakeModel
+from wav_writer import StreamingWavWriter
+
+RATE = 16000
+CHUNK = RATE // 10
+STAGES = ['wav_write', 'read', 'encode', 'request', 'parse', 'analyze', 'save', 'emit', 'total']
+RESULTS_DIR = os.path.join('cache', 'bench')
+
+
+def speech_like(seconds, seed):
+    """Noise in 2 s bursts with 1 s pauses, so VAD and window cuts have work to do"""
+    samples = np.random.default_rng(seed).normal(0, 3000, RATE * seconds)
+    talking = (np.arange(len(samples)) // RATE) % 3 != 2
+    return (samples * talking).astype('<i2').tobytes()
+
+
+class Emitter:
+    """Socket.IO server with a connected test client, as app.py emits results"""
+
+    def __init__(self):
+        from flask import Flask
+        from flask_socketio import SocketIO
+        self.app = Flask(__name__)
+        self.socketio = SocketIO(self.app)
+        self.client = self.socketio.test_client(self.app)
+        self.lock = threading.Lock()
+
+    def emit(self, payload):
+        with self.lock:
+            self.socketio.emit('audio_analysis', payload)
+            assert self.client.get_received(), "emit did not reach the client"
+
+
+async def run_one(analyzer, recorder, emitter, workdir, seconds, index):
+    timings = {}
+    pcm = speech_like(seconds, index)
+    path = os.path.join(workdir, f"recording_bench_{seconds}_{index}.wav")
+
+    def write():
+        with StreamingWavWriter(path, rate=RATE) as writer:
+            for offset in range(0, len(pcm), CHUNK * 2):
+                writer.write(pcm[offset:offset + CHUNK * 2])
+
+    def read():
+        audio = AudioInput.from_file(path)
+        analyzer._normalize_audio(audio)
+        return audio
+
+    start = time.perf_counter()
+    await asyncio.to_thread(write)
+    # The recording stops once its file is complete
+    stopped = time.perf_counter()
+    timings['wav_write'] = stopped - start
+    audio = await asyncio.to_thread(read)
+    timings['read'] = time.perf_counter() - stopped
+
+    began = time.perf_counter()
+    analysis = await analyzer.analyze_audio_async(audio, use_cache=False)
+    timings['analyze'] = time.perf_counter() - began
+    if not analysis:
+        raise RuntimeError(f"Analysis of the {seconds}s recording failed")
+    audio_info = analysis['audio_processing']
+    windows = audio_info.get('windows', [audio_info])
+    timings['encode'] = sum(window.get('encode_ms', 0) for window in windows) / 1000
+    timings['request'] = analysis['pipeline']['calls']['request_seconds']
+    timings['parse'] = analysis['pipeline']['calls']['parse_seconds']
+
+    began = time.perf_counter()
+    await asyncio.to_thread(recorder.save_consultation, analysis, f"consultation_bench_{seconds}_{index}.json")
+    timings['save'] = time.perf_counter() - began
+    began = time.perf_counter()
+    await asyncio.to_thread(emitter.emit, {'status': 'success', 'data': analysis})
+    timings['emit'] = time.perf_counter() - began
+    timings['total'] = time.perf_counter() - stopped
+    os.remove(path)
+    return timings
+
+
+async def run_level(analyzer, recorder, emitter, workdir, seconds, concurrency, repeats):
+    samples = []
+    for repeat in range(repeats):
+        samples += await asyncio.gather(*(
+            run_one(analyzer, recorder, emitter, workdir, seconds, repeat * concurrency + i)
+            for i in range(concurrency)
+        ))
+    return {
+        stage: {
+            'p50_ms': round(float(np.percentile([s[stage] for s in samples], 50)) * 1000, 2),
+            'p95_ms': round(float(np.percentile([s[stage] for s in samples], 95)) * 1000, 2)
+        }
+        for stage in STAGES
+    }
+
+
+def compare(results, baseline, threshold, min_ms):
+    """Stages whose p50 got slower than the baseline by more than both margins"""
+    regressions = []
+    for key, stages in results.items():
+        for stage, stats in stages.items():
+            before = baseline.get(key, {}).get(stage)
+            if not before:
+                continue
+            grown = stats['p50_ms'] - before['p50_ms']
+            if grown > min_ms and stats['p50_ms'] > before['p50_ms'] * (1 + threshold):
+                regressions.append(f"{key} {stage}: p50 {before['p50_ms']:.1f} -> {stats['p50_ms']:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stop-to-emit pipeline benchmark")
+    parser.add_argument('--lengths', type=int, nargs='+', default=[30, 120, 900], help="recording seconds")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--repeats', type=int, default=2)
+    parser.add_argument('--first-token-seconds', type=float, default=0.3)
+    parser.add_argument('--tokens-per-second', type=float, default=1000.0)
+    parser.add_argument('--baseline', help="results file to compare with (default: the previous run)")
+    parser.add_argument('--threshold', type=float, default=0.2, help="relative p50 growth that counts")
+    parser.add_argument('--min-ms', type=float, default=5.0, help="ignore smaller absolute changes")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    model = FakeModel(first_token_seconds=args.first_token_seconds, tokens_per_second=args.tokens_per_second)
+    results = {}
+    with FakeGeminiServer(model=model) as server:
+        config = Config(
+            gemini=GeminiConfig("offline", "gemini-2.0-flash", 0.2, 0.95, 40, 8192, base_url=server.base_url),
+            upload=UploadConfig(base_url=server.base_url, registry_path=os.path.join(workdir, "uploads.json")),
+            cache=CacheConfig(enabled=False),
+            limits=LimitsConfig(requests_per_minute=6000, burst=64, max_concurrent_requests=16)
+        )
+        analyzer = ConversationAnalyzer(config)
+        analyzer.warm_up()
+        recorder = ConsultationRecorder(os.path.join(workdir, "consultations"))
+        emitter = Emitter()
+
+        for seconds in args.lengths:
+            for concurrency in args.concurrency:
+                key = f"{seconds}s x{concurrency}"
+                print(f"Running {key}...")
+                results[key] = asyncio.run(
+                    run_level(analyzer, recorder, emitter, workdir, seconds, concurrency, args.repeats))
+        analyzer.close()
+
+    print(f"\n{'config':<12}{'stage':<11}{'p50 ms':>10}{'p95 ms':>10}")
+    for key, stages in results.items():
+        for stage, stats in stages.items():
+            print(f"{key:<12}{stage:<11}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    previous = sorted(glob.glob(os.path.join(RESULTS_DIR, 'pipeline_*.json')))
+    baseline_path = args.baseline or (previous[-1] if previous else None)
+    path = os.path.join(RESULTS_DIR, f"pipeline_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {path}")
+
+    if baseline_path is None:
+        print("No earlier run to compare with")
+        return
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        regressions = compare(results, json.load(f), args.threshold, args.min_ms)
+    print(f"Compared with {baseline_path}: {len(regressions)} regressions")
+    for regression in regressions:
+        print(f"  REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
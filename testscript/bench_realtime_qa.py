@@ -0,0 +1,91 @@
+"""Benchmark: realtime QA tick cost over a 45-minute consultation
+
+Simulates a consultation with a recognized line every 5 s and a tick
+every 10 s, against fake_gemini_server with prompt processing time
+proportional to prompt size. The RealtimeQAEngine (new lines plus a
+compact notes summary) is ticked throughout; for comparison, the previous
+approach of re-sending the whole transcript is sampled at a few points.
+Delta ticks should stay flat while full re-sends grow with the session.
+
+Run from the repository root:
+    python -m testscript.bench_realtime_qa
+"""
+import sys
+import os
+import asyncio
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis_prompts import qa_prompt
+from config import Config, GeminiConfig, UploadConfig, CacheConfig, LimitsConfig
+from conversation_analyzer import ConversationAnalyzer
+from fake_gemini_server import FakeGeminiServer, FakeModel, LINES
+from realtime_qa import RealtimeQAEngine
+
+SESSION_MINUTES = 45
+LINE_SECONDS = 5
+TICK_SECONDS = 10
+SAMPLE_MINUTES = [1, 15, 30, 45]
+
+
+def line(i):
+    speaker = 'Doctor' if i % 2 == 0 else 'Patient'
+    return f"{speaker}: {LINES[i % len(LINES)]} (minute {i * LINE_SECONDS // 60})"
+
+
+async def full_resend(analyzer, lines):
+    """Previous approach: the whole transcript so far in every request"""
+    transcript = [{'speaker': text.split(': ', 1)[0], 'text': text.split(': ', 1)[1]} for text in lines]
+    prompt = qa_prompt(transcript)
+    start = time.perf_counter()
+    await analyzer.generate_json([prompt])
+    return time.perf_counter() - start, len(prompt)
+
+
+async def run(analyzer):
+    engine = RealtimeQAEngine(analyzer, interval_seconds=TICK_SECONDS)
+    lines_per_tick = TICK_SECONDS // LINE_SECONDS
+    ticks = SESSION_MINUTES * 60 // TICK_SECONDS
+    sent = []
+    buckets = {}
+    full = {}
+    for tick in range(ticks):
+        for i in range(tick * lines_per_tick, (tick + 1) * lines_per_tick):
+            sent.append(line(i))
+            engine.add_transcript(sent[-1])
+        await engine.tick()
+        # A tick with nothing new costs nothing
+        await engine.tick()
+        minute = (tick + 1) * TICK_SECONDS / 60
+        buckets.setdefault(int(tick * TICK_SECONDS / 60 // 5) * 5, []).append(engine.history[-1])
+        if minute in SAMPLE_MINUTES:
+            full[minute] = await full_resend(analyzer, sent)
+    return engine, buckets, full
+
+
+def main():
+    model = FakeModel(first_token_seconds=0.02, tokens_per_second=5000, prompt_tokens_per_second=20000)
+    with FakeGeminiServer(model=model) as server:
+        config = Config(
+            gemini=GeminiConfig("offline", "gemini-2.0-flash", 0.2, 0.95, 40, 8192, base_url=server.base_url),
+            upload=UploadConfig(base_url=server.base_url),
+            cache=CacheConfig(enabled=False),
+            limits=LimitsConfig(requests_per_minute=60000, burst=100)
+        )
+        analyzer = ConversationAnalyzer(config)
+        engine, buckets, full = asyncio.run(run(analyzer))
+        analyzer.close()
+
+    print(f"{'minutes':<10}{'delta tick':>12}{'prompt':>10}")
+    for start, ticks in sorted(buckets.items()):
+        seconds = sum(tick['seconds'] for tick in ticks) / len(ticks)
+        chars = sum(tick['prompt_chars'] for tick in ticks) // len(ticks)
+        print(f"{start:>2}-{start + 5:<7}{seconds * 1000:>10.1f}ms{chars:>10}")
+    print(f"\n{'minute':<10}{'full re-send':>14}{'prompt':>10}")
+    for minute, (seconds, chars) in full.items():
+        print(f"{minute:<10g}{seconds * 1000:>12.1f}ms{chars:>10}")
+    print(f"\nEngine: {engine.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Benchmark: stop-to-result latency with and without speculative upload
+
+Records speech-like audio into a WAV file at a multiple of real time and
+analyzes it at stop against fake_gemini_server, whose request bodies go
+through a simulated uplink shared by all requests. Each length is run
+twice with separate upload registries:
+
+    at stop      nothing is sent before stop (the previous behaviour)
+    speculative  a SpeculativeUploader sends settled windows while the
+                 recording is still being written
+
+Recordings up to segments.min_recording_seconds are analyzed whole and
+gain nothing; longer ones only have the last window or two left at stop.
+
+Run from the repository root:
+    python -m testscript.bench_speculative_upload --lengths 5 15 30 45
+"""
+import sys
+import os
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_input import AudioInput
+from config import Config, GeminiConfig, UploadConfig, CacheConfig, LimitsConfig
+from conversation_analyzer import ConversationAnalyzer
+from fake_gemini_server import FakeGeminiServer, FakeModel
+from speculative_upload import SpeculativeUploader
+from wav_writer import StreamingWavWriter
+
+RATE = 16000
+CHUNK = RATE // 10
+
+
+def speech_like(seconds, seed):
+    """Noise in 2 s bursts with 1 s pauses, as in bench_pipeline"""
+    samples = np.random.default_rng(seed).normal(0, 3000, RATE * seconds)
+    talking = (np.arange(len(samples)) // RATE) % 3 != 2
+    return (samples * talking).astype('<i2').tobytes()
+
+
+def record(path, pcm, speedup, uploader=None):
+    """Write `pcm` in 100 ms chunks at `speedup` times real time"""
+    start = time.perf_counter()
+    with StreamingWavWriter(path, rate=RATE) as writer:
+        if uploader:
+            uploader.start()
+        for i, offset in enumerate(range(0, len(pcm), CHUNK * 2)):
+            writer.write(pcm[offset:offset + CHUNK * 2])
+            delay = start + (i + 1) * 0.1 / speedup - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def run(server, workdir, minutes, speculative, speedup):
+    name = f"{minutes}min_{'speculative' if speculative else 'stop'}"
+    config = Config(
+        gemini=GeminiConfig("offline", "gemini-2.0-flash", 0.2, 0.95, 40, 8192, base_url=server.base_url),
+        upload=UploadConfig(base_url=server.base_url, registry_path=os.path.join(workdir, f"uploads_{name}.json")),
+        cache=CacheConfig(enabled=False),
+        limits=LimitsConfig(requests_per_minute=6000, burst=64, max_concurrent_requests=16)
+    )
+    analyzer = ConversationAnalyzer(config)
+    analyzer.warm_up()
+    path = os.path.join(workdir, f"recording_{name}.wav")
+    uploader = SpeculativeUploader(analyzer, path, poll_seconds=15 / speedup) if speculative else None
+
+    record(path, speech_like(minutes * 60, minutes), speedup, uploader)
+    stopped = time.perf_counter()
+    ahead = uploader.finish() if uploader else None
+    analysis = analyzer.analyze_audio(AudioInput.from_file(path), use_cache=False)
+    seconds = time.perf_counter() - stopped
+    analyzer.close()
+    os.remove(path)
+    if not analysis:
+        raise RuntimeError(f"Analysis of {name} failed")
+
+    windows = analysis['audio_processing'].get('windows', [analysis['audio_processing']])
+    sent = sum(window['encoded_bytes'] for window in windows if not window.get('upload_reused'))
+    return {'seconds': seconds, 'windows': len(windows), 'ahead': ahead['windows'] if ahead else 0,
+            'sent_mb': sent / 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speculative upload benchmark")
+    parser.add_argument('--lengths', type=int, nargs='+', default=[5, 15, 30, 45], help="recording minutes")
+    parser.add_argument('--speedup', type=float, default=30.0, help="recording pace, times real time")
+    parser.add_argument('--uplink-mb', type=float, default=2.0, help="simulated uplink, MB/s")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    model = FakeModel(first_token_seconds=0.3, tokens_per_second=1000)
+    results = []
+    with FakeGeminiServer(model=model, uplink_bytes_per_second=args.uplink_mb * 1e6) as server:
+        for minutes in args.lengths:
+            print(f"Running {minutes} min...")
+            baseline = run(server, workdir, minutes, False, args.speedup)
+            speculative = run(server, workdir, minutes, True, args.speedup)
+            results.append((minutes, baseline, speculative))
+
+    print(f"\n{'minutes':<9}{'windows':>8}{'ahead':>7}{'at stop':>10}{'speculative':>13}{'saved':>9}"
+          f"{'sent at stop MB':>18}")
+    for minutes, baseline, speculative in results:
+        saved = baseline['seconds'] - speculative['seconds']
+        print(f"{minutes:<9}{speculative['windows']:>8}{speculative['ahead']:>7}{baseline['seconds']:>9.1f}s"
+              f"{speculative['seconds']:>12.1f}s{saved:>8.1f}s"
+              f"{baseline['sent_mb']:>9.1f} -> {speculative['sent_mb']:.1f}")
+
+
+if __name__ == '__main__':
+    main()
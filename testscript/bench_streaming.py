@@ -0,0 +1,101 @@
+"""Benchmark: time to first transcript line vs. time to full result
+
+Replays a synthetic consultation reply through ConversationAnalyzer with a
+stand-in model that streams it at a steady token rate, once buffered
+(pipeline.stream off: lines appear only when the transcription reply has
+been fully generated and parsed) and once streamed through the
+incremental parser. The canned Q&A reply is built from QA_SCHEMA, so
+every section validates and is pushed as soon as it closes.
+
+Run from the repository root:
+    python -m testscript.bench_streaming
+"""
+import sys
+import os
+import asyncio
+import json
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis_schema import QA_SCHEMA
+from config import Config, GeminiConfig, CacheConfig, PipelineConfig
+from conversation_analyzer import ConversationAnalyzer
+from wav_writer import wav_bytes
+
+# Roughly what the API streams: ~4 characters per token
+CHARS_PER_CHUNK = 120
+CHUNK_SECONDS = 0.3
+ENTRIES = 60
+
+
+def schema_reply(schema, name="reply"):
+    """A value with every required field of `schema` filled in, so it validates without repair calls"""
+    if schema['type'] == 'object':
+        return {key: schema_reply(schema['properties'][key], key) for key in schema['required']}
+    return f"Canned {name.replace('_', ' ')} for the lower back pain consultation."
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+        self.parts = [text]
+
+
+class StreamingModel:
+    """Stands in for GenerativeModel, replaying canned replies at a fixed rate"""
+
+    def __init__(self):
+        lines = [{"speaker": "Doctor" if i % 2 == 0 else "Patient",
+                  "text": f"Statement number {i} about the lower back pain and how it affects sleep."}
+                 for i in range(ENTRIES)]
+        self.transcript_reply = "```json\n" + json.dumps({"transcript": lines}, indent=2) + "\n```"
+        self.qa_reply = "```json\n" + json.dumps(schema_reply(QA_SCHEMA), indent=2) + "\n```"
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False):
+        reply = self.qa_reply if len(contents) == 1 else self.transcript_reply
+        chunks = [reply[i:i + CHARS_PER_CHUNK] for i in range(0, len(reply), CHARS_PER_CHUNK)]
+        if not stream:
+            await asyncio.sleep(CHUNK_SECONDS * len(chunks))
+            return Chunk(reply)
+        return self._stream(chunks)
+
+    async def _stream(self, chunks):
+        for text in chunks:
+            await asyncio.sleep(CHUNK_SECONDS)
+            yield Chunk(text)
+
+
+def run(stream):
+    config = Config(
+        gemini=GeminiConfig("offline", "gemini-2.0-flash", 0.2, 0.95, 40, 8192),
+        cache=CacheConfig(enabled=False),
+        pipeline=PipelineConfig(two_stage=True, stream=stream)
+    )
+    analyzer = ConversationAnalyzer(config)
+    analyzer.model = StreamingModel()
+    noise = np.random.default_rng(0).normal(0, 3000, 16000 * 5).astype('<i2').tobytes()
+
+    start = time.perf_counter()
+    first = {}
+
+    def on_partial(kind, data):
+        first.setdefault(kind, time.perf_counter() - start)
+
+    analysis = analyzer.analyze_audio(wav_bytes(noise, 16000), on_partial=on_partial)
+    assert analysis and not analysis['validation']['invalid'], "canned Q&A reply failed validation"
+    total = time.perf_counter() - start
+    # Buffered runs show everything at once, when the full result arrives
+    return first.get('transcript_entry', total), first.get('qa_section', total), total
+
+
+def main():
+    print(f"{'mode':<10}{'first line':>12}{'first Q&A':>12}{'full result':>14}")
+    for label, stream in (("buffered", False), ("streamed", True)):
+        first_line, first_section, total = run(stream)
+        print(f"{label:<10}{first_line:>11.2f}s{first_section:>11.2f}s{total:>13.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,3 @@
-import queue
 import re
 import sys
 from google.cloud.speech_v2 import SpeechClient
@@ -12,10 +11,13 @@ import wave
 from datetime import datetime
 import keyboard  # 添加这个导入
 from conversation_analyzer import ConversationAnalyzer
+from audio_level import measure_level
+from capture_buffer import CaptureBuffer
 
 # Audio recording parameters
 RATE = 16000
 CHUNK = int(RATE / 10)  # 100ms
+BUFFER_SECONDS = 30  # 环形缓冲区保留的音频时长
 
 @dataclass
 class GCPConfig:
@@ -32,7 +34,7 @@ class MicrophoneStream:
     def __init__(self, rate=RATE, chunk=CHUNK):
         self._rate = rate
         self._chunk = chunk
-        self._buff = queue.Queue()
+        self._capture = CaptureBuffer(chunk * 2, max(2, int(BUFFER_SECONDS * rate / chunk)))
         self.closed = True
         self._audio_interface = None
         self.paused = False
@@ -60,17 +62,13 @@ class MicrophoneStream:
         self._audio_stream.stop_stream()
         self._audio_stream.close()
         self.closed = True
-        self._buff.put(None)
+        self._capture.close()
         self._audio_interface.terminate()
 
     def _fill_buffer(self, in_data, frame_count, time_info, status_flags):
         """音频数据回调"""
         if not self.paused:
-            # 只计算音频电平，不输出
-            audio_level = max(abs(int.from_bytes(in_data[i:i+2], byteorder='little', signed=True)) 
-                            for i in range(0, len(in_data), 2))
-            
-            self._buff.put(in_data)
+            self._capture.write(in_data)
             self.recording_data.append(in_data)  # 保存录音数据
             
         return None, pyaudio.paContinue
@@ -104,25 +102,14 @@ class MicrophoneStream:
 
     def generator(self):
         """生成音频数据流"""
-        while not self.closed:
-            chunk = self._buff.get()
-            if chunk is None:
+        # 积压的连续音频块作为一个 memoryview 返回，无需 join；下一次 read 前有效
+        reader = self._capture.reader()
+        while True:
+            audio_data = reader.read(max_chunks=self._capture.slots)
+            if audio_data is None:
                 return
-            
-            if not self.paused:
-                data = [chunk]
-                while True:
-                    try:
-                        chunk = self._buff.get(block=False)
-                        if chunk is None:
-                            return
-                        data.append(chunk)
-                    except queue.Empty:
-                        break
-
-                audio_data = b"".join(data)
-                if len(audio_data) > 0:
-                    yield audio_data
+            if len(audio_data) > 0:
+                yield audio_data
 
 class SpeechToText:
     def __init__(self, config: GCPConfig):
@@ -199,9 +186,8 @@ class SpeechToText:
                 # Only process audio levels for visualization
                 for content in audio_generator:
                     if on_audio_level:
-                        audio_level = max(abs(int.from_bytes(content[i:i+2], byteorder='little', signed=True)) 
-                                        for i in range(0, len(content), 2))
-                        on_audio_level(audio_level)
+                        # content may join several buffered chunks; meter what is yielded
+                        on_audio_level(measure_level(content))
                     
         except KeyboardInterrupt:
             pass
@@ -0,0 +1,135 @@
+"""Test: capture reader views survive the writer lapping the ring
+
+Every chunk written is stamped with its sequence number, so a reader can
+tell which chunk it got and whether its bytes are intact. A NEVER_DROP
+reader takes a multi-chunk view, holds it while the writer wraps the ring
+twice, and should find it unchanged and then read every later chunk from
+the ring or its spill. Stalled readers of both policies must account for
+every chunk the writer overwrote as spilled or dropped, and with a writer
+thread lapping consumers that hold each view for a while, a NEVER_DROP
+reader still gets every chunk intact and a DROP_OLDEST reader gets intact
+chunks in order plus a dropped count for the rest.
+
+Run from the repository root:
+    python -m testscript.test_capture_buffer
+"""
+import sys
+import os
+import random
+import struct
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from capture_buffer import CaptureBuffer, DROP_OLDEST, NEVER_DROP
+
+SLOT_SIZE = 64
+SLOTS = 8
+WRITES = 20000
+
+
+def chunk(seq):
+    """A full slot of the sequence number, repeated"""
+    return struct.pack('<I', seq) * (SLOT_SIZE // 4)
+
+
+def chunks(view):
+    """Sequence numbers of the chunks in a view, checking each is intact"""
+    data = bytes(view)
+    seqs = []
+    for offset in range(0, len(data), SLOT_SIZE):
+        block = data[offset:offset + SLOT_SIZE]
+        seq = struct.unpack_from('<I', block)[0]
+        assert block == chunk(seq), f"chunk {seq} was overwritten"
+        seqs.append(seq)
+    return seqs
+
+
+def held_view():
+    buffer = CaptureBuffer(SLOT_SIZE, SLOTS)
+    reader = buffer.reader(name='recording', policy=NEVER_DROP)
+    for seq in range(4):
+        buffer.write(chunk(seq))
+    view = reader.read(max_chunks=64)
+    held = bytes(view)
+    assert chunks(view) == [0, 1, 2, 3]
+
+    # The consumer is still using the view while the writer laps it twice
+    for seq in range(4, 4 + 2 * SLOTS):
+        buffer.write(chunk(seq))
+    assert bytes(view) == held, "a held view changed under the consumer"
+
+    buffer.close()
+    seqs = [seq for view in reader for seq in chunks(view)]
+    assert seqs == list(range(4, 4 + 2 * SLOTS)), f"chunks lost after the held view: {seqs}"
+    print(f"Held view: intact after {2 * SLOTS} writes; {reader.stats()}")
+
+
+def stalled():
+    buffer = CaptureBuffer(SLOT_SIZE, SLOTS)
+    keep = buffer.reader(name='recording', policy=NEVER_DROP)
+    meter = buffer.reader(name='meter', policy=DROP_OLDEST, capacity=3)
+    written = 3 * SLOTS
+    for seq in range(written):
+        buffer.write(chunk(seq))
+    buffer.close()
+
+    # Everything that left the readable window was spilled before its slot was reused
+    assert keep.spilled == written - (SLOTS - 1), f"spilled {keep.spilled} of {written - (SLOTS - 1)}"
+    seqs = [seq for view in keep for seq in chunks(view)]
+    assert seqs == list(range(written)) and keep.dropped == 0, "NEVER_DROP reader lost chunks"
+
+    seqs = [seq for view in meter for seq in chunks(view)]
+    assert seqs == list(range(written - 3, written)), f"DROP_OLDEST reader got {seqs}"
+    assert len(seqs) + meter.dropped == written, "dropped chunks not counted"
+    print(f"Stalled: recording {keep.stats()}, meter {meter.stats()}")
+
+
+def concurrent(policy):
+    """A writer thread laps a consumer that holds each multi-chunk view for a while"""
+    buffer = CaptureBuffer(SLOT_SIZE, SLOTS)
+    reader = buffer.reader(name=policy, policy=policy)
+    rng = random.Random(0)
+
+    def write():
+        for seq in range(WRITES):
+            buffer.write(chunk(seq))
+            if seq % SLOTS == 0:
+                time.sleep(0.001)
+        buffer.close()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    seqs = []
+    while True:
+        view = reader.read(max_chunks=64)
+        if view is None:
+            break
+        first = chunks(view)
+        if rng.random() < 0.1:
+            time.sleep(rng.random() * 0.005)
+        assert chunks(view) == first, "a held view changed under the consumer"
+        seqs.extend(first)
+    writer.join()
+
+    assert seqs == sorted(set(seqs)), "chunks out of order or repeated"
+    assert len(seqs) + reader.dropped == WRITES, \
+        f"{len(seqs)} read + {reader.dropped} dropped != {WRITES} written"
+    if policy == NEVER_DROP:
+        assert seqs == list(range(WRITES)), "NEVER_DROP reader lost chunks"
+    print(f"Concurrent {policy}: {len(seqs)} read, {reader.stats()}")
+    return reader
+
+
+def main():
+    held_view()
+    stalled()
+    keep = concurrent(NEVER_DROP)
+    assert keep.spilled > 0, "the writer never lapped the NEVER_DROP reader"
+    meter = concurrent(DROP_OLDEST)
+    assert meter.dropped > 0, "the writer never lapped the DROP_OLDEST reader"
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Offline check of the large-recording upload path
+
+Starts fake_gemini_server with injected chunk failures, forces a payload
+through the File API path of ConversationAnalyzer, and checks that the
+upload resumes, arrives intact and is reused on re-analysis.
+
+Run from the repository root:
+    python -m testscript.test_file_upload
+"""
+import sys
+import os
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config, GeminiConfig, UploadConfig, CacheConfig
+from conversation_analyzer import ConversationAnalyzer
+from fake_gemini_server import FakeGeminiServer
+
+RATE = 16000
+SECONDS = 120
+
+
+def main():
+    with FakeGeminiServer(fail_every=4, processing_seconds=1.5) as server:
+        workdir = tempfile.mkdtemp()
+        config = Config(
+            gemini=GeminiConfig("offline", "gemini-2.0-flash", 0.2, 0.95, 40, 8192),
+            upload=UploadConfig(codec="wav", inline_max_bytes=1024 * 1024, base_url=server.base_url,
+                                chunk_mb=1, registry_path=os.path.join(workdir, "uploads.json")),
+            cache=CacheConfig(enabled=False)
+        )
+        analyzer = ConversationAnalyzer(config)
+
+        noise = np.random.default_rng(0).normal(0, 3000, RATE * SECONDS)
+        pcm = noise.astype('<i2').tobytes()
+
+        for attempt in ("first analysis", "re-analysis"):
+            info = {}
+            start = time.perf_counter()
+            part = analyzer._audio_part(pcm, RATE, info)
+            elapsed = time.perf_counter() - start
+            print(f"{attempt}: {info['transport']} {info['file_name']} reused={info['upload_reused']} "
+                  f"in {elapsed:.2f}s -> {part['file_data']['file_uri']}")
+
+        stored = server.files[info['file_name']]['data']
+        assert stored[44:] == pcm, "uploaded audio differs from the payload"
+        assert info['upload_reused'], "re-analysis uploaded the recording again"
+        print(f"{server.chunk_requests} chunk requests, {server.failures_injected} failures injected and resumed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Test: RestModel reports dropped connections and timeouts as retryable errors
+
+Against fake_gemini_server:
+- a server that hangs up on every call surfaces as 503 ServiceUnavailable
+- a port with nothing listening surfaces the same way
+- a reply slower than the client timeout surfaces as 504 DeadlineExceeded
+- analyses complete when a third of the connections are dropped, with one
+  retry per dropped connection
+
+Run from the repository root:
+    python -m testscript.test_gemini_rest
+"""
+import sys
+import os
+import asyncio
+import socket
+
+from google.api_core import exceptions
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config, GeminiConfig, CacheConfig, LimitsConfig
+from conversation_analyzer import ConversationAnalyzer
+from fake_gemini_server import FakeGeminiServer, FakeModel
+from gemini_rest import RestModel
+from rate_limit import error_status, is_retryable
+
+TRANSCRIPT = [{"speaker": "Patient", "text": "My lower back hurts when I sit for long."}]
+
+
+def expect(error_type, model, stream=False):
+    async def call():
+        try:
+            response = await model.generate_content_async(["Hello"], stream=stream)
+            if stream:
+                async for _ in response:
+                    pass
+        except exceptions.GoogleAPICallError as e:
+            return e
+        finally:
+            await model.client.aclose()
+
+    error = asyncio.run(call())
+    assert isinstance(error, error_type), f"expected {error_type.__name__}, got {error!r}"
+    assert is_retryable(error), f"{error!r} would not be retried"
+    print(f"{error_type.__name__} ({error_status(error)}): {error.message}")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def main():
+    with FakeGeminiServer(model=FakeModel(drop_rate=1.0)) as server:
+        expect(exceptions.ServiceUnavailable, RestModel("offline", "gemini-2.0-flash", base_url=server.base_url))
+        expect(exceptions.ServiceUnavailable, RestModel("offline", "gemini-2.0-flash", base_url=server.base_url),
+               stream=True)
+    expect(exceptions.ServiceUnavailable,
+           RestModel("offline", "gemini-2.0-flash", base_url=f"http://127.0.0.1:{free_port()}"))
+    with FakeGeminiServer(model=FakeModel(first_token_seconds=2)) as server:
+        expect(exceptions.DeadlineExceeded,
+               RestModel("offline", "gemini-2.0-flash", base_url=server.base_url, timeout=0.5))
+
+    model = FakeModel(first_token_seconds=0.01, tokens_per_second=5000, drop_rate=0.3, seed=5)
+    with FakeGeminiServer(model=model) as server:
+        config = Config(
+            gemini=GeminiConfig("offline", "gemini-2.0-flash", 0.2, 0.95, 40, 8192, base_url=server.base_url),
+            cache=CacheConfig(enabled=False),
+            limits=LimitsConfig(requests_per_minute=6000, burst=64, backoff_base_seconds=0.05, max_attempts=10)
+        )
+        analyzer = ConversationAnalyzer(config)
+        results = [analyzer.analyze_transcript(TRANSCRIPT + [{"speaker": "Doctor", "text": f"Visit {i}."}],
+                                               use_cache=False)
+                   for i in range(10)]
+        analyzer.close()
+    retries = analyzer.limiter.retries
+    print(f"{sum(r is not None for r in results)}/10 analyses, {server.connections_dropped} connections "
+          f"dropped, {retries} retries")
+    assert all(results), "an analysis was lost to a dropped connection"
+    assert server.connections_dropped > 0
+    assert retries == server.connections_dropped, "every dropped connection should be retried once"
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Test: a stalled level meter costs the live transcript no audio
+
+Runs create_recorder's record loop with live transcription attached the
+way app.py does (a LiveTranscriber on its own recorder.reader()), over a
+simulated microphone that calls the recorder's audio callback with 44.1
+kHz stereo chunks 10x faster than real time. on_audio_level stalls for
+a few seconds, as a blocked Socket.IO emit would: the meter should drop
+chunks, while the transcriber still hears all of the audio and produces
+every segment, and the recording file is complete.
+
+Run from the repository root:
+    python -m testscript.test_live_capture
+"""
+import sys
+import os
+import tempfile
+import threading
+import time
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import audio_recorder
+from config import AudioConfig
+from live_transcription import LiveTranscriber, LocalRecognizer, transcript_path
+
+SECONDS = 60
+CAPTURE_RATE = 44100
+CHANNELS = 2
+CHUNK = CAPTURE_RATE // 10
+SPEEDUP = 10
+STALL_SECONDS = 3
+SECONDS_PER_LINE = 4
+
+
+class SimulatedMicrophone(audio_recorder.AudioRecorder):
+    """AudioRecorder whose input stream is a thread calling the audio callback"""
+
+    def open(self):
+        self.closed = False
+        self.paused = False
+        self.finished = threading.Event()
+        threading.Thread(target=self._capture_audio, daemon=True).start()
+        return self
+
+    def _capture_audio(self):
+        time.sleep(0.2)  # let the record loop start the recording first
+        samples = np.random.default_rng(0).normal(0, 3000, (CAPTURE_RATE * SECONDS, CHANNELS))
+        pcm = samples.astype('<i2').tobytes()
+        frame = CHUNK * CHANNELS * 2
+        for offset in range(0, len(pcm), frame):
+            self._fill_buffer(pcm[offset:offset + frame], CHUNK, None, 0)
+            time.sleep(0.1 / SPEEDUP)
+        self.finished.set()
+
+
+def main():
+    # create_recorder starts the recording in the working directory
+    os.chdir(tempfile.mkdtemp())
+    audio_recorder.AudioRecorder = SimulatedMicrophone
+    audio_config = AudioConfig(sample_rate=CAPTURE_RATE, channels=CHANNELS, buffer_seconds=30,
+                               meter_backlog_seconds=1.0)
+    live = LiveTranscriber(LocalRecognizer(seconds_per_line=SECONDS_PER_LINE), rate=CAPTURE_RATE,
+                           channels=CHANNELS)
+    levels = []
+
+    def on_audio_level(level):
+        levels.append(level)
+        if len(levels) == 20:
+            # The emit blocks, e.g. on a slow client
+            time.sleep(STALL_SECONDS)
+
+    def on_start(filename):
+        live.start(transcript_path(filename), source=recorder.reader('live'))
+
+    recorder, record_func = audio_recorder.create_recorder(
+        on_audio_level=on_audio_level, audio_config=audio_config, on_start=on_start)
+    thread = threading.Thread(target=record_func)
+    thread.start()
+    while not hasattr(recorder, 'finished'):
+        time.sleep(0.01)
+    recorder.finished.wait()
+
+    filename = recorder.stop()
+    recorder.close()
+    thread.join()
+    transcript = live.close(10)
+
+    stats = recorder.stats()
+    with wave.open(filename, 'rb') as wav:
+        recorded = wav.getnframes() / wav.getframerate()
+    meter, listener = stats['readers']['meter'], stats['readers']['live']
+    print(f"Meter: {len(levels)} levels, {meter['dropped']} chunks dropped")
+    print(f"Live reader: {listener}; transcriber {live.stats()}")
+    print(f"Recording: {recorded:.2f}s; transcript {len(transcript)} lines")
+
+    assert meter['dropped'] > 0, "the stalled meter should have dropped chunks"
+    assert listener['dropped'] == 0, "the live reader lost audio"
+    assert abs(live.audio_seconds - SECONDS) < 0.5, f"transcribed {live.audio_seconds}s of {SECONDS}s"
+    assert abs(recorded - SECONDS) < 0.5, f"recorded {recorded}s of {SECONDS}s"
+    assert len(transcript) == SECONDS // SECONDS_PER_LINE, f"expected {SECONDS // SECONDS_PER_LINE} lines"
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Test: live transcription during a recording, with the local recognizer
+
+Feeds a 44.1 kHz stereo recording chunk by chunk (10x faster than real
+time) into a LiveTranscriber running the LocalRecognizer, with realtime
+Q&A ticking against fake_gemini_server. Checks that interim and final
+segments arrive while "recording", that finals are persisted to the
+transcript JSONL, and compares stop-to-result time of the Q&A/summary
+pass on the live transcript with analyzing the whole recording as audio.
+Then a recognizer that is still working on the tail when stop's timeout
+runs out must leave the transcript marked incomplete.
+
+Run from the repository root:
+    python -m testscript.test_live_transcription
+"""
+import sys
+import os
+import json
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_input import AudioInput
+from config import Config, GeminiConfig, UploadConfig, CacheConfig, LimitsConfig
+from conversation_analyzer import ConversationAnalyzer
+from fake_gemini_server import FakeGeminiServer, FakeModel
+from live_transcription import LiveTranscriber, LocalRecognizer, transcript_path
+from realtime_qa import RealtimeQAEngine
+from resampler import StreamingResampler
+from wav_writer import StreamingWavWriter
+
+SECONDS = 60
+CAPTURE_RATE = 44100
+CHANNELS = 2
+CHUNK = CAPTURE_RATE // 10
+SPEEDUP = 10
+TAIL_SECONDS = 2
+
+
+class SlowTailRecognizer(LocalRecognizer):
+    """LocalRecognizer that takes TAIL_SECONDS to finish once the audio ends"""
+
+    def stream(self, chunks):
+        for segment in super().stream(chunks):
+            if segment.is_final and segment.confidence == 0.6:
+                # The line in progress at stop
+                time.sleep(TAIL_SECONDS)
+            yield segment
+
+
+def slow_tail():
+    live = LiveTranscriber(SlowTailRecognizer(seconds_per_line=4.0)).start()
+    for _ in range(int(10.5 * 10)):
+        live.feed(bytes(16000 // 10 * 2))
+    transcript = live.close(TAIL_SECONDS / 4)
+    stats = live.stats()
+    print(f"Slow tail: {len(transcript)} lines after the timeout, {stats}")
+    assert not live.complete, "a transcript missing its tail was reported complete"
+    assert len(transcript) == 2, "expected only the lines finished before stop"
+    live.close(TAIL_SECONDS * 2)
+    assert live.complete and len(live.transcript()) == 3
+
+
+def main():
+    workdir = tempfile.mkdtemp()
+    recording = os.path.join(workdir, "recording_live_test.wav")
+    model = FakeModel(first_token_seconds=0.05, tokens_per_second=2000)
+    with FakeGeminiServer(model=model) as server:
+        config = Config(
+            gemini=GeminiConfig("offline", "gemini-2.0-flash", 0.2, 0.95, 40, 8192, base_url=server.base_url),
+            upload=UploadConfig(base_url=server.base_url, registry_path=os.path.join(workdir, "uploads.json")),
+            cache=CacheConfig(enabled=False),
+            limits=LimitsConfig(requests_per_minute=6000, burst=64)
+        )
+        analyzer = ConversationAnalyzer(config)
+        analyzer.warm_up()
+
+        received = []
+        qa_updates = []
+        engine = RealtimeQAEngine(analyzer, interval_seconds=1,
+                                  on_update=lambda changes, snapshot: qa_updates.append(changes))
+        live = LiveTranscriber(
+            LocalRecognizer(seconds_per_line=4.0),
+            rate=CAPTURE_RATE,
+            channels=CHANNELS,
+            on_segment=received.append,
+            qa_engine=engine
+        ).start(transcript_path(recording))
+        engine.start()
+
+        # "Record": stereo noise, also written out at 16 kHz mono as the recorder does
+        samples = np.random.default_rng(0).normal(0, 3000, (CAPTURE_RATE * SECONDS, CHANNELS))
+        pcm = samples.astype('<i2').tobytes()
+        frame = CHUNK * CHANNELS * 2
+        with StreamingWavWriter(recording, rate=16000) as writer:
+            resampler = StreamingResampler(CAPTURE_RATE, 16000, CHANNELS)
+            for offset in range(0, len(pcm), frame):
+                chunk = memoryview(pcm)[offset:offset + frame]
+                live.feed(chunk)
+                writer.write(resampler.process(chunk))
+                time.sleep(0.1 / SPEEDUP)
+            writer.write(resampler.flush())
+        during = len(received)
+
+        stopped = time.perf_counter()
+        transcript = live.close(10)
+        engine.stop()
+        extraction = analyzer.analyze_transcript(transcript, use_cache=False)
+        live_seconds = time.perf_counter() - stopped
+
+        stopped = time.perf_counter()
+        analysis = analyzer.analyze_audio(AudioInput.from_file(recording), use_cache=False)
+        audio_seconds = time.perf_counter() - stopped
+        analyzer.close()
+
+    finals = [segment for segment in received if segment.is_final]
+    interim = [segment for segment in received if not segment.is_final]
+    with open(transcript_path(recording), 'r', encoding='utf-8') as f:
+        persisted = [json.loads(line) for line in f if line.strip()]
+    stats = live.stats()
+    print(f"Segments: {len(finals)} final, {len(interim)} interim; {during} arrived before stop")
+    print(f"Persisted: {len(persisted)} lines in {os.path.basename(transcript_path(recording))}")
+    print(f"Live stats: {stats}")
+    print(f"Realtime QA: {engine.stats()} ({len(qa_updates)} updates published)")
+    print(f"Stop-to-result: live transcript {live_seconds * 1000:.0f} ms, "
+          f"whole-recording analysis {audio_seconds * 1000:.0f} ms")
+
+    assert during >= len(received) - 2, "segments should arrive while recording, not at stop"
+    assert len(finals) == SECONDS // 4, f"expected {SECONDS // 4} final segments, got {len(finals)}"
+    assert interim, "no interim segments"
+    assert [p['text'] for p in persisted] == [s.text for s in finals], "persisted transcript differs"
+    assert abs(stats['audio_seconds'] - SECONDS) < 0.5, f"resampled {stats['audio_seconds']}s of {SECONDS}s"
+    assert extraction and extraction['qa_analysis'], "Q&A on the live transcript failed"
+    assert analysis, "audio analysis failed"
+
+    slow_tail()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Test: model call metrics against the local Gemini stand-in
+
+Analyzes a few recordings through fake_gemini_server with some replies
+cut off, then checks that the /metrics text agrees with the per-analysis
+call totals under pipeline.calls: one latency, token and payload
+observation per model call, tokens taken from usage_metadata, and parse
+failures counted. Also writes a consultation log line.
+
+Run from the repository root:
+    python -m testscript.test_metrics
+"""
+import sys
+import os
+import json
+import re
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_input import AudioInput
+from config import Config, GeminiConfig, UploadConfig, CacheConfig, LimitsConfig
+from conversation_analyzer import ConversationAnalyzer
+from fake_gemini_server import FakeGeminiServer, FakeModel
+from metrics import REGISTRY, ConsultationLog
+from wav_writer import wav_bytes
+
+RATE = 16000
+RECORDINGS = 4
+
+
+def sample(text, name, **labels):
+    """Sum of a metric's samples in the rendered text that carry `labels`"""
+    total = 0.0
+    for line in text.splitlines():
+        match = re.fullmatch(rf'{name}(?:\{{(.*)\}})? (\S+)', line)
+        if not match:
+            continue
+        found = dict(re.findall(r'(\w+)="([^"]*)"', match.group(1) or ''))
+        if all(found.get(key) == value for key, value in labels.items()):
+            total += float(match.group(2))
+    return total
+
+
+def main():
+    workdir = tempfile.mkdtemp()
+    model = FakeModel(first_token_seconds=0.02, tokens_per_second=5000, malformed_rate=0.3, seed=7)
+    with FakeGeminiServer(model=model) as server:
+        config = Config(
+            gemini=GeminiConfig("offline", "gemini-2.0-flash", 0.2, 0.95, 40, 8192, base_url=server.base_url),
+            upload=UploadConfig(base_url=server.base_url, registry_path=os.path.join(workdir, "uploads.json")),
+            cache=CacheConfig(enabled=False),
+            limits=LimitsConfig(requests_per_minute=6000, burst=64)
+        )
+        analyzer = ConversationAnalyzer(config)
+        totals = {}
+        for i in range(RECORDINGS):
+            # Noise in 2 s bursts, so VAD keeps most of it
+            samples = np.random.default_rng(i).normal(0, 3000, RATE * 60)
+            pcm = (samples * ((np.arange(len(samples)) // RATE) % 3 != 2)).astype('<i2').tobytes()
+            analysis = analyzer.analyze_audio(AudioInput.from_wav(wav_bytes(pcm, RATE)), use_cache=False)
+            assert analysis, f"analysis {i} failed"
+            for name, value in analysis['pipeline']['calls'].items():
+                totals[name] = totals.get(name, 0) + value
+        analyzer.close()
+
+    text = REGISTRY.render()
+    calls = sample(text, 'gemini_call_seconds_count', outcome='ok')
+    input_tokens = sample(text, 'gemini_input_tokens_sum')
+    output_tokens = sample(text, 'gemini_output_tokens_sum')
+    request_bytes = sample(text, 'gemini_request_bytes_sum')
+    parse_failures = sample(text, 'gemini_parse_failures_total')
+    print(f"Calls: {calls:.0f} (pipeline totals {totals['requests']}), "
+          f"parse failures {parse_failures:.0f} ({totals['parse_failures']})")
+    print(f"Tokens: {input_tokens:.0f} in, {output_tokens:.0f} out; request bytes {request_bytes:.0f}")
+    print(f"Audio seconds observed: {sample(text, 'analysis_audio_seconds_sum'):.0f}")
+
+    assert calls == totals['requests'], "a model call was not observed"
+    assert input_tokens == totals['input_tokens'] > 0, "prompt tokens from usage_metadata missing"
+    assert output_tokens == totals['output_tokens'] > 0, "reply tokens from usage_metadata missing"
+    assert request_bytes == totals['request_bytes'] > RECORDINGS * RATE, "inline audio not counted"
+    assert parse_failures == totals['parse_failures'] > 0, "cut-off replies not counted"
+    assert sample(text, 'analysis_audio_seconds_count') == RECORDINGS
+    assert sample(text, 'analysis_seconds_bucket', input='audio', outcome='ok', le='+Inf') == RECORDINGS
+
+    log_path = os.path.join(workdir, "logs", "consultations.jsonl")
+    ConsultationLog(log_path).write({'event': 'consultation', 'calls': totals})
+    with open(log_path, 'r', encoding='utf-8') as f:
+        record = json.loads(f.readline())
+    assert record['calls']['requests'] == totals['requests'] and 'time' in record
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
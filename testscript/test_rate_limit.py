@@ -0,0 +1,118 @@
+"""Offline check of concurrent analyses against a rate-limited model
+
+Runs a burst of transcript analyses through one ConversationAnalyzer whose
+model stands in for an API with a fixed per-minute quota: requests over the
+quota fail with 429 and a retry delay, and every tenth request fails with a
+503. All analyses should still complete with every section valid, each
+429 and 503 should be retried exactly once, and the token bucket should
+settle near the quota instead of hammering it.
+
+Run from the repository root:
+    python -m testscript.test_rate_limit
+"""
+import sys
+import os
+import asyncio
+import json
+import time
+from collections import deque
+from dataclasses import fields
+
+from google.api_core import exceptions
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis_schema import QA_SECTIONS, Summary
+from config import Config, GeminiConfig, CacheConfig, LimitsConfig, PipelineConfig
+from conversation_analyzer import ConversationAnalyzer
+
+# Scaled down so the run takes seconds: the quota window is 6s instead of 60s
+QUOTA = 10
+WINDOW_SECONDS = 6
+ANALYSES = 24
+LATENCY = 0.2
+
+
+class Reply:
+    def __init__(self, text):
+        self.text = text
+        self.parts = [text]
+
+
+class QuotaModel:
+    """Stands in for GenerativeModel with a sliding-window request quota"""
+
+    def __init__(self):
+        self.sent = deque()
+        self.calls = 0
+        self.rejected = 0
+        self.overloaded = 0
+        # Every section complete, so no repair calls mix into the request counts
+        self.reply = json.dumps({
+            "qa_analysis": {name: {f.name: f"Noted {f.name}." for f in fields(model)}
+                            for name, model in QA_SECTIONS.items()},
+            "summary": {f.name: f"Noted {f.name}." for f in fields(Summary)}
+        })
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False):
+        self.calls += 1
+        now = time.monotonic()
+        while self.sent and now - self.sent[0] > WINDOW_SECONDS:
+            self.sent.popleft()
+        if len(self.sent) >= QUOTA:
+            self.rejected += 1
+            wait = WINDOW_SECONDS - (now - self.sent[0])
+            raise exceptions.ResourceExhausted(f"Quota exceeded. Please retry in {wait:.2f}s.")
+        self.sent.append(now)
+        await asyncio.sleep(LATENCY)
+        if self.calls % 10 == 0:
+            self.overloaded += 1
+            raise exceptions.ServiceUnavailable("The model is overloaded.")
+        return Reply(self.reply)
+
+
+async def run(analyzer):
+    transcript = [{"speaker": "Patient", "text": "My lower back hurts when I sit for long."}]
+    return await asyncio.gather(*(
+        analyzer.analyze_transcript_async(transcript + [{"speaker": "Doctor", "text": f"Visit {i}."}],
+                                          use_cache=False)
+        for i in range(ANALYSES)
+    ))
+
+
+def main():
+    config = Config(
+        gemini=GeminiConfig("offline", "gemini-2.0-flash", 0.2, 0.95, 40, 8192),
+        cache=CacheConfig(enabled=False),
+        pipeline=PipelineConfig(repair_attempts=0),
+        limits=LimitsConfig(max_concurrent_requests=8, requests_per_minute=QUOTA * 60 / WINDOW_SECONDS * 2,
+                            burst=4, min_requests_per_minute=30, backoff_base_seconds=0.2,
+                            backoff_max_seconds=5, max_attempts=8, deadline_seconds=120)
+    )
+    analyzer = ConversationAnalyzer(config)
+    model = analyzer.model = QuotaModel()
+
+    start = time.perf_counter()
+    results = asyncio.run(run(analyzer))
+    elapsed = time.perf_counter() - start
+    completed = sum(1 for result in results if result is not None)
+    limiter = analyzer.limiter
+    print(f"{completed}/{ANALYSES} analyses in {elapsed:.1f}s: {model.calls} requests, "
+          f"{model.rejected} rejected with 429, {model.overloaded} with 503; limiter {limiter.stats()}")
+    assert completed == ANALYSES, "analyses were lost to rate limiting"
+    assert all(result['validation']['invalid'] == [] for result in results), "sections failed validation"
+    assert all(result['validation']['repair_calls'] == 0 for result in results)
+
+    # Requests above the quota were made, but the bucket backed off rather than keep hitting it
+    assert 0 < model.rejected < ANALYSES, f"unexpected 429 count {model.rejected}"
+    assert limiter.bucket.rate_limited == model.rejected, "a 429 did not reach the token bucket"
+    # Each failure is retried once and nothing else is
+    assert limiter.retries == model.rejected + model.overloaded
+    assert model.calls == ANALYSES + limiter.retries
+
+    # The blocking wrapper shares the same loop and limits
+    assert analyzer.analyze_transcript([{"speaker": "Patient", "text": "Still sore."}], use_cache=False) is not None
+    analyzer.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""Test: one trace per consultation across threads and the analyzer loop
+
+Replays what the web app does for one consultation against
+fake_gemini_server: the trace starts with the recording, stop_recording
+runs on a handler thread, the analysis on a worker thread (and from there
+on the analyzer's event loop and its upload threads), and the emit closes
+the trace. Checks that every stage lands in the same trace, correctly
+nested, in the JSON-lines export, the slow-trace log and, with the OTLP
+exporter, in the payload a local collector receives.
+
+Run from the repository root:
+    python -m testscript.test_tracing
+"""
+import sys
+import os
+import json
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import tracing
+from audio_input import AudioInput
+from config import Config, GeminiConfig, UploadConfig, CacheConfig, LimitsConfig, TracingConfig
+from conversation_analyzer import ConversationAnalyzer
+from fake_gemini_server import FakeGeminiServer, FakeModel
+from wav_writer import wav_bytes
+
+RATE = 16000
+# Past segments.min_recording_seconds, so the recording is analyzed in windows
+SECONDS = 660
+STAGES = {'stop_recording', 'recorder.stop', 'queue_wait', 'analysis_job', 'read', 'analyze_audio', 'normalize',
+          'transcription', 'window', 'vad', 'encode', 'upload', 'model_call', 'request.encode', 'parse',
+          'extraction', 'save_consultation', 'emit'}
+
+
+class Collector(BaseHTTPRequestHandler):
+    """Minimal OTLP/HTTP receiver: keeps every /v1/traces body"""
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.path == '/v1/traces':
+            Collector.received.append(json.loads(body))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, format, *args):
+        pass
+
+
+def consultation(analyzer, path):
+    """The web app's sequence of stages, on the threads it uses"""
+    trace = tracing.start_trace('consultation', sid='test')
+    with tracing.activate(trace), tracing.span('recording'):
+        time.sleep(0.05)
+    with tracing.activate(trace), tracing.span('stop_recording'):
+        with tracing.span('recorder.stop'):
+            time.sleep(0.01)
+    submitted = time.time()
+
+    def worker():
+        with tracing.activate(trace):
+            tracing.record('queue_wait', submitted, time.time())
+            with tracing.span('analysis_job', job_id='job'):
+                with tracing.span('read'):
+                    audio = AudioInput.from_file(path)
+                result['analysis'] = analyzer.analyze_audio(audio, use_cache=False)
+                with tracing.span('save_consultation'):
+                    time.sleep(0.01)
+        with tracing.activate(trace), tracing.span('emit', event='audio_analysis'):
+            time.sleep(0.01)
+        result['record'] = tracing.finish(trace)
+
+    result = {}
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    assert result['analysis'], "analysis failed"
+    return result['record']
+
+
+def check(record):
+    spans = record['spans']
+    by_id = {span['span_id']: span for span in spans}
+    names = {span['name'] for span in spans}
+    missing = STAGES - names
+    assert not missing, f"stages without a span: {missing}"
+    roots = [span for span in spans if span['parent_id'] is None]
+    assert len(roots) == 1 and roots[0]['name'] == 'consultation', "expected a single root"
+    assert all(span['parent_id'] in by_id for span in spans if span['parent_id']), "dangling parent"
+    assert all(span['end_ns'] for span in spans), "unfinished span"
+
+    def ancestors(span):
+        names = []
+        while span['parent_id']:
+            span = by_id[span['parent_id']]
+            names.append(span['name'])
+        return names
+
+    for span in spans:
+        if span['name'] == 'window':
+            assert 'transcription' in ancestors(span), "window outside the transcription stage"
+        if span['name'] in ('encode', 'upload'):
+            assert 'analysis_job' in ancestors(span), f"{span['name']} lost its trace on the upload thread"
+        if span['name'] == 'model_call':
+            assert span['attributes']['input_tokens'] > 0, "model call without token counts"
+    windows = [span for span in spans if span['name'] == 'window']
+    assert 0 < record['latency_seconds'] < record['seconds']
+    return len(spans), len(windows)
+
+
+def main():
+    workdir = tempfile.mkdtemp()
+    samples = np.random.default_rng(1).normal(0, 3000, RATE * SECONDS)
+    pcm = (samples * ((np.arange(len(samples)) // RATE) % 3 != 2)).astype('<i2').tobytes()
+    path = os.path.join(workdir, "recording.wav")
+    with open(path, 'wb') as f:
+        f.write(wav_bytes(pcm, RATE))
+
+    collector = ThreadingHTTPServer(('127.0.0.1', 0), Collector)
+    threading.Thread(target=collector.serve_forever, daemon=True).start()
+    endpoint = f"http://127.0.0.1:{collector.server_address[1]}"
+
+    model = FakeModel(first_token_seconds=0.02, tokens_per_second=5000)
+    with FakeGeminiServer(model=model) as server:
+        config = Config(
+            gemini=GeminiConfig("offline", "gemini-2.0-flash", 0.2, 0.95, 40, 8192, base_url=server.base_url),
+            # Every window through the File API, so uploads are traced too
+            upload=UploadConfig(base_url=server.base_url, registry_path=os.path.join(workdir, "uploads.json"),
+                                inline_max_bytes=0),
+            cache=CacheConfig(enabled=False),
+            limits=LimitsConfig(requests_per_minute=6000, burst=64)
+        )
+        analyzer = ConversationAnalyzer(config)
+
+        trace_path = os.path.join(workdir, "logs", "traces.jsonl")
+        slow_path = os.path.join(workdir, "logs", "slow_traces.log")
+        tracing.configure(TracingConfig(exporter='file', path=trace_path, slow_seconds=0, slow_log_path=slow_path))
+        record = consultation(analyzer, path)
+        with open(trace_path, 'r', encoding='utf-8') as f:
+            exported = json.loads(f.readline())
+        assert exported['trace_id'] == record['trace_id']
+        spans, windows = check(exported)
+        print(f"File export: {spans} spans, {windows} windows, {exported['latency_seconds']:.2f}s stop to result")
+        with open(slow_path, 'r', encoding='utf-8') as f:
+            breakdown = f.read()
+        assert record['trace_id'] in breakdown and 'model_call' in breakdown
+        print(breakdown)
+
+        tracing.configure(TracingConfig(exporter='otlp', otlp_endpoint=endpoint, slow_seconds=3600, slow_log_path=""))
+        record = consultation(analyzer, path)
+        deadline = time.time() + 10
+        while not Collector.received and time.time() < deadline:
+            time.sleep(0.05)
+        analyzer.close()
+    collector.shutdown()
+
+    assert Collector.received, "collector got nothing"
+    otlp = Collector.received[0]['resourceSpans'][0]['scopeSpans'][0]['spans']
+    assert {span['traceId'] for span in otlp} == {record['trace_id']}
+    assert len(otlp) == len(record['spans'])
+    ids = {span['spanId'] for span in otlp}
+    assert all(span['parentSpanId'] in ids for span in otlp if 'parentSpanId' in span)
+    print(f"OTLP export: {len(otlp)} spans under trace {record['trace_id']}")
+
+    tracing.configure(TracingConfig(enabled=False))
+    assert tracing.start_trace('consultation') is None
+    with tracing.span('untraced') as span:
+        assert span is tracing.NOOP_SPAN
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Test: silence trimming keeps soft speech in speech-dense recordings
+
+A consultation with no real pauses: a loud speaker most of the time and a
+soft one (about -36 dBFS) for a few seconds at a time. The 10th
+percentile of frame levels then lands on the soft speaker, and without
+the noise-floor cap the threshold sat above it and the soft turns were
+cut. Checks that nothing is cut there, and that a genuine silence in the
+same kind of recording is still compressed.
+
+Run from the repository root:
+    python -m testscript.test_vad
+"""
+import sys
+import os
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import VadConfig
+from vad import trim_silence
+
+RATE = 16000
+
+
+def speech(seconds, dbfs, rng):
+    """Noise at roughly `dbfs` RMS with a 4 Hz syllable envelope"""
+    t = np.arange(int(RATE * seconds)) / RATE
+    envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 4 * t)
+    rms = 32768 * 10 ** (dbfs / 20)
+    return rng.normal(0, rms, len(t)) * envelope
+
+
+def recording(parts, rng):
+    samples = np.concatenate([speech(seconds, dbfs, rng) for seconds, dbfs in parts])
+    return np.clip(samples, -32768, 32767).astype('<i2').tobytes()
+
+
+def main():
+    rng = np.random.default_rng(3)
+    params = VadConfig().params
+
+    # Loud doctor, soft patient, no pauses: 85% loud
+    turns = [(17, -20), (3, -36)] * 10
+    pcm = recording(turns, rng)
+    trimmed = trim_silence(pcm, RATE, **params)
+    print(f"Speech only: {trimmed.original_duration:.1f}s -> {trimmed.trimmed_duration:.1f}s")
+    assert trimmed.trimmed_duration == trimmed.original_duration, "soft speech was cut"
+
+    # Without the cap the same recording loses the soft turns
+    uncapped = trim_silence(pcm, RATE, **dict(params, max_noise_floor_db=0.0))
+    print(f"Uncapped floor: {uncapped.original_duration:.1f}s -> {uncapped.trimmed_duration:.1f}s")
+    assert uncapped.trimmed_duration < uncapped.original_duration - 20
+
+    # A real 6 s silence in between is still compressed
+    pcm = recording(turns[:6] + [(6, -75)] + turns[6:], rng)
+    trimmed = trim_silence(pcm, RATE, **params)
+    print(f"With a pause: {trimmed.original_duration:.1f}s -> {trimmed.trimmed_duration:.1f}s")
+    saved = trimmed.original_duration - trimmed.trimmed_duration
+    assert 5 < saved < 6, f"expected the pause to be cut to the kept silence, saved {saved:.1f}s"
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,379 @@
+"""Lightweight in-process tracing of one consultation from start to result
+
+A Trace is started when recording starts and finished once the result has
+been emitted; every stage in between (recorder.stop, the file read,
+normalization, VAD, encoding, uploads, each model call, parsing, saving,
+the Socket.IO emit) records a nested Span under the same trace ID, on
+whatever thread or event loop task it runs:
+
+    trace = tracing.start_trace('consultation', sid=sid)
+    with tracing.activate(trace):          # on any thread holding the trace
+        with tracing.span('recorder.stop'):
+            ...
+    tracing.finish(trace)
+
+The current span lives in a context variable, so it follows asyncio tasks
+and asyncio.to_thread; `bind(coro)` carries it onto another event loop.
+Without an active trace, span() costs one context variable lookup.
+
+Finished traces go to the configured exporter (a JSON-lines file or an
+OTLP/HTTP collector such as a local OpenTelemetry Collector or Jaeger),
+sampled at `sample_rate` but always kept when slow; slow traces also get
+a readable stage breakdown in the slow-trace log.
+"""
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime
+
+import requests
+
+# Spans kept per trace; a runaway loop shouldn't hold unbounded memory
+MAX_SPANS = 2000
+
+_current = ContextVar('tracing_span', default=None)
+
+
+class Span:
+    """One timed stage; times are epoch nanoseconds"""
+
+    def __init__(self, trace, name, parent_id=None, attributes=None, start_ns=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, end_ns=None):
+        if self.end_ns is None:
+            self.end_ns = end_ns or time.time_ns()
+
+    @property
+    def seconds(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_dict(self):
+        return {
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'seconds': round(self.seconds, 4),
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+class _NoopSpan:
+    """Stands in for a span when nothing is being traced"""
+
+    def set(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """The spans of one consultation, under one trace ID"""
+
+    def __init__(self, name, attributes=None):
+        self.trace_id = os.urandom(16).hex()
+        self.spans = []
+        self.dropped = 0
+        self.finished = False
+        self._lock = threading.Lock()
+        self.root = self.start_span(name, None, attributes)
+
+    def start_span(self, name, parent, attributes=None, start_ns=None):
+        span = Span(self, name, parent.span_id if parent else None, attributes, start_ns)
+        with self._lock:
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+        return span
+
+    def find(self, name):
+        with self._lock:
+            return next((span for span in self.spans if span.name == name), None)
+
+    def to_dict(self, latency):
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+        return {
+            'trace_id': self.trace_id,
+            'name': self.root.name,
+            'seconds': round(self.root.seconds, 4),
+            'latency_seconds': round(latency, 4),
+            'dropped_spans': self.dropped,
+            'spans': spans
+        }
+
+
+class FileExporter:
+    """Appends each trace as one JSON line"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def export(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{'key': key, 'value': _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+class OTLPExporter:
+    """Posts traces to an OTLP/HTTP collector (JSON encoding) from a background thread.
+
+    Export never blocks the caller; if the collector is down, traces are
+    dropped after one attempt rather than queued up.
+    """
+
+    def __init__(self, endpoint, service_name, timeout=5, max_queued=100):
+        self.url = f"{endpoint.rstrip('/')}/v1/traces"
+        self.service_name = service_name
+        self.timeout = timeout
+        self.failures = 0
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._session = requests.Session()
+        threading.Thread(target=self._run, name='otlp-exporter', daemon=True).start()
+
+    def export(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.failures += 1
+
+    def payload(self, record):
+        spans = []
+        for span in record['spans']:
+            otlp = {
+                'traceId': record['trace_id'],
+                'spanId': span['span_id'],
+                'name': span['name'],
+                'kind': 1,
+                'startTimeUnixNano': str(span['start_ns']),
+                'endTimeUnixNano': str(span['end_ns'] or span['start_ns']),
+                'attributes': _otlp_attributes(span['attributes']),
+                'status': {'code': 2, 'message': span['error']} if span['error'] else {'code': 1}
+            }
+            if span['parent_id']:
+                otlp['parentSpanId'] = span['parent_id']
+            spans.append(otlp)
+        return {'resourceSpans': [{
+            'resource': {'attributes': _otlp_attributes({'service.name': self.service_name})},
+            'scopeSpans': [{'scope': {'name': 'tracing'}, 'spans': spans}]
+        }]}
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            try:
+                response = self._session.post(self.url, json=self.payload(record), timeout=self.timeout)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                self.failures += 1
+                print(f"Trace export to {self.url} failed: {str(e)}")
+
+
+def format_trace(record):
+    """Readable stage breakdown: start offset from the latency start, duration, nesting"""
+    spans = record['spans']
+    children = {}
+    for span in spans:
+        children.setdefault(span['parent_id'], []).append(span)
+    origin = record['latency_start_ns']
+    lines = [f"{datetime.now().astimezone().isoformat()} trace {record['trace_id']} {record['name']}: "
+             f"{record['latency_seconds']:.2f}s to result ({record['seconds']:.2f}s in total)"]
+
+    def walk(span, depth):
+        offset = (span['start_ns'] - origin) / 1e9
+        label = '  ' * depth + span['name']
+        details = ' '.join(f"{key}={value}" for key, value in span['attributes'].items())
+        error = f" ERROR {span['error']}" if span['error'] else ''
+        lines.append(f"  {label:<40}{offset:>+10.3f}s {span['seconds']:>9.3f}s  {details}{error}".rstrip())
+        for child in sorted(children.get(span['span_id'], []), key=lambda s: s['start_ns']):
+            walk(child, depth + 1)
+
+    for root in children.get(None, []):
+        walk(root, 0)
+    return '\n'.join(lines) + '\n'
+
+
+class Tracer:
+    """Decides which finished traces are exported and which are logged as slow.
+
+    A trace's latency runs from the start of its first `latency_from`
+    span (the stop of the recording) to its end, or over the whole root
+    span when there is none. Traces at least `slow_seconds` long are
+    always exported and written to `slow_log_path`; the rest are exported
+    with probability `sample_rate`.
+    """
+
+    def __init__(self, exporter=None, sample_rate=1.0, slow_seconds=30.0, slow_log_path="",
+                 latency_from=None):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.slow_log_path = slow_log_path
+        self.latency_from = latency_from
+        self.finished = 0
+        self.exported = 0
+        self.slow = 0
+        self._lock = threading.Lock()
+        if slow_log_path and os.path.dirname(slow_log_path):
+            os.makedirs(os.path.dirname(slow_log_path), exist_ok=True)
+
+    def finish(self, trace):
+        with trace._lock:
+            if trace.finished:
+                return None
+            trace.finished = True
+        trace.root.end()
+        start = trace.find(self.latency_from) if self.latency_from else None
+        latency_start = (start or trace.root).start_ns
+        latency = (trace.root.end_ns - latency_start) / 1e9
+        record = dict(trace.to_dict(latency), latency_start_ns=latency_start)
+        slow = latency >= self.slow_seconds
+
+        with self._lock:
+            self.finished += 1
+            self.slow += slow
+        if slow and self.slow_log_path:
+            with self._lock, open(self.slow_log_path, 'a', encoding='utf-8') as f:
+                f.write(format_trace(record))
+        if self.exporter and (slow or random.random() < self.sample_rate):
+            self.exported += 1
+            try:
+                self.exporter.export(record)
+            except Exception as e:
+                print(f"Error exporting trace {trace.trace_id}: {str(e)}")
+        return record
+
+
+_tracer = None
+
+
+def configure(tracing):
+    """Set up tracing from the `tracing` config section; disabled leaves every call a no-op"""
+    global _tracer
+    if not tracing.enabled:
+        _tracer = None
+        return None
+    exporter = None
+    if tracing.exporter == 'file':
+        exporter = FileExporter(tracing.path)
+    elif tracing.exporter == 'otlp':
+        exporter = OTLPExporter(tracing.otlp_endpoint, tracing.service_name)
+    elif tracing.exporter != 'none':
+        raise ValueError(f"Unknown trace exporter: {tracing.exporter}")
+    _tracer = Tracer(exporter, tracing.sample_rate, tracing.slow_seconds, tracing.slow_log_path,
+                     latency_from='stop_recording')
+    return _tracer
+
+
+def start_trace(name, **attributes):
+    """New trace with a root span of `name`, or None when tracing is off"""
+    if _tracer is None:
+        return None
+    return Trace(name, attributes)
+
+
+def finish(trace, error=None):
+    """End the root span and hand the trace to the exporter; later calls are ignored"""
+    if trace is None or _tracer is None:
+        return None
+    if error:
+        trace.root.error = error
+    return _tracer.finish(trace)
+
+
+def activate(trace_or_span):
+    """Make a trace's root (or a span) current for the block, e.g. on another thread"""
+    if trace_or_span is None:
+        return nullcontext()
+    span = trace_or_span.root if isinstance(trace_or_span, Trace) else trace_or_span
+    return _activate(span)
+
+
+@contextmanager
+def _activate(span):
+    token = _current.set(span)
+    try:
+        yield span
+    finally:
+        _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time the block as a child of the current span; yields it so attributes can be added"""
+    parent = _current.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    child = parent.trace.start_span(name, parent, attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        child.end()
+        _current.reset(token)
+
+
+def record(name, start, end, **attributes):
+    """Add an already finished stage (epoch seconds), e.g. time spent queued"""
+    parent = _current.get()
+    if parent is None:
+        return
+    child = parent.trace.start_span(name, parent, attributes, start_ns=int(start * 1e9))
+    child.end(int(end * 1e9))
+
+
+def bind(coro):
+    """Run `coro` under the caller's current span wherever it is awaited (e.g. on another loop)"""
+    parent = _current.get()
+    if parent is None:
+        return coro
+
+    async def run():
+        _current.set(parent)
+        return await coro
+    return run()
@@ -0,0 +1,135 @@
+import bisect
+from dataclasses import dataclass, field
+from typing import List
+
+import numpy as np
+
+from audio_level import FULL_SCALE, SILENCE_DBFS
+
+
+@dataclass
+class Segment:
+    """A stretch of audio kept by the VAD, in seconds"""
+    trimmed_start: float
+    original_start: float
+    duration: float
+
+    def to_dict(self):
+        return {
+            'trimmed_start': round(self.trimmed_start, 3),
+            'original_start': round(self.original_start, 3),
+            'duration': round(self.duration, 3)
+        }
+
+
+@dataclass
+class TrimResult:
+    """Silence-trimmed PCM plus the map back to the original timeline"""
+    pcm: bytes
+    rate: int
+    original_bytes: int
+    segments: List[Segment] = field(default_factory=list)
+
+    @property
+    def bytes_saved(self):
+        return self.original_bytes - len(self.pcm)
+
+    @property
+    def original_duration(self):
+        return self.original_bytes / 2 / self.rate
+
+    @property
+    def trimmed_duration(self):
+        return len(self.pcm) / 2 / self.rate
+
+    def to_original_time(self, t):
+        """Map a time in the trimmed audio back to the original recording"""
+        if not self.segments:
+            return t
+        starts = [s.trimmed_start for s in self.segments]
+        seg = self.segments[max(0, bisect.bisect_right(starts, t) - 1)]
+        return seg.original_start + min(max(t - seg.trimmed_start, 0), seg.duration)
+
+    def summary(self):
+        return {
+            'original_bytes': self.original_bytes,
+            'trimmed_bytes': len(self.pcm),
+            'bytes_saved': self.bytes_saved,
+            'original_seconds': round(self.original_duration, 2),
+            'trimmed_seconds': round(self.trimmed_duration, 2),
+            'offset_map': [s.to_dict() for s in self.segments]
+        }
+
+
+def frame_levels(samples, frame):
+    """dBFS of each complete frame of int16 samples"""
+    count = len(samples) // frame
+    if count == 0:
+        return np.zeros(0)
+    frames = samples[:count * frame].reshape(count, frame)
+    energy = np.einsum('ij,ij->i', frames, frames, dtype=np.float64) / frame
+    rms = np.sqrt(energy)
+    with np.errstate(divide='ignore'):
+        dbfs = 20 * np.log10(rms / FULL_SCALE)
+    return np.maximum(dbfs, SILENCE_DBFS)
+
+
+def trim_silence(pcm, rate, frame_ms=30, margin_db=10.0, min_threshold_db=-50.0, max_noise_floor_db=-50.0,
+                 min_silence_ms=1500, keep_silence_ms=400, padding_ms=200):
+    """Energy-based VAD that compresses long silences in mono int16 PCM.
+
+    The speech threshold adapts to the recording: `margin_db` above the
+    noise floor (10th percentile of frame levels), but never below
+    `min_threshold_db`. The floor is capped at `max_noise_floor_db`: in a
+    consultation with hardly any pauses the 10th percentile is itself
+    speech, and an uncapped threshold would cut the quieter speaker.
+    Speech is padded by `padding_ms` on both sides, and
+    every silence longer than `min_silence_ms` is cut down to
+    `keep_silence_ms` (split between its two ends) so pauses still read as
+    pauses to the model.
+    """
+    samples = np.frombuffer(pcm, dtype='<i2')
+    frame = max(1, int(rate * frame_ms / 1000))
+    levels = frame_levels(samples, frame)
+    if len(levels) == 0:
+        return TrimResult(bytes(pcm), rate, len(pcm), [Segment(0.0, 0.0, len(samples) / rate)])
+
+    noise_floor = min(np.percentile(levels, 10), max_noise_floor_db)
+    threshold = max(noise_floor + margin_db, min_threshold_db)
+    speech = levels > threshold
+
+    # Hangover: widen each speech frame by the padding on both sides
+    pad = int(padding_ms / frame_ms)
+    if pad:
+        speech = np.convolve(speech, np.ones(2 * pad + 1), mode='same') > 0
+
+    # Silent runs as [start, end) frame indices
+    edges = np.diff(np.concatenate(([1], speech.astype(np.int8), [1])))
+    run_starts = np.flatnonzero(edges == -1)
+    run_ends = np.flatnonzero(edges == 1)
+
+    min_silence = int(min_silence_ms / frame_ms)
+    keep = int(keep_silence_ms / frame_ms)
+    cuts = []
+    for start, end in zip(run_starts.tolist(), run_ends.tolist()):
+        if end - start >= min_silence:
+            cut_start = (start + keep // 2) * frame
+            cut_end = min((end - (keep - keep // 2)) * frame, len(samples))
+            if end == len(levels):
+                # Trailing silence runs to the end of the recording
+                cut_end = len(samples)
+            cuts.append((cut_start, cut_end))
+
+    kept = []
+    segments = []
+    position = 0
+    trimmed = 0
+    for cut_start, cut_end in cuts + [(len(samples), len(samples))]:
+        if cut_start > position:
+            kept.append(samples[position:cut_start])
+            segments.append(Segment(trimmed / rate, position / rate, (cut_start - position) / rate))
+            trimmed += cut_start - position
+        position = cut_end
+
+    out = np.concatenate(kept).tobytes() if kept else b''
+    return TrimResult(out, rate, len(pcm), segments)
@@ -0,0 +1,166 @@
+import os
+import queue
+import struct
+import threading
+import time
+
+# Offsets of the size fields in the canonical 44-byte PCM WAV header
+RIFF_SIZE_OFFSET = 4
+DATA_SIZE_OFFSET = 40
+HEADER_SIZE = 44
+
+
+def _wav_header(channels, sample_width, rate, data_size):
+    """Build a canonical PCM WAV header"""
+    byte_rate = rate * channels * sample_width
+    block_align = channels * sample_width
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', HEADER_SIZE - 8 + data_size, b'WAVE',
+        b'fmt ', 16, 1, channels, rate, byte_rate, block_align, sample_width * 8,
+        b'data', data_size
+    )
+
+
+def wav_bytes(pcm, rate, channels=1, sample_width=2):
+    """Wrap raw PCM in a WAV container"""
+    return _wav_header(channels, sample_width, rate, len(pcm)) + bytes(pcm)
+
+
+class StreamingWavWriter:
+    """Writes PCM frames to a WAV file incrementally from a background thread.
+
+    Frames are either handed over with `write()` or pulled from a
+    `CaptureReader` passed to `open()`, and flushed to disk as they arrive,
+    so memory stays flat however long the recording runs. The RIFF/data size
+    fields are patched every `sync_interval` seconds, which leaves a playable
+    file behind even if the process dies before `close()`.
+
+    An optional `transform` (e.g. a StreamingResampler) converts each block
+    on the writer thread; channels/rate then describe its output format.
+    """
+
+    def __init__(self, filename, channels=1, sample_width=2, rate=16000, sync_interval=1.0,
+                 transform=None):
+        self.filename = filename
+        self.channels = channels
+        self.sample_width = sample_width
+        self.rate = rate
+        self.sync_interval = sync_interval
+        self.transform = transform
+        self.bytes_written = 0
+        self.closed = True
+        self._queue = queue.Queue()
+        self._source = None
+        self._file = None
+        self._thread = None
+        self._error = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    @property
+    def frames_written(self):
+        return self.bytes_written // (self.channels * self.sample_width)
+
+    @property
+    def duration(self):
+        """Seconds of audio written so far"""
+        return self.frames_written / self.rate
+
+    def open(self, source=None):
+        """Create the file and start the writer thread"""
+        self._source = source
+        self._file = open(self.filename, 'wb')
+        self._file.write(_wav_header(self.channels, self.sample_width, self.rate, 0))
+        self._file.flush()
+        self.closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def write(self, frames):
+        """Queue frames for writing; safe to call from the audio callback"""
+        if not self.closed:
+            self._queue.put(frames)
+
+    def close(self):
+        """Flush pending frames, patch the header and close the file"""
+        if self.closed:
+            return self.filename
+        self.closed = True
+        if self._source is not None:
+            self._source.close()
+        else:
+            self._queue.put(None)
+        self._thread.join()
+        if self._error:
+            raise self._error
+        return self.filename
+
+    def _frames(self):
+        if self._source is not None:
+            # Drain several chunks per write when the writer falls behind
+            while True:
+                frames = self._source.read(max_chunks=64)
+                if frames is None:
+                    return
+                yield frames
+        else:
+            while True:
+                frames = self._queue.get()
+                if frames is None:
+                    return
+                yield frames
+
+    def _run(self):
+        last_sync = time.monotonic()
+        try:
+            for frames in self._frames():
+                if self.transform is not None:
+                    frames = self.transform.process(frames)
+                self._file.write(frames)
+                self.bytes_written += len(frames)
+
+                if time.monotonic() - last_sync >= self.sync_interval:
+                    self._patch_header()
+                    last_sync = time.monotonic()
+
+            if self.transform is not None:
+                frames = self.transform.flush()
+                self._file.write(frames)
+                self.bytes_written += len(frames)
+        except Exception as e:
+            print(f"Error writing audio file: {str(e)}")
+            self._error = e
+        finally:
+            try:
+                self._patch_header()
+            finally:
+                self._file.close()
+
+    def _patch_header(self):
+        """Rewrite the size fields to match the data written so far"""
+        end = self._file.tell()
+        self._file.seek(RIFF_SIZE_OFFSET)
+        self._file.write(struct.pack('<I', HEADER_SIZE - 8 + self.bytes_written))
+        self._file.seek(DATA_SIZE_OFFSET)
+        self._file.write(struct.pack('<I', self.bytes_written))
+        self._file.seek(end)
+        self._file.flush()
+
+
+def repair_wav(filename):
+    """Fix the size fields of a WAV left behind by an interrupted recording"""
+    data_size = os.path.getsize(filename) - HEADER_SIZE
+    if data_size < 0:
+        return False
+    with open(filename, 'r+b') as f:
+        f.seek(RIFF_SIZE_OFFSET)
+        f.write(struct.pack('<I', HEADER_SIZE - 8 + data_size))
+        f.seek(DATA_SIZE_OFFSET)
+        f.write(struct.pack('<I', data_size))
+    return True